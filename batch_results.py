@@ -0,0 +1,273 @@
+# batch_results.py
+# Xử lý kết quả /products/batch theo từng item:
+# WooCommerce trả về 200 cho cả batch nhưng từng item có thể mang object 'error' riêng.
+#  - item lỗi tạm thời (5xx, 429, lỗi ghi DB) -> đưa vào hàng đợi retry có backoff,
+#    ghép vào các batch sau
+#  - item lỗi vĩnh viễn (ID sai, SKU trùng, dữ liệu không hợp lệ...) hoặc hết lượt thử
+#    -> ghi dead-letter (.csv hoặc .jsonl) để xử lý tay
+#  - summary() tổng hợp cho cả lượt chạy
+
+import csv
+import json
+import time
+import heapq
+import random
+import logging
+import threading
+from collections import Counter
+
+from woo_client import RETRY_STATUSES
+
+BATCH_ACTIONS = ('create', 'update', 'delete')
+# Mã lỗi item mà WooCommerce trả về khi ghi DB thất bại tạm thời (thường do lock / quá tải)
+RETRYABLE_ERROR_CODES = frozenset({'db_insert_error', 'db_update_error', 'internal_server_error'})
+INVALID_ID_CODE = 'woocommerce_rest_product_invalid_id'
+
+
+def is_retryable(error: dict) -> bool:
+    """
+    True nếu lỗi của 1 item có thể thành công khi gửi lại.
+    """
+    status = (error.get('data') or {}).get('status')
+    return status in RETRY_STATUSES or error.get('code') in RETRYABLE_ERROR_CODES
+
+
+def split_batch_response(action: str, items: list, resp: dict):
+    """
+    Ghép từng item đã gửi với kết quả cùng vị trí trong phản hồi (WooCommerce giữ nguyên thứ tự).
+    Trả về (ok, failed): ok = list kết quả thành công, failed = list (item, error).
+    Item không có kết quả tương ứng được báo lỗi để không bị mất âm thầm: update / delete gửi lại
+    được (lỗi tạm thời), còn create thì không vì server có thể đã tạo sản phẩm (-> dead-letter).
+    """
+    results = (resp or {}).get(action, [])
+    ok, failed = [], []
+    for i, item in enumerate(items):
+        res = results[i] if i < len(results) else None
+        if res is None:
+            failed.append((item, {'code': 'missing_in_response', 'message': 'Không có kết quả trong phản hồi batch',
+                                  'data': {'status': None if action == 'create' else 500}}))
+        elif res.get('error'):
+            failed.append((item, res['error']))
+        else:
+            ok.append(res)
+    return ok, failed
+
+
+def _item_ref(action: str, item):
+    """
+    Khóa trạng thái retry của 1 item. Item delete là ID (int): khóa theo giá trị - id() của int
+    không ổn định (CPython dùng chung object cho int nhỏ, địa chỉ của int đã giải phóng được dùng lại),
+    còn 1 ID sản phẩm chỉ xuất hiện 1 lần trong lượt chạy. Payload dict: khóa theo object, vì dict
+    đang chờ retry luôn được giữ trong hàng đợi / body nên id() không đổi.
+    """
+    if isinstance(item, (int, str)):
+        return action, item
+    return action, id(item)
+
+
+def _item_label(item):
+    # Định danh ngắn của item cho log / dead-letter: ID, SKU hoặc tên
+    if isinstance(item, dict):
+        return item.get('id') or item.get('sku') or item.get('name')
+    return item
+
+
+class BatchResultTracker:
+    """
+    Theo dõi kết quả từng item của các batch trong 1 lượt chạy, dùng chung giữa các thread.
+
+    Tham số:
+      - dead_letter_path: file ghi item lỗi vĩnh viễn (.csv -> CSV, còn lại -> JSON Lines); None = chỉ log
+      - max_attempts: số lần gửi tối đa cho 1 item (kể cả lần đầu)
+      - backoff, max_backoff: backoff mũ có jitter (giây) trước khi gửi lại item lỗi tạm thời
+
+      - on_settled: hàm on_settled(key) gọi khi mọi item retry của batch có khóa `key`
+        (handle(..., key=...)) đã xong (thành công hoặc vào dead-letter), vd để ghi journal 'done'
+
+    group (tùy chọn, ở begin / handle / take_due / has_pending / iter_retry_bodies): tách hàng đợi
+    retry và số batch đang gửi theo nhóm, khi nhiều luồng công việc (ví dụ nhiều category) chạy
+    song song trên cùng tracker; group=None ở take_due / has_pending = mọi nhóm.
+    """
+    def __init__(self, dead_letter_path: str = None, max_attempts: int = 3,
+                 backoff: float = 1.0, max_backoff: float = 30.0, on_settled=None):
+        self.dead_letter_path = dead_letter_path
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.on_settled = on_settled
+        self._lock = threading.Lock()
+        self._retry = []              # heap (thời điểm được gửi lại, seq, group, action, item)
+        self._attempts = {}           # _item_ref -> số lần đã gửi
+        self._item_key = {}           # _item_ref -> khóa batch gốc của item đang chờ retry
+        self._waiting = Counter()     # khóa batch gốc -> số item còn chờ retry
+        self._seq = 0
+        self._in_flight = Counter()   # group -> số batch đang gửi
+        self._dead_file = None
+        self._dead_writer = None
+        self.counts = Counter()
+        self.error_codes = Counter()
+
+    # ---- vòng đời batch ----
+    def begin(self, group=None):
+        """Gọi khi 1 batch được đưa đi gửi (để biết còn batch nào có thể sinh retry)."""
+        with self._lock:
+            self._in_flight[group] += 1
+
+    def handle(self, body: dict, resp: dict = None, error: Exception = None, group=None,
+               key: str = None) -> dict:
+        """
+        Xử lý kết quả 1 batch đã gửi (body dạng {'create': [...], 'update': [...], 'delete': [...]}).
+        error: exception khi cả request thất bại (client đã tự retry) -> mọi item vào dead-letter.
+        key: khóa batch (journal); outcome có 'retry' thì batch chưa xong, on_settled(key) được gọi
+        khi item retry cuối cùng của nó xong.
+        Trả về {'ok', 'retry', 'dead'} của batch này.
+        """
+        out = Counter()
+        settled = []
+        now = time.monotonic()
+        with self._lock:
+            self._in_flight[group] -= 1
+            for action in BATCH_ACTIONS:
+                items = body.get(action)
+                if not items:
+                    continue
+                if error is not None:
+                    failed = [(item, {'code': type(error).__name__, 'message': str(error)}) for item in items]
+                    ok = []
+                else:
+                    ok, failed = split_batch_response(action, items, resp)
+                out['ok'] += len(ok)
+                self.counts[f"{action}_ok"] += len(ok)
+                failed_refs = {_item_ref(action, item) for item, _ in failed}
+                for item in items:
+                    ref = _item_ref(action, item)
+                    if ref in self._attempts and ref not in failed_refs:
+                        self.counts['recovered'] += 1
+                        del self._attempts[ref]
+                        self._settle(ref, settled)
+                for item, err in failed:
+                    ref = _item_ref(action, item)
+                    attempts = self._attempts.get(ref, 0) + 1
+                    if action == 'delete' and attempts > 1 and err.get('code') == INVALID_ID_CODE:
+                        # Lần gửi trước báo lỗi nhưng thực ra đã xóa xong: sản phẩm không còn tồn tại
+                        del self._attempts[ref]
+                        self._settle(ref, settled)
+                        self.counts['recovered'] += 1
+                        self.counts['delete_ok'] += 1
+                        out['ok'] += 1
+                        continue
+                    self.error_codes[err.get('code')] += 1
+                    if error is None and is_retryable(err) and attempts < self.max_attempts:
+                        self._attempts[ref] = attempts
+                        if key is not None and ref not in self._item_key:
+                            # Item gửi lại nằm trong batch khác nhưng vẫn tính cho batch gốc
+                            self._item_key[ref] = key
+                            self._waiting[key] += 1
+                        delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempts)))
+                        heapq.heappush(self._retry, (now + delay, self._seq, group, action, item))
+                        self._seq += 1
+                        self.counts['retried'] += 1
+                        out['retry'] += 1
+                    else:
+                        self._attempts.pop(ref, None)
+                        self._settle(ref, settled)
+                        self._dead_letter(action, item, err, attempts)
+                        out['dead'] += 1
+        if self.on_settled is not None:
+            for done_key in settled:
+                self.on_settled(done_key)
+        return dict(out)
+
+    def _settle(self, ref, settled: list):
+        # Item retry đã xong: batch gốc xong khi không còn item nào của nó chờ retry
+        key = self._item_key.pop(ref, None)
+        if key is None:
+            return
+        self._waiting[key] -= 1
+        if self._waiting[key] <= 0:
+            del self._waiting[key]
+            settled.append(key)
+
+    def take_due(self, limit: int, group=None) -> list:
+        """Lấy tối đa `limit` item đã tới hạn gửi lại (của nhóm group): list (action, item)."""
+        now = time.monotonic()
+        due, other = [], []
+        with self._lock:
+            while self._retry and self._retry[0][0] <= now and len(due) < limit:
+                entry = heapq.heappop(self._retry)
+                if group is None or entry[2] == group:
+                    due.append(entry[3:])
+                else:
+                    other.append(entry)
+            for entry in other:
+                heapq.heappush(self._retry, entry)
+        return due
+
+    def has_pending(self, group=None) -> bool:
+        """True nếu còn item chờ retry hoặc còn batch đang gửi (có thể sinh thêm retry)."""
+        with self._lock:
+            if group is None:
+                return bool(self._retry) or any(n > 0 for n in self._in_flight.values())
+            return self._in_flight[group] > 0 or any(e[2] == group for e in self._retry)
+
+    def next_due_in(self, group=None) -> float:
+        with self._lock:
+            due = [e[0] for e in self._retry if group is None or e[2] == group]
+            if not due:
+                return 0.05
+            return max(0.0, min(due) - time.monotonic())
+
+    def iter_retry_bodies(self, batch_size: int, extra: dict = None, group=None):
+        """
+        Dùng cho đường gửi tuần tự (sau lượt batch chính): sinh body chứa các item chờ retry
+        khi tới hạn, tới khi hết. Người gọi gửi body rồi gọi handle().
+        """
+        while self.has_pending(group):
+            due = self.take_due(batch_size, group)
+            if not due:
+                time.sleep(min(0.5, self.next_due_in(group)))
+                continue
+            body = dict(extra or {})
+            for action, item in due:
+                body.setdefault(action, []).append(item)
+            self.begin(group)
+            yield body
+
+    # ---- dead-letter ----
+    def _dead_letter(self, action, item, err, attempts):
+        self.counts['dead'] += 1
+        logging.warning(f"✖ {action} {_item_label(item)} lỗi vĩnh viễn sau {attempts} lần: "
+                        f"{err.get('code')} {err.get('message')}")
+        if not self.dead_letter_path:
+            return
+        if self._dead_file is None:
+            self._dead_file = open(self.dead_letter_path, 'w', encoding='utf-8', newline='')
+            if self.dead_letter_path.endswith('.csv'):
+                self._dead_writer = csv.writer(self._dead_file)
+                self._dead_writer.writerow(['action', 'item', 'code', 'message', 'attempts', 'payload'])
+        if self._dead_writer is not None:
+            self._dead_writer.writerow([action, _item_label(item), err.get('code'), err.get('message'),
+                                        attempts, json.dumps(item, ensure_ascii=False)])
+        else:
+            self._dead_file.write(json.dumps({'action': action, 'item': item, 'error': err,
+                                              'attempts': attempts}, ensure_ascii=False) + '\n')
+        self._dead_file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._dead_file is not None:
+                self._dead_file.close()
+                self._dead_file = None
+
+    def summary(self) -> dict:
+        """Tổng hợp cả lượt chạy: số item thành công theo action, đã retry, cứu được, dead-letter."""
+        with self._lock:
+            summary = dict(self.counts)
+            summary['errors'] = dict(self.error_codes)
+        ok = ', '.join(f"{a} {summary.get(f'{a}_ok', 0)}" for a in BATCH_ACTIONS if f"{a}_ok" in summary)
+        logging.info(f"Kết quả batch: thành công [{ok or '0'}], retry {summary.get('retried', 0)} "
+                     f"(cứu được {summary.get('recovered', 0)}), dead-letter {summary.get('dead', 0)}"
+                     + (f" -> {self.dead_letter_path}" if summary.get('dead') and self.dead_letter_path else ''))
+        if summary['errors']:
+            logging.info(f"Mã lỗi item: {summary['errors']}")
+        return summary
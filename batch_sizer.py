@@ -0,0 +1,277 @@
+# batch_sizer.py
+# Kích thước batch /products/batch thích ứng cho feed / delete:
+#  - giới hạn mỗi batch theo cả số item (target, tối đa 100) lẫn số byte body (max_bytes),
+#    để batch sản phẩm có mô tả HTML rất dài không vượt memory_limit / max_execution_time của PHP
+#  - chỉnh target theo latency đo được: batch đầy mà nhanh hơn nhiều so với target_latency -> +10%,
+#    chậm hơn target_latency -> thu nhỏ theo tỉ lệ; timeout / 413 / 5xx -> giảm một nửa
+#  - batch lỗi vì quá lớn được chia đôi và gửi lại (send_splitting), kết quả các nửa được ghép lại
+#    đúng thứ tự nên BatchResultTracker / journal vẫn thấy 1 batch như cũ. Ngoại lệ: batch create
+#    có sản phẩm không SKU chỉ được chia khi 413; timeout / 5xx thì server có thể đã tạo một phần,
+#    gửi lại sẽ tạo trùng nên lỗi được trả về nguyên batch (safe_to_resend)
+#  - target đã chỉnh được lưu theo từng store và thao tác (file JSON trong thư mục cache của user,
+#    khóa = URL store đã chuẩn hóa -> 'feed' / 'delete'; payload create/update khác hẳn delete)
+#    để lần chạy sau dùng lại
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+
+import requests
+
+from batch_results import BATCH_ACTIONS
+from woo_metrics import last_attempt_seconds
+
+# Số item tối đa của 1 request /products/batch (giới hạn của WooCommerce)
+MAX_BATCH_ITEMS = 100
+# Số byte body tối đa mặc định của 1 batch (JSON đã serialize)
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024
+# Thời gian xử lý mong muốn của 1 batch (giây): chậm hơn -> thu nhỏ batch
+TARGET_LATENCY = 8.0
+# Mã HTTP cho thấy batch có thể quá lớn (body quá lớn, PHP hết bộ nhớ / quá thời gian, gateway timeout)
+SPLIT_STATUSES = frozenset({413, 500, 502, 504})
+# File lưu target đã chỉnh của từng store (dùng lại giữa các lần chạy): trong thư mục cache của user
+# ($XDG_CACHE_HOME hoặc ~/.cache), không ghi vào thư mục đang chạy
+BATCH_STATE_PATH = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                                'chuc_nang_web', 'batch_sizes.json')
+
+_state_lock = threading.Lock()
+
+
+def item_bytes(item) -> int:
+    """Số byte (ước lượng) của 1 item trong body JSON."""
+    return len(json.dumps(item, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def status_of(error):
+    """Mã HTTP của lỗi request (requests.HTTPError / aiohttp.ClientResponseError), None nếu không có."""
+    resp = getattr(error, 'response', None)
+    if resp is not None:
+        return resp.status_code
+    return getattr(error, 'status', None)
+
+
+def is_oversize_error(error) -> bool:
+    """True nếu request batch lỗi theo kiểu batch quá lớn: timeout hoặc HTTP 413 / 5xx (trừ 503)."""
+    return status_of(error) in SPLIT_STATUSES or isinstance(error, (requests.Timeout, asyncio.TimeoutError))
+
+
+def body_count(body: dict) -> int:
+    return sum(len(body.get(action) or ()) for action in BATCH_ACTIONS)
+
+
+def safe_to_resend(body: dict, error) -> bool:
+    """
+    Batch update / delete luôn gửi lại được. Batch create chỉ gửi lại khi server chắc chắn chưa
+    xử lý (413) hoặc mọi item có SKU (WooCommerce từ chối SKU trùng nên không tạo trùng sản phẩm).
+    Batch create có item không SKU bị timeout / 5xx thì KHÔNG được chia đôi: cả batch thành lỗi.
+    """
+    creates = body.get('create') or []
+    return status_of(error) == 413 or all(isinstance(p, dict) and p.get('sku') for p in creates)
+
+
+def split_body(body: dict):
+    """Chia body batch thành 2 nửa theo thứ tự item (giữ các khóa khác như 'force')."""
+    ops = [(action, item) for action in BATCH_ACTIONS for item in body.get(action) or ()]
+    extra = {k: v for k, v in body.items() if k not in BATCH_ACTIONS}
+    halves = []
+    for part in (ops[:len(ops) // 2], ops[len(ops) // 2:]):
+        half = dict(extra)
+        for action, item in part:
+            half.setdefault(action, []).append(item)
+        halves.append(half)
+    return halves
+
+
+def merge_results(*results) -> dict:
+    """Ghép phản hồi của các nửa batch theo thứ tự, giống phản hồi của batch gốc."""
+    merged = {}
+    for result in results:
+        for action in BATCH_ACTIONS:
+            if action in (result or {}):
+                merged.setdefault(action, []).extend(result[action])
+    return merged
+
+
+def failed_result(body: dict, error) -> dict:
+    # Phản hồi giả cho phần batch không gửi được: mỗi item mang lỗi riêng để tracker xử lý
+    # (retry nếu mã HTTP là lỗi tạm thời, còn lại vào dead-letter) mà không mất kết quả của nửa kia
+    err = {'code': type(error).__name__, 'message': str(error), 'data': {'status': status_of(error)}}
+    return {action: [{'id': 0, 'error': err} for _ in body[action]]
+            for action in BATCH_ACTIONS if body.get(action)}
+
+
+class AdaptiveBatchSizer:
+    """
+    Kích thước batch thích ứng của 1 store, dùng chung giữa các thread.
+
+    Tham số:
+      - initial: target ban đầu (số item / batch) nếu store chưa có target đã lưu
+      - min_size, max_size: khoảng target (max_size không vượt MAX_BATCH_ITEMS)
+      - max_bytes: số byte body tối đa của 1 batch
+      - target_latency: thời gian xử lý mong muốn của 1 batch (giây)
+      - adaptive: False = target cố định (vd khi dùng journal để resume: ranh giới batch phải
+        giống lần chạy trước), vẫn giới hạn byte và chia đôi batch lỗi
+      - store, operation, state_path: URL store, thao tác ('feed', 'delete'...) và file JSON lưu
+        target đã chỉnh theo (store, thao tác); state_path None = không lưu
+    """
+    def __init__(self, initial: int = 80, min_size: int = 1, max_size: int = MAX_BATCH_ITEMS,
+                 max_bytes: int = DEFAULT_MAX_BYTES, target_latency: float = TARGET_LATENCY,
+                 adaptive: bool = True, store: str = None, operation: str = 'batch', state_path: str = None):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, min(max_size, MAX_BATCH_ITEMS))
+        self.max_bytes = max_bytes
+        self.target_latency = target_latency
+        self.adaptive = adaptive
+        # 'https://shop.com/' và 'https://shop.com' là cùng 1 store
+        self.store = store.rstrip('/') if store else store
+        self.operation = operation
+        self.state_path = state_path if adaptive else None
+        self._lock = threading.Lock()
+        saved = self._load() if self.state_path and self.store else None
+        self._size = float(self._clamp(saved or initial))
+        self.initial = int(self._size)
+        self.batches = 0
+        self.splits = 0
+        self.shrinks = 0
+
+    def _clamp(self, size) -> float:
+        return min(max(size, self.min_size), self.max_size)
+
+    @property
+    def target(self) -> int:
+        """Số item tối đa của batch tiếp theo."""
+        return int(self._size)
+
+    def size_of(self, item) -> int:
+        return item_bytes(item)
+
+    def observe(self, count: int, seconds: float, error=None):
+        """Ghi nhận 1 request batch `count` item mất `seconds` giây (error = lỗi nếu có)."""
+        with self._lock:
+            self.batches += 1
+            if not self.adaptive:
+                return
+            # Giảm tính theo kích thước của chính batch đó: nhiều batch cùng cỡ lỗi / chậm đồng thời
+            # chỉ làm target giảm 1 lần thay vì giảm chồng lên nhau
+            if error is not None:
+                if is_oversize_error(error):
+                    self._size = self._clamp(min(self._size, count / 2))
+                    self.shrinks += 1
+                return
+            if seconds > self.target_latency:
+                # Batch chậm: thu nhỏ theo tỉ lệ latency (không giảm quá một nửa mỗi lần)
+                self._size = self._clamp(min(self._size, max(count / 2, count * self.target_latency / seconds)))
+                self.shrinks += 1
+            elif seconds < self.target_latency / 2 and count >= self.target:
+                # Chỉ tăng khi batch đầy theo số item (batch bị giới hạn byte không nói gì về target)
+                self._size = self._clamp(self._size + max(1.0, self._size * 0.1))
+
+    def _load(self):
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                return ((json.load(f).get(self.store) or {}).get(self.operation) or {}).get('size')
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def save(self):
+        """Lưu target hiện tại của store vào state_path (ghi file tạm rồi rename)."""
+        if not self.state_path or not self.store:
+            return
+        with _state_lock:
+            try:
+                with open(self.state_path, encoding='utf-8') as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {}
+            entry = state.get(self.store)
+            if not isinstance(entry, dict):
+                entry = state[self.store] = {}
+            entry[self.operation] = {'size': self.target, 'max_bytes': self.max_bytes,
+                                     'updated': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+            tmp = f"{self.state_path}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(state, f, indent=2, sort_keys=True)
+                os.replace(tmp, self.state_path)
+            except OSError as e:
+                logging.warning(f"Không ghi được file batch size {self.state_path}: {e}")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'initial': self.initial, 'target': self.target, 'batches': self.batches,
+                    'splits': self.splits, 'shrinks': self.shrinks}
+
+
+def _split_or_raise(body, error, sizer):
+    # Chỉ chia đôi khi batch còn >= 2 item, lỗi kiểu quá lớn và gửi lại an toàn
+    if body_count(body) < 2 or not is_oversize_error(error):
+        raise error
+    if not safe_to_resend(body, error):
+        logging.warning(f"Batch create {body_count(body)} item lỗi ({type(error).__name__}: {error}) có sản phẩm "
+                        f"không SKU: không chia đôi / gửi lại (server có thể đã tạo một phần, tránh tạo trùng)")
+        raise error
+    if sizer is not None:
+        with sizer._lock:
+            sizer.splits += 1
+    logging.warning(f"Batch {body_count(body)} item lỗi ({type(error).__name__}: {error}), chia đôi và gửi lại")
+    return split_body(body)
+
+
+def _attempt_seconds(start: float) -> float:
+    # Latency của lần gửi HTTP cuối (client ghi qua woo_metrics.note_attempt), không tính retry,
+    # backoff / Retry-After hay chờ limiter; send không đi qua WooClient -> cả lời gọi send
+    seconds = last_attempt_seconds(reset=True)
+    return seconds if seconds is not None else time.perf_counter() - start
+
+
+def send_splitting(send, body: dict, sizer: AdaptiveBatchSizer = None) -> dict:
+    """
+    Gửi 1 batch bằng send(body), báo latency lần gửi cuối cho sizer. Batch lỗi vì quá lớn được chia
+    đôi và gửi lại (đệ quy); nửa vẫn lỗi thì thành lỗi từng item. Lỗi khác (hoặc batch 1 item) được raise.
+    """
+    last_attempt_seconds(reset=True)
+    start = time.perf_counter()
+    try:
+        result = send(body)
+    except Exception as e:
+        if sizer is not None:
+            sizer.observe(body_count(body), _attempt_seconds(start), e)
+        halves = _split_or_raise(body, e, sizer)
+        return merge_results(*(_send_half(send, half, sizer) for half in halves))
+    if sizer is not None:
+        sizer.observe(body_count(body), _attempt_seconds(start))
+    return result
+
+
+def _send_half(send, body, sizer):
+    try:
+        return send_splitting(send, body, sizer)
+    except Exception as e:
+        return failed_result(body, e)
+
+
+async def send_splitting_async(send, body: dict, sizer: AdaptiveBatchSizer = None) -> dict:
+    """Bản async của send_splitting: send(body) trả về coroutine (chạy trong cùng task)."""
+    last_attempt_seconds(reset=True)
+    start = time.perf_counter()
+    try:
+        result = await send(body)
+    except Exception as e:
+        if sizer is not None:
+            sizer.observe(body_count(body), _attempt_seconds(start), e)
+        halves = _split_or_raise(body, e, sizer)
+        return merge_results(*[await _send_half_async(send, half, sizer) for half in halves])
+    if sizer is not None:
+        sizer.observe(body_count(body), _attempt_seconds(start))
+    return result
+
+
+async def _send_half_async(send, body, sizer):
+    try:
+        return await send_splitting_async(send, body, sizer)
+    except Exception as e:
+        return failed_result(body, e)
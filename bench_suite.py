@@ -0,0 +1,198 @@
+# bench_suite.py
+# Bộ benchmark thông lượng cho hide / delete (WooDeleter) / feed trên mock WooCommerce local
+# (mock_woo.py), ở nhiều quy mô (mặc định 1k / 10k / 100k sản phẩm).
+#
+# Mỗi lượt đo chạy trong 2 process riêng: mock server (để không tranh GIL với client) và
+# client (để peak RSS là của riêng kịch bản đó). Kết quả: sản phẩm/giây, request/giây,
+# latency p50/p95 (phía server, kể cả latency giả lập), peak RSS, số 429 / lỗi item đã giả lập.
+# Ghi JSON với định dạng cố định (SCHEMA_VERSION, khóa sắp xếp) để so sánh giữa các lần chạy.
+#
+# Chạy: python bench_suite.py --scales 1000,10000 --latency 0.005 --workers 16 --json bench.json
+
+import io
+import os
+import csv
+import sys
+import json
+import time
+import logging
+import platform
+import argparse
+import tempfile
+import multiprocessing
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:          # Windows: không đo được peak RSS
+    resource = None
+
+SCHEMA_VERSION = 1
+SCENARIOS = ('hide', 'delete', 'feed')
+DEFAULT_SCALES = (1_000, 10_000, 100_000)
+
+
+def percentile(values, pct: float):
+    """Percentile kiểu nearest-rank, None nếu không có dữ liệu."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def _max_rss_kib():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss     # macOS: byte, Linux: KiB
+
+
+# ---- mock server trong process riêng ----
+def _mock_main(conn, server_kwargs):
+    from mock_woo import MockWooServer
+    srv = MockWooServer(**server_kwargs).start()
+    conn.send((srv.url, srv.store.default_category))
+    while True:
+        if conn.recv() == 'stats':
+            conn.send(srv.stats())
+            continue
+        srv.stop()
+        conn.close()
+        return
+
+
+class MockProcess:
+    """MockWooServer chạy trong process con; stats() lấy số liệu của mock."""
+    def __init__(self, ctx, **server_kwargs):
+        self._conn, child = ctx.Pipe()
+        self._proc = ctx.Process(target=_mock_main, args=(child, server_kwargs), daemon=True)
+
+    def __enter__(self):
+        self._proc.start()
+        self.url, self.category = self._conn.recv()
+        return self
+
+    def stats(self) -> dict:
+        self._conn.send('stats')
+        return self._conn.recv()
+
+    def __exit__(self, *exc):
+        self._conn.send('stop')
+        self._proc.join(timeout=10)
+
+
+# ---- kịch bản (chạy trong process client) ----
+def _write_feed_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['SKU', 'Name', 'Categories', 'Images', 'Regular price', 'Description'])
+        for i in range(rows):
+            writer.writerow([f"BENCH-{i}", f"Bench product {i}", 'Bench > Feed',
+                             f"https://img.example.com/{i}.jpg", '19.99', 'Benchmark'])
+
+
+def _run_scenario(scenario, url, category, scale, workers, workdir):
+    """Chạy 1 kịch bản, trả về {'items', 'elapsed', 'peak_rss_kib', 'baseline_rss_kib'}."""
+    from hide_products import hide_products
+    from delete_product import WooDeleter, chunked
+    from feed_product import feed_products
+
+    csv_path = os.path.join(workdir, f"feed_{scale}.csv")
+    if scenario == 'feed':
+        _write_feed_csv(csv_path, scale)
+    baseline = _max_rss_kib()
+    # Tắt log / print từng trang, từng batch (kể cả cảnh báo retry) để không đo tốc độ terminal
+    logging.disable(logging.WARNING)
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        if scenario == 'hide':
+            items = hide_products(category, url, 'ck', 'cs', max_workers=workers)['hidden']
+        elif scenario == 'delete':
+            wo = WooDeleter(url, 'ck', 'cs', max_workers=workers)
+            ids = [p.id for p in wo.list_products_by_category(category)]
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                responses = list(pool.map(wo.batch_delete_products, chunked(ids, wo.batch_size)))
+            # Chỉ đếm sản phẩm server xác nhận đã xóa (item lỗi trong batch không tính)
+            items = sum(1 for resp in responses for r in (resp or {}).get('delete', []) if not r.get('error'))
+        elif scenario == 'feed':
+            # batch_state_path=None: không dùng / ghi kích thước batch đã chỉnh của lần chạy trước
+            summary = feed_products(csv_path, url, 'ck', 'cs', batch_size=100, max_workers=workers,
+                                    batch_state_path=None)
+            items = summary.get('create_ok', 0)
+        else:
+            raise ValueError(f"Kịch bản không hợp lệ: {scenario!r}")
+    elapsed = time.perf_counter() - start
+    return {'items': items, 'elapsed': elapsed, 'peak_rss_kib': _max_rss_kib(), 'baseline_rss_kib': baseline}
+
+
+def run_suite(scenarios=SCENARIOS, scales=DEFAULT_SCALES, latency: float = 0.005, workers: int = 16,
+              item_error_rate: float = 0.0, throttle_rate: float = 0.0, seed: int = 1) -> dict:
+    """Chạy mọi kịch bản x quy mô, trả về document kết quả (định dạng SCHEMA_VERSION)."""
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for scenario in scenarios:
+            for scale in scales:
+                server_kwargs = {'products': 0 if scenario == 'feed' else scale, 'latency': latency,
+                                 'item_error_rate': item_error_rate, 'throttle_rate': throttle_rate,
+                                 'seed': seed}
+                with MockProcess(ctx, **server_kwargs) as mock:
+                    with ctx.Pool(1, maxtasksperchild=1) as pool:
+                        run = pool.apply(_run_scenario, (scenario, mock.url, mock.category, scale,
+                                                         workers, workdir))
+                    stats = mock.stats()
+                p50, p95 = (percentile(stats['request_times'], p) for p in (50, 95))
+                r = {
+                    'scenario': scenario,
+                    'scale': scale,
+                    'items': run['items'],
+                    'elapsed_s': round(run['elapsed'], 3),
+                    'products_per_sec': round(run['items'] / run['elapsed'], 1),
+                    'requests': stats['requests'],
+                    'requests_per_sec': round(stats['requests'] / run['elapsed'], 1),
+                    'latency_ms': {'p50': round(p50 * 1000, 2) if p50 is not None else None,
+                                   'p95': round(p95 * 1000, 2) if p95 is not None else None},
+                    'peak_rss_kib': run['peak_rss_kib'],
+                    'baseline_rss_kib': run['baseline_rss_kib'],
+                    'throttled': stats['throttled'],
+                    'item_errors': stats['item_errors'],
+                    'store_products_after': stats['products'],
+                }
+                results.append(r)
+                print(f"{scenario:<7} {scale:>7} {r['elapsed_s']:>9.3f}s {r['products_per_sec']:>10.1f} sp/s "
+                      f"{r['requests']:>6} req  p50 {r['latency_ms']['p50']} ms  p95 {r['latency_ms']['p95']} ms  "
+                      f"RSS {r['peak_rss_kib']} KiB", flush=True)
+    return {
+        'schema': SCHEMA_VERSION,
+        'config': {'scenarios': list(scenarios), 'scales': list(scales), 'latency': latency,
+                   'workers': workers, 'item_error_rate': item_error_rate,
+                   'throttle_rate': throttle_rate, 'seed': seed},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'results': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark hide / delete / feed trên mock WooCommerce')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Danh sách kịch bản, cách nhau dấu phẩy')
+    parser.add_argument('--scales', default=','.join(map(str, DEFAULT_SCALES)),
+                        help='Số sản phẩm mỗi lượt, cách nhau dấu phẩy')
+    parser.add_argument('--latency', type=float, default=0.005, help='Độ trễ giả lập mỗi request (giây)')
+    parser.add_argument('--workers', type=int, default=16, help='Số worker / request đồng thời')
+    parser.add_argument('--item-errors', type=float, default=0.0, help='Tỉ lệ item batch lỗi tạm thời (0-1)')
+    parser.add_argument('--throttle', type=float, default=0.0, help='Tỉ lệ request trả 429 (0-1)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='Ghi kết quả ra file JSON')
+    args = parser.parse_args()
+
+    doc = run_suite([s.strip() for s in args.scenarios.split(',') if s.strip()],
+                    [int(x) for x in args.scales.split(',') if x.strip()],
+                    args.latency, args.workers, args.item_errors, args.throttle, args.seed)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(doc, f, indent=2, sort_keys=True)
+        print(f"✅ Đã ghi kết quả vào {args.json}")
@@ -0,0 +1,93 @@
+# bench_woo.py
+# Benchmark so sánh transport 'thread' (ThreadPoolExecutor + WooClient) và
+# 'async' (asyncio + AsyncWooClient) trên mock WooCommerce local (mock_woo.py).
+#
+# Chạy: python bench_woo.py --products 2000 --latency 0.02 --workers 50
+
+import io
+import json
+import time
+import argparse
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+
+from mock_woo import MockWooServer
+from hide_products import hide_categories
+from delete_product import WooDeleter, chunked
+from woo_async import run_client, TRANSPORTS
+
+
+def bench_hide(transport, products, latency, workers, mode='batch'):
+    """Ẩn toàn bộ sản phẩm của 1 category."""
+    with MockWooServer(products=products, latency=latency) as srv:
+        start = time.perf_counter()
+        # hide_categories in 1 dòng cho mỗi sản phẩm/batch -> tắt để không đo tốc độ terminal
+        with redirect_stdout(io.StringIO()):
+            summary = hide_categories([srv.store.default_category], srv.url, 'ck', 'cs',
+                                      max_workers=workers, mode=mode, transport=transport)
+        elapsed = time.perf_counter() - start
+        return {'elapsed': elapsed, 'items': summary['hidden'], 'requests': len(srv.request_log)}
+
+
+def bench_batch(transport, action, products, latency, workers, batch_size=100):
+    """Batch 'delete' / 'update' / 'create' cho `products` sản phẩm."""
+    with MockWooServer(products=products if action != 'create' else 0, latency=latency) as srv:
+        if action == 'create':
+            items = [{'name': f"Bench {i}", 'sku': f"B-{i}", 'regular_price': '10'} for i in range(products)]
+        elif action == 'update':
+            items = [{'id': pid, 'catalog_visibility': 'hidden'} for pid in srv.store.products]
+        else:
+            items = list(srv.store.products)
+
+        start = time.perf_counter()
+        if transport == 'async':
+            op = {'create': lambda c: c.batch_create(items, batch_size),
+                  'update': lambda c: c.batch_update(items, batch_size),
+                  'delete': lambda c: c.batch_delete(items, batch_size)}[action]
+            run_client(srv.url, 'ck', 'cs', op, max_in_flight=workers)
+        else:
+            wo = WooDeleter(srv.url, 'ck', 'cs', max_workers=workers, batch_size=batch_size)
+            send = {'create': lambda b: wo._request('POST', '/products/batch', json={'create': b}),
+                    'update': wo.batch_update_products,
+                    'delete': wo.batch_delete_products}[action]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(send, chunked(items, batch_size)))
+        elapsed = time.perf_counter() - start
+        return {'elapsed': elapsed, 'items': products, 'requests': len(srv.request_log)}
+
+
+def run_benchmarks(products, latency, workers):
+    scenarios = {
+        'hide_single': lambda t: bench_hide(t, products, latency, workers, mode='single'),
+        'hide_batch': lambda t: bench_hide(t, products, latency, workers, mode='batch'),
+        # batch nhỏ (10 item) để có nhiều request đang bay, đúng loại tải cần so sánh
+        'batch_create': lambda t: bench_batch(t, 'create', products, latency, workers, batch_size=10),
+        'batch_update': lambda t: bench_batch(t, 'update', products, latency, workers, batch_size=10),
+        'batch_delete': lambda t: bench_batch(t, 'delete', products, latency, workers, batch_size=10),
+    }
+    results = []
+    for name, fn in scenarios.items():
+        for transport in TRANSPORTS:
+            r = fn(transport)
+            r.update(scenario=name, transport=transport,
+                     items_per_sec=round(r['items'] / r['elapsed'], 1),
+                     requests_per_sec=round(r['requests'] / r['elapsed'], 1),
+                     elapsed=round(r['elapsed'], 3))
+            results.append(r)
+            print(f"{name:<14} {transport:<7} {r['elapsed']:>8.3f}s "
+                  f"{r['items_per_sec']:>10.1f} items/s {r['requests_per_sec']:>9.1f} req/s")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark transport thread vs async trên mock WooCommerce')
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.02, help='Độ trễ giả lập mỗi request (giây)')
+    parser.add_argument('--workers', type=int, default=50, help='Số thread / số request async đồng thời')
+    parser.add_argument('--json', help='Ghi kết quả ra file JSON')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.products, args.latency, args.workers)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
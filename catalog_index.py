@@ -0,0 +1,248 @@
+# catalog_index.py
+# Chỉ mục catalog sản phẩm lưu local (SQLite), đồng bộ tăng dần bằng modified_after.
+# Hide / delete lập kế hoạch từ chỉ mục (vài ms) thay vì liệt kê lại toàn bộ store mỗi lần.
+#
+# Lưu ý: modified_after (WooCommerce >= 5.8) không báo sản phẩm đã bị xóa ở nơi khác;
+# các thao tác xóa qua WooDeleter tự cập nhật chỉ mục, còn lại dùng sync(full=True) định kỳ.
+
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from hide_products import HIDE_META_KEY
+from product_records import ProductRef
+
+# Các trường thay đổi liên tục, bỏ khỏi content hash
+_VOLATILE_FIELDS = ('date_modified', 'date_modified_gmt', '_links', 'total_sales')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS products (
+    id                 INTEGER PRIMARY KEY,
+    sku                TEXT,
+    catalog_visibility TEXT,
+    hide_meta          INTEGER NOT NULL DEFAULT 0,
+    content_hash       TEXT,
+    date_modified      TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_products_sku ON products (sku);
+CREATE TABLE IF NOT EXISTS product_categories (
+    product_id  INTEGER NOT NULL,
+    category_id INTEGER NOT NULL,
+    PRIMARY KEY (product_id, category_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_product_categories_cat ON product_categories (category_id, product_id);
+CREATE TABLE IF NOT EXISTS categories (
+    id     INTEGER PRIMARY KEY,
+    parent INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_categories_parent ON categories (parent);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+
+def content_hash(product: dict) -> str:
+    """
+    Hash nội dung sản phẩm (bỏ các trường thay đổi liên tục) để phát hiện thay đổi.
+    """
+    data = {k: v for k, v in product.items() if k not in _VOLATILE_FIELDS}
+    raw = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _has_hide_meta(product: dict) -> bool:
+    return any(m.get('key') == HIDE_META_KEY and m.get('value') == 'yes'
+               for m in product.get('meta_data', []))
+
+
+class CatalogIndex:
+    """
+    Chỉ mục catalog trên đĩa (1 file SQLite cho mỗi store), dùng chung được giữa các thread.
+
+    Lưu cho mỗi sản phẩm: id, SKU, categories, catalog_visibility, meta ẩn
+    (_hwp_hide_product), content hash và date_modified (GMT).
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # ---- trạng thái đồng bộ ----
+    def _get_state(self, key: str):
+        row = self._db.execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str):
+        self._db.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)', (key, value))
+
+    @property
+    def last_modified(self):
+        with self._lock:
+            return self._get_state('last_modified')
+
+    # ---- ghi ----
+    def upsert_products(self, products, advance_watermark: bool = False) -> int:
+        """
+        Ghi/cập nhật sản phẩm (dict JSON từ API), trả về số sản phẩm đã ghi.
+        advance_watermark: chỉ sync() đặt True; ghi từ phản hồi batch của chính mình
+        không được đẩy mốc modified_after, kẻo bỏ sót thay đổi từ nơi khác.
+        """
+        rows, cats, ids = [], [], []
+        newest = None
+        for p in products:
+            if 'id' not in p or p.get('error'):
+                continue
+            modified = p.get('date_modified_gmt') or p.get('date_modified')
+            rows.append((p['id'], p.get('sku'), p.get('catalog_visibility'),
+                         int(_has_hide_meta(p)), content_hash(p), modified))
+            cats.extend((p['id'], c['id']) for c in p.get('categories', []))
+            ids.append((p['id'],))
+            if modified and (newest is None or modified > newest):
+                newest = modified
+        if not rows:
+            return 0
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO products '
+                '(id, sku, catalog_visibility, hide_meta, content_hash, date_modified) '
+                'VALUES (?, ?, ?, ?, ?, ?)', rows)
+            self._db.executemany('DELETE FROM product_categories WHERE product_id = ?', ids)
+            self._db.executemany(
+                'INSERT OR IGNORE INTO product_categories (product_id, category_id) VALUES (?, ?)', cats)
+            last = self._get_state('last_modified')
+            if advance_watermark and newest and (last is None or newest > last):
+                self._set_state('last_modified', newest)
+        return len(rows)
+
+    def remove_products(self, ids) -> None:
+        params = [(pid,) for pid in ids]
+        with self._lock, self._db:
+            self._db.executemany('DELETE FROM product_categories WHERE product_id = ?', params)
+            self._db.executemany('DELETE FROM products WHERE id = ?', params)
+
+    def replace_categories(self, categories) -> None:
+        """
+        Ghi lại toàn bộ cây category (id, parent) từ /products/categories.
+        Dùng để mở rộng category sang các category con khi lập kế hoạch.
+        """
+        rows = [(c['id'], c.get('parent') or 0) for c in categories if 'id' in c]
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM categories')
+            self._db.executemany('INSERT OR REPLACE INTO categories (id, parent) VALUES (?, ?)', rows)
+
+    def mark_hidden(self, ids) -> None:
+        params = [(pid,) for pid in ids]
+        with self._lock, self._db:
+            self._db.executemany(
+                "UPDATE products SET catalog_visibility = 'hidden', hide_meta = 1 WHERE id = ?", params)
+
+    def apply_batch_response(self, resp: dict) -> None:
+        """
+        Cập nhật chỉ mục từ phản hồi /products/batch (chỉ các item không lỗi):
+        'create' / 'update' trả về sản phẩm đầy đủ, 'delete' trả về sản phẩm đã xóa.
+        """
+        if not resp:
+            return
+        self.upsert_products(resp.get('create', []) + resp.get('update', []))
+        deleted = [item['id'] for item in resp.get('delete', []) if 'id' in item and not item.get('error')]
+        if deleted:
+            self.remove_products(deleted)
+
+    # ---- đồng bộ với store ----
+    def sync(self, client, full: bool = False, per_page: int = 100) -> int:
+        """
+        Đồng bộ chỉ mục với store qua WooClient:
+          - lần đầu hoặc full=True: liệt kê toàn bộ, xóa khỏi chỉ mục sản phẩm không còn trên store
+          - các lần sau: chỉ lấy sản phẩm có date_modified_gmt > lần sync trước (modified_after)
+        Cây category (id, parent) luôn được tải lại toàn bộ (ít bản ghi, chỉ 2 trường).
+        Trả về số sản phẩm đã cập nhật.
+        """
+        categories = []
+        for items in client.iter_pages('/products/categories', {'_fields': 'id,parent'}, per_page):
+            categories.extend(items)
+        self.replace_categories(categories)
+
+        last = None if full else self.last_modified
+        params = {'orderby': 'id', 'order': 'asc'}
+        if last:
+            # Lùi 1 giây: modified_after so sánh chặt, sản phẩm sửa cùng giây vẫn được lấy lại
+            since = datetime.fromisoformat(last) - timedelta(seconds=1)
+            params.update(modified_after=since.isoformat(timespec='seconds'), dates_are_gmt='true')
+
+        seen = set()
+        count = 0
+        for items in client.iter_pages('/products', params, per_page):
+            count += self.upsert_products(items, advance_watermark=True)
+            seen.update(p['id'] for p in items)
+
+        if last is None:
+            with self._lock:
+                stale = [pid for (pid,) in self._db.execute('SELECT id FROM products')
+                         if pid not in seen]
+            if stale:
+                self.remove_products(stale)
+            logging.info(f"Catalog index: full sync {count} sản phẩm, xóa {len(stale)} sản phẩm cũ")
+        else:
+            logging.info(f"Catalog index: cập nhật {count} sản phẩm thay đổi từ {last}")
+        return count
+
+    # ---- đọc / lập kế hoạch ----
+    @staticmethod
+    def _category_tree(cat_ids) -> tuple[str, list]:
+        # CTE đệ quy: các category đã cho cùng mọi category con cháu (như filter category= của API)
+        values = ','.join(['(?)'] * len(cat_ids))
+        return (f'WITH RECURSIVE tree(id) AS (VALUES {values} '
+                'UNION SELECT c.id FROM categories c JOIN tree t ON c.parent = t.id) '), list(cat_ids)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM products').fetchone()[0]
+
+    def products_in_category(self, cat_id: int) -> list[ProductRef]:
+        """
+        Sản phẩm thuộc category hoặc category con cháu của nó (giống /products?category=),
+        cùng dạng bản ghi lean như khi liệt kê qua API (ProductRef).
+        """
+        tree, params = self._category_tree([cat_id])
+        with self._lock:
+            rows = self._db.execute(
+                tree + 'SELECT pc.product_id, pc.category_id FROM product_categories pc '
+                'WHERE pc.product_id IN (SELECT product_id FROM product_categories '
+                'WHERE category_id IN (SELECT id FROM tree)) '
+                'ORDER BY pc.product_id', params).fetchall()
+        products = {}
+        for pid, cid in rows:
+            products.setdefault(pid, []).append(cid)
+        return [ProductRef(pid, cids) for pid, cids in products.items()]
+
+    def ids_to_hide(self, cat_ids) -> list[int]:
+        """
+        ID sản phẩm (không trùng) thuộc các category (kể cả category con cháu) và CHƯA bị ẩn.
+        """
+        cat_ids = list(cat_ids)
+        if not cat_ids:
+            return []
+        tree, params = self._category_tree(cat_ids)
+        with self._lock:
+            rows = self._db.execute(
+                tree + 'SELECT DISTINCT p.id FROM products p JOIN product_categories pc ON pc.product_id = p.id '
+                "WHERE pc.category_id IN (SELECT id FROM tree) AND COALESCE(p.catalog_visibility, '') != 'hidden' "
+                'AND p.hide_meta = 0 ORDER BY p.id', params).fetchall()
+        return [pid for (pid,) in rows]
+
+    def find_by_sku(self, sku: str):
+        with self._lock:
+            row = self._db.execute('SELECT id FROM products WHERE sku = ?', (sku,)).fetchone()
+        return row[0] if row else None
@@ -1,6 +1,16 @@
 # delete_produc.py với API Bulk và comment tiếng Việt
 
+import sys
+import threading
 import requests
+from woo_client import WooClient
+from rate_control import make_limiter
+from job_journal import JobJournal, batch_key
+from batch_results import BatchResultTracker
+from batch_sizer import AdaptiveBatchSizer, send_splitting, BATCH_STATE_PATH
+from product_records import ProductRef, DELETE_FIELDS, iter_product_refs
+from request_plan import RequestPlan, plan_delete
+from woo_metrics import metrics_session
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from itertools import islice
 
@@ -18,37 +28,66 @@ class WooDeleter:
     """
     Lớp hỗ trợ xóa và cập nhật hàng loạt sản phẩm qua WooCommerce REST API Bulk endpoints
     """
-    def __init__(self, base_url: str, consumer_key: str, consumer_secret: str, max_workers: int = 10, batch_size: int = 100):
-        # Thiết lập URL cơ bản, phiên làm việc để tái sử dụng kết nối HTTP
-        self.base = base_url.rstrip('/')
-        self.session = requests.Session()                     # reuse TCP connection
-        self.auth = {'consumer_key': consumer_key, 'consumer_secret': consumer_secret}
+    def __init__(self, base_url: str, consumer_key: str, consumer_secret: str, max_workers: int = 10, batch_size: int = 100,
+                 client: WooClient = None, adaptive: bool = True, index=None):
+        # Client dùng chung (connection pool + retry + AIMD limiter); key gửi qua query params như trước.
+        # Kết nối đồng thời: pool batch (max_workers) + thread của từng category (gửi lại retry,
+        # kiểm tra / xóa category, tối đa max_workers) + thread chính
+        self.client = client or WooClient(base_url, consumer_key, consumer_secret,
+                                          pool_size=max_workers * 2 + 1, query_string_auth=True,
+                                          limiter=make_limiter(max_workers, adaptive))
+        self.base = self.client.base
+        self.session = self.client.session                     # reuse TCP connection
         self.max_workers = max_workers                         # số worker cho ThreadPool
         self.batch_size = batch_size                           # kích thước batch cho Bulk API
+        self.index = index                                     # CatalogIndex local (tùy chọn)
+        # Giới hạn tổng số trang đang tải khi nhiều category được liệt kê song song
+        # (mỗi category tải tối đa max_workers trang) -> không vượt pool_size kết nối
+        self.list_slots = threading.BoundedSemaphore(max_workers)
 
-    def _request(self, method, path, params=None, json=None, timeout=60):
+    def _request(self, method, path, params=None, json=None, timeout=None, idempotent=None):
         # Gửi request HTTP chung cho GET/POST/DELETE/PUT đến WooCommerce API
-        p = params.copy() if params else {}
-        p.update(self.auth)
-        url = f"{self.base}/wp-json/wc/v3{path}"
-        resp = self.session.request(method, url, params=p, json=json, timeout=timeout)
-        resp.raise_for_status()
-        return resp.json()
+        return self.client.request_json(method, path, params=params, json=json,
+                                        timeout=timeout, idempotent=idempotent)
 
     def list_products_by_category(self, cat_id):
         """
-        Lấy danh sách tất cả sản phẩm (object) thuộc category cho trước
-        Trả về list các dict sản phẩm
+        Lấy danh sách tất cả sản phẩm thuộc category cho trước
+        Trả về list ProductRef (id + ID category): chỉ xin `_fields=id,categories` và
+        không giữ JSON đầy đủ, đủ cho việc phân loại update / delete
+        Nếu có catalog index: đọc từ index, không gọi API
+        Các trang sau trang đầu được tải song song (tối đa max_workers trang, WooClient.iter_pages),
+        tổng cho mọi category đang liệt kê song song cũng tối đa max_workers (self.list_slots)
         """
-        all_items = []
-        page = 1
-        while True:
-            items = self._request('GET', '/products', {'category': cat_id, 'per_page': 100, 'page': page})
-            if not items:
-                break
-            all_items.extend(items)
-            page += 1
-        return all_items
+        if self.index is not None:
+            return self.index.products_in_category(cat_id)
+        return list(iter_product_refs(self.client, {'category': cat_id}, self.max_workers, self.list_slots))
+
+    def category_is_empty(self, cat_id) -> bool:
+        """
+        Category còn sản phẩm không: 1 request per_page=1 đọc X-WP-Total (WooClient.count)
+        thay vì liệt kê lại cả category; có catalog index thì đọc từ index.
+        """
+        if self.index is not None:
+            return not self.index.products_in_category(cat_id)
+        return self.client.count('/products', {'category': cat_id}) == 0
+
+    def get_products(self, ids) -> dict:
+        """
+        Lấy nhiều sản phẩm theo ID bằng /products?include=... (mỗi request tối đa batch_size ID),
+        các request chạy song song (max_workers). Trả về dict id -> ProductRef;
+        ID không tồn tại không có trong kết quả.
+        """
+        def fetch(chunk):
+            params = {'include': ','.join(map(str, chunk)), 'per_page': len(chunk), '_fields': DELETE_FIELDS}
+            return self._request('GET', '/products', params)
+
+        found = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for page in pool.map(fetch, chunked(sorted(set(ids)), self.batch_size)):
+                for product in page:
+                    found[product['id']] = ProductRef.from_json(product)
+        return found
 
     def batch_delete_products(self, ids: list[int]):
         """
@@ -56,7 +95,10 @@ class WooDeleter:
         Sử dụng endpoint /products/batch với action 'delete'
         """
         data = {'delete': ids, 'force': True}
-        return self._request('POST', '/products/batch', json=data)
+        resp = self._request('POST', '/products/batch', json=data, idempotent=True)
+        if self.index is not None:
+            self.index.apply_batch_response(resp)
+        return resp
 
     def batch_update_products(self, payload: list[dict]):
         """
@@ -64,7 +106,10 @@ class WooDeleter:
         Mỗi item trong payload là dict {'id': pid, 'categories':[{'id':cid},...]}
         """
         data = {'update': payload}
-        return self._request('POST', '/products/batch', json=data)
+        resp = self._request('POST', '/products/batch', json=data, idempotent=True)
+        if self.index is not None:
+            self.index.apply_batch_response(resp)
+        return resp
 
     def delete_category(self, cat_id: int):
         """
@@ -79,146 +124,372 @@ class WooDeleter:
         return self._request('DELETE', f'/products/categories/{cat_id}', {'force': True})
 
 
-def run_delete(base_url, consumer_key, consumer_secret, max_workers):
+def read_association_lines(lines, stop_at_blank: bool = False):
+    """
+    Đọc các dòng 'product_id,cat_id1,cat_id2,...' (thao tác 4), bỏ qua dòng trống.
+    stop_at_blank: dừng ở dòng trống (nhập tay trên stdin), file thì đọc tới hết.
+    Trả về dict product_id -> set ID category cần bỏ (dòng trùng product được gộp).
+    """
+    removals = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            if stop_at_blank:
+                break
+            continue
+        parts = [int(x) for x in line.split(',') if x.strip().isdigit()]
+        if not parts:
+            print(f"❗ Bỏ qua dòng không hợp lệ: {line}")
+            continue
+        removals.setdefault(parts[0], set()).update(parts[1:])
+    return removals
+
+
+def run_delete(base_url, consumer_key, consumer_secret, max_workers, transport='thread', adaptive=True,
+               index=None, journal_path=None, resume=False, dead_letter_path=None, dry_run=False,
+               metrics_json=None, metrics_prom=None, choice=None, category_ids=None, product_ids=None,
+               associations_path=None, adaptive_batch=True, batch_state_path=BATCH_STATE_PATH):
     """
-    Hàm chính: hiển thị menu lựa chọn và thực thi các thao tác xóa/cập nhật
+    Hàm chính: hiển thị menu lựa chọn và thực thi các thao tác xóa/cập nhật.
+    Truyền choice (và dữ liệu của thao tác đó) để chạy không cần input() (job_runner).
     Tham số:
       - base_url, consumer_key, consumer_secret: thông tin kết nối API
       - max_workers: số luồng tối đa cho ThreadPool
-      - categories: danh sách ID category khả dụng (được truyền từ main)
+                     (transport='async': số request đồng thời tối đa)
+      - transport: 'thread' (mặc định) hoặc 'async' (asyncio/aiohttp) cho batch update/delete
+      - adaptive: tự điều chỉnh số request đồng thời (AIMD) dưới trần max_workers
+      - index: CatalogIndex (tùy chọn) - sync tăng dần 1 lần rồi lập kế hoạch xóa từ index
+      - journal_path: file journal ghi kết quả từng batch / category đã xóa (job_journal.JobJournal)
+      - resume: tiếp tục từ journal_path, bỏ qua batch và category đã xong ở lần chạy trước
+      - dead_letter_path: file ghi item lỗi vĩnh viễn (.csv hoặc .jsonl); item lỗi tạm thời
+        trong phản hồi batch được tự gửi lại (batch_results.BatchResultTracker)
+      - dry_run: chỉ in kế hoạch request (số trang / batch / API call, thời gian ước tính
+        theo latency probe X-WP-Total) cho thao tác đã chọn, không thay đổi gì trên store
+      - metrics_json, metrics_prom: file JSON summary / Prometheus text của metrics request
+        (woo_metrics); dòng tiến độ được in định kỳ trong lúc chạy
+      - choice: thao tác '1'-'4' (None = hỏi qua menu)
+      - category_ids: ID các category cho thao tác 1 / 2 (None = chọn từ danh sách category của store)
+      - product_ids: ID sản phẩm cho thao tác 3 (None = nhập tay)
+      - associations_path: file dòng product_id,cat_id1,... cho thao tác 4 ('-' = stdin, None = hỏi)
+      - adaptive_batch: tự chỉnh số item / batch update / delete theo latency (batch_sizer), bắt đầu
+        từ kích thước đã lưu của store trong batch_state_path (None = không lưu); có journal_path
+        thì cố định 100 để resume khớp batch. Batch lỗi vì quá lớn được chia đôi và gửi lại
+    Trả về summary batch (BatchResultTracker.summary), plan dict nếu dry_run, None nếu không chạy gì.
     """
-    wo = WooDeleter(base_url, consumer_key, consumer_secret, max_workers, batch_size=100)
+    with metrics_session('delete', metrics_json, metrics_prom):
+        return _run_delete(base_url, consumer_key, consumer_secret, max_workers, transport, adaptive,
+                           index, journal_path, resume, dead_letter_path, dry_run,
+                           choice, category_ids, product_ids, associations_path,
+                           adaptive_batch, batch_state_path)
 
-    categories = []
-    page = 1
-    while True:
-        cat_data = wo._request('GET', '/products/categories', {'per_page': 100, 'page': page})
-        if not cat_data:
-            break
-        categories.extend(cat_data)
-        page += 1
-
-    # Hiển thị menu chức năng
-    menu = '''
-=== XÓA SẢN PHẨM (Delete Products) ===
-1. Remove association khỏi Category A (nếu rỗng thì xóa product + delete Category A)
-2. Xóa hẳn products trong Category A + delete Category A
-3. Xóa product theo ID (xóa hẳn)
-4. Remove association theo ID trong Category
-'''
-    print(menu)
-    choice = input("Chọn (1-4): ").strip()
-
-    # NẾU choice 1 hoặc 2, cần cho người dùng chọn danh sách category
-    if choice in {'1', '2'}:
-        print("Danh sách Category khả dụng:")
-        for idx, cid in enumerate(categories, 1):
-            print(f"{idx}. {cid}")
-        sel = input("Chọn categories (vd: 1,3,5): ").strip()
-        idxs = [int(x)-1 for x in sel.split(',') if x.strip().isdigit()]
-        selected = [categories[i] for i in idxs if 0 <= i < len(categories)]
-        if not selected:
-            print("❗ Chưa chọn category nào. Thoát.")
+
+def _run_delete(base_url, consumer_key, consumer_secret, max_workers, transport, adaptive,
+                index, journal_path, resume, dead_letter_path, dry_run,
+                choice, category_ids, product_ids, associations_path, adaptive_batch, batch_state_path):
+    # Phần chạy thật của run_delete() (trong metrics_session)
+    # Import muộn: woo_async import lại chunked từ module này
+    from woo_async import check_transport, run_client
+    check_transport(transport)
+    wo = WooDeleter(base_url, consumer_key, consumer_secret, max_workers, batch_size=100, adaptive=adaptive,
+                    index=index)
+    if index is not None:
+        index.sync(wo.client)
+    journal = None
+    if journal_path and not dry_run:
+        journal = JobJournal(journal_path, job={'kind': 'delete', 'url': wo.base}, resume=resume)
+    tracker = BatchResultTracker(dead_letter_path,
+                                 on_settled=journal and (lambda key: journal.record(key, 'done', retried=True)))
+    # Số item / batch update / delete: tự chỉnh theo latency, lưu theo store (batch_sizer)
+    sizer = AdaptiveBatchSizer(wo.batch_size, adaptive=adaptive_batch and not journal_path,
+                               store=wo.base, operation='delete', state_path=batch_state_path)
+
+    def record(batch, resp, action, outcome):
+        if journal is not None:
+            inputs = batch if action == 'delete' else [item['id'] for item in batch]
+            # Còn item chờ retry: 'done' được ghi khi các item đó xong (tracker.on_settled)
+            journal.record(batch_key(action, batch), 'retrying' if outcome.get('retry') else 'done',
+                           inputs, action=action, items=len((resp or {}).get(action, [])))
+
+    def finish(action, batch, resp, done_msg, group, error=None, retry=False):
+        # Đọc kết quả từng item: item lỗi tạm thời -> chờ retry, lỗi vĩnh viễn -> dead-letter
+        # error: request lỗi hẳn (client đã tự retry) -> cả batch vào dead-letter, không ghi journal
+        # retry: body gửi lại không có khóa journal riêng, item được tính cho batch gốc (on_settled)
+        key = batch_key(action, batch) if journal is not None and not retry else None
+        outcome = tracker.handle({action: batch}, resp, error, group=group, key=key)
+        if error is None and key is not None:
+            record(batch, resp, action, outcome)
+        msg = done_msg.format(outcome.get('ok', 0))
+        if outcome.get('retry') or outcome.get('dead'):
+            msg += f" (lỗi: retry {outcome.get('retry', 0)}, dead-letter {outcome.get('dead', 0)})"
+        print(msg)
+        return outcome.get('dead', 0)
+
+    # Batch update/delete (transport='thread') của mọi thao tác / category dùng chung 1 pool
+    # max_workers thread -> tổng số batch đang gửi không vượt quá max_workers
+    pool = ThreadPoolExecutor(max_workers=max_workers) if transport != 'async' else None
+
+    def send_batches(action, items, done_msg, scope=None):
+        """
+        Gửi batch 'update' / 'delete' theo transport đã chọn, in done_msg cho mỗi batch,
+        rồi gửi lại các item lỗi tạm thời. Trả về số item lỗi vĩnh viễn (dead-letter).
+        transport='thread': các batch được gửi song song qua pool, hàm chỉ trả về khi mọi batch
+        (kể cả retry) đã xong; scope (ví dụ ID category) tách hàng đợi retry khi nhiều
+        category chạy song song. Kích thước batch = sizer.target lúc gọi; batch lỗi vì quá lớn
+        được chia đôi và gửi lại (batch_sizer.send_splitting).
+        """
+        group = (scope, action)
+        size = sizer.target
+        if journal is not None:
+            # Resume: bỏ các batch đã xong, gom lại phần còn lại
+            batches = list(chunked(items, size))
+            todo = [b for b in batches if not journal.is_done(batch_key(action, b))]
+            if len(todo) < len(batches):
+                print(f"↷ Bỏ qua {len(batches) - len(todo)} batch {action} đã xong (resume)")
+            items = [item for b in todo for item in b]
+        if not items:
+            return 0
+        dead = 0
+        post = wo.batch_update_products if action == 'update' else wo.batch_delete_products
+        send = lambda body: send_splitting(lambda b: post(b[action]), body, sizer)
+        if transport == 'async':
+            if action == 'update':
+                op = lambda c: c.batch_update(items, size, sizer=sizer)
+            else:
+                op = lambda c: c.batch_delete(items, size, sizer=sizer)
+            # Chunk lỗi hẳn đã thành failed_result trong woo_async._batch; cả lượt chạy lỗi
+            # (vd không mở được session) -> mọi batch xử lý như batch lỗi của transport='thread'
+            try:
+                results, error = run_client(base_url, consumer_key, consumer_secret, op,
+                                            max_in_flight=max_workers, query_string_auth=True,
+                                            limiter=make_limiter(max_workers, adaptive, use_async=True)), None
+            except Exception as e:
+                results, error = None, e
+            batches = list(chunked(items, size))
+            for batch, resp in zip(batches, results or [None] * len(batches)):
+                if index is not None:
+                    index.apply_batch_response(resp)
+                tracker.begin(group)
+                dead += finish(action, batch, resp, done_msg, group, error)
+        else:
+            futures = {}
+            for batch in chunked(items, size):
+                tracker.begin(group)
+                futures[pool.submit(send, {action: batch})] = batch
+            # Xử lý kết quả theo thứ tự hoàn thành
+            for fut in as_completed(futures):
+                error = fut.exception()
+                dead += finish(action, futures[fut], None if error else fut.result(), done_msg, group, error)
+        # Item lỗi tạm thời được gom thành batch mới khi tới hạn backoff (ít item -> gửi tuần tự)
+        for body in tracker.iter_retry_bodies(size, group=group):
+            try:
+                resp, error = send(body), None
+            except Exception as e:
+                resp, error = None, e
+            dead += finish(action, body[action], resp, "↻ Gửi lại thành công {} products", group, error,
+                           retry=True)
+        return dead
+
+    def delete_category(cat_id):
+        # Xóa category, ghi vào journal; resume: category đã xóa ở lần trước thì bỏ qua
+        key = f"category:{cat_id}"
+        if journal is not None and journal.is_done(key):
             return
+        wo.delete_category(cat_id)
+        if journal is not None:
+            journal.record(key, 'done', [cat_id], action='delete_category')
 
-    # THAO TÁC 1: remove association khỏi category và xóa orphan products
-    if choice == '1':
-        for cat in selected:
-            cat_id = cat['id']
-            print(f"\n⏳ Xử lý Category {cat} …")
-            prods = wo.list_products_by_category(cat_id)
-            to_update, to_delete = [], []
-
-            # Phân loại: sản phẩm có nhiều category thì update, khác thì delete
-            for p in prods:
-                pid = p['id']
-                cats = [c['id'] for c in p['categories']]
-                if len(cats) > 1:
-                    # giữ các category khác, bỏ cat hiện tại
-                    new_cats = [c for c in cats if c != cat]
-                    to_update.append({'id': pid, 'categories': [{'id': cid} for cid in new_cats]})
-                else:
-                    # orphan -> xóa hẳn
-                    to_delete.append(pid)
-
-            # Bulk cập nhật categories
-            for batch in chunked(to_update, wo.batch_size):
-                wo.batch_update_products(batch)
-                print(f"✔ Updated categories cho {len(batch)} products")
-
-            # Bulk xóa products orphan
-            for batch in chunked(to_delete, wo.batch_size):
-                wo.batch_delete_products(batch)
-                print(f"✔ Deleted {len(batch)} orphan products")
-
-            # Cuối cùng xóa category trống
-            wo.delete_category(cat_id)
-            print(f"✔ Deleted Category {cat}")
-
-    # THAO TÁC 2: xóa hẳn tất cả sản phẩm trong category và xóa category
-    elif choice == '2':
-        for cat in selected:
-            cat_id = cat['id']
-            print(f"\n⏳ Xóa hẳn products & Category {cat} …")
-            prods = wo.list_products_by_category(cat_id)
-            if not prods:
-                print(f"❗ Không có sản phẩm trong Category {cat['name']}.")
-            ids = [p['id'] for p in prods]
-            # Bulk delete theo batch
-            for batch in chunked(ids, wo.batch_size):
-                wo.batch_delete_products(batch)
-                print(f"✔ Deleted {len(batch)} products")
-            # Xóa category sau cùng
-             # Kiểm tra xem còn sản phẩm nào trong category không
-            remaining_products = wo.list_products_by_category(cat_id)
-            if len(remaining_products) == 0:
-                # Nếu không còn sản phẩm nào thì xóa category
-                print(f"⏳ Đang xóa Category {cat['name']} ...")
-                wo.delete_category(cat_id)
-                print(f"✔ Đã xóa Category {cat['name']}")
+    try:
+        categories = wo.client.list_all('/products/categories', concurrency=max_workers)
+
+        # Hiển thị menu chức năng
+        menu = '''
+    === XÓA SẢN PHẨM (Delete Products) ===
+    1. Remove association khỏi Category A (nếu rỗng thì xóa product + delete Category A)
+    2. Xóa hẳn products trong Category A + delete Category A
+    3. Xóa product theo ID (xóa hẳn)
+    4. Remove association theo ID trong Category
+    '''
+        if choice is None:
+            print(menu)
+            choice = input("Chọn (1-4): ").strip()
+        choice = str(choice)
+
+        # NẾU choice 1 hoặc 2 mà chưa truyền category_ids, cần cho người dùng chọn danh sách category
+        if choice in {'1', '2'} and category_ids is not None:
+            by_id = {cat['id']: cat for cat in categories}
+            unknown = [cid for cid in category_ids if cid not in by_id]
+            if unknown:
+                print(f"❗ Category không tồn tại, bỏ qua: {unknown}")
+            selected = [by_id[cid] for cid in dict.fromkeys(category_ids) if cid in by_id]
+            if not selected:
+                print("❗ Không có category hợp lệ nào. Thoát.")
+                return None
+        elif choice in {'1', '2'}:
+            print("Danh sách Category khả dụng:")
+            for idx, cid in enumerate(categories, 1):
+                print(f"{idx}. {cid}")
+            sel = input("Chọn categories (vd: 1,3,5): ").strip()
+            idxs = [int(x)-1 for x in sel.split(',') if x.strip().isdigit()]
+            selected = [categories[i] for i in idxs if 0 <= i < len(categories)]
+            if not selected:
+                print("❗ Chưa chọn category nào. Thoát.")
+                return None
+
+        def purge_categories(selected, remove_association):
+            """
+            Thao tác 1 / 2 cho các category đã chọn, chạy song song:
+              1. liệt kê sản phẩm của từng category (song song)
+              2. lập kế hoạch chung: mỗi sản phẩm chỉ thuộc 1 category "chủ" (category chọn đầu tiên
+                 chứa nó) để không bị update / delete 2 lần khi nằm trong nhiều category đã chọn;
+                 thao tác 1: bỏ mọi category đã chọn, còn category khác thì update, không còn thì delete
+              3. gửi batch update / delete của từng category chủ (song song, qua pool chung)
+              4. xóa category chỉ SAU KHI mọi batch chứa sản phẩm của nó đã xong và không có item lỗi
+            """
+            selected_ids = {cat['id'] for cat in selected}
+            workers = 1 if transport == 'async' else min(len(selected), max_workers)
+            with ThreadPoolExecutor(max_workers=workers) as cat_pool:
+                cat_ids = [cat['id'] for cat in selected]
+                listed = dict(zip(cat_ids, cat_pool.map(wo.list_products_by_category, cat_ids)))
+                owner, plans, deps = {}, {}, {}
+                for cat in selected:
+                    cat_id = cat['id']
+                    to_update, to_delete = [], []
+                    for p in listed[cat_id]:
+                        if owner.setdefault(p.id, cat_id) != cat_id:
+                            continue
+                        new_cats = [c for c in p.category_ids if c not in selected_ids] if remove_association else []
+                        if new_cats:
+                            # giữ các category khác, bỏ category đã chọn
+                            to_update.append({'id': p.id, 'categories': [{'id': cid} for cid in new_cats]})
+                        else:
+                            # orphan (thao tác 1) hoặc xóa hẳn (thao tác 2)
+                            to_delete.append(p.id)
+                    plans[cat_id] = (to_update, to_delete)
+                    deps[cat_id] = {owner[p.id] for p in listed[cat_id]}
+                    if not listed[cat_id] and not remove_association:
+                        print(f"❗ Không có sản phẩm trong Category {cat['name']}.")
+
+                def send_plan(cat):
+                    to_update, to_delete = plans[cat['id']]
+                    name = cat['name']
+                    failed = send_batches('update', to_update, f"✔ [{name}] Updated categories cho {{}} products",
+                                          cat['id'])
+                    failed += send_batches('delete', to_delete, f"✔ [{name}] Deleted {{}} products", cat['id'])
+                    return failed
+
+                # Bulk cập nhật / xóa; item lỗi vĩnh viễn thì giữ lại category để xử lý sau
+                jobs = {cat['id']: cat_pool.submit(send_plan, cat) for cat in selected}
+                for cat in selected:
+                    cat_id, name = cat['id'], cat['name']
+                    try:
+                        failed = sum(jobs[dep].result() for dep in deps[cat_id] | {cat_id})
+                    except Exception as e:
+                        print(f"✖ Lỗi khi xử lý Category {name}: {e}")
+                        continue
+                    if failed:
+                        print(f"❗ {failed} sản phẩm lỗi (xem dead-letter), giữ lại Category {name}.")
+                        continue
+                    # Kiểm tra xem còn sản phẩm nào trong category không
+                    if not remove_association and not wo.category_is_empty(cat_id):
+                        print(f"❗ Category {name} vẫn còn sản phẩm, không thể xóa.")
+                        continue
+                    # Cuối cùng xóa category trống
+                    print(f"⏳ Đang xóa Category {name} ...")
+                    delete_category(cat_id)
+                    print(f"✔ Đã xóa Category {name}")
+
+        # THAO TÁC 1: remove association khỏi category và xóa orphan products
+        # THAO TÁC 2: xóa hẳn tất cả sản phẩm trong category và xóa category
+        result = None
+        if choice in {'1', '2'}:
+            if dry_run:
+                result = plan_delete(wo.client, [cat['id'] for cat in selected], choice == '1',
+                                     sizer.target, max_workers).report()
             else:
-                print(f"❗ Category {cat['name']} vẫn còn sản phẩm, không thể xóa.")
-
-    # THAO TÁC 3: xóa sản phẩm theo list ID nhập tay
-    elif choice == '3':
-        print("Nhập danh sách Product ID (mỗi ID 1 dòng), blank để kết thúc:")
-        ids = []
-        while True:
-            line = input().strip()
-            if not line:
-                break
-            if line.isdigit():
-                ids.append(int(line))
-        # Bulk delete theo batch
-        for batch in chunked(ids, wo.batch_size):
-            wo.batch_delete_products(batch)
-            print(f"✔ Deleted {len(batch)} products")
-
-    # THAO TÁC 4: remove association theo các cặp product/category
-    elif choice == '4':
-        print("Nhập mỗi dòng: product_id,cat_id1,cat_id2,... (blank để kết thúc):")
-        updates, deletes = [], []
-        while True:
-            line = input().strip()
-            if not line:
-                break
-            parts = [int(x) for x in line.split(',') if x.strip().isdigit()]
-            pid, rem = parts[0], parts[1:]
-            prod = wo._request('GET', f'/products/{pid}')
-            current = [c['id'] for c in prod['categories']]
-            new = [c for c in current if c not in rem]
-            if new:
-                updates.append({'id': pid, 'categories': [{'id': cid} for cid in new]})
+                print(f"\n⏳ Xử lý {len(selected)} category …")
+                purge_categories(selected, remove_association=(choice == '1'))
+
+        # THAO TÁC 3: xóa sản phẩm theo list ID nhập tay
+        elif choice == '3':
+            if product_ids is not None:
+                ids = [int(pid) for pid in product_ids]
             else:
-                deletes.append(pid)
-
-        # Bulk update/remove
-        for batch in chunked(updates, wo.batch_size):
-            wo.batch_update_products(batch)
-            print(f"✔ Updated {len(batch)} products")
-        for batch in chunked(deletes, wo.batch_size):
-            wo.batch_delete_products(batch)
-            print(f"✔ Deleted {len(batch)} products")
-
-    else:
-        print("❗ Lựa chọn không hợp lệ.")
+                print("Nhập danh sách Product ID (mỗi ID 1 dòng), blank để kết thúc:")
+                ids = []
+                while True:
+                    line = input().strip()
+                    if not line:
+                        break
+                    if line.isdigit():
+                        ids.append(int(line))
+            if dry_run:
+                plan = RequestPlan(f"Xóa {len(ids)} product theo ID", max_workers)
+                plan.probe(wo.client, '/products')      # chỉ để đo latency
+                plan.add('Batch delete', 'batch', -(-len(ids) // sizer.target), len(ids))
+                result = plan.report()
+            else:
+                # Bulk delete theo batch
+                send_batches('delete', ids, "✔ Deleted {} products")
+
+        # THAO TÁC 4: remove association theo các cặp product/category
+        elif choice == '4':
+            if associations_path is not None:
+                path = '' if associations_path == '-' else associations_path
+            else:
+                path = input("Nhập file chứa các dòng product_id,cat_id1,cat_id2,... (Enter = dán vào stdin): ").strip()
+            if path:
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        removals = read_association_lines(f)
+                except OSError as e:
+                    print(f"✖ Không đọc được file {path}: {e}")
+                    removals = {}
+            else:
+                if associations_path is None:
+                    print("Nhập mỗi dòng: product_id,cat_id1,cat_id2,... (blank / EOF để kết thúc):")
+                removals = read_association_lines(sys.stdin, stop_at_blank=associations_path is None)
+
+            # Tra category hiện tại của mọi sản phẩm bằng /products?include=... (100 ID / request, song song)
+            products = wo.get_products(removals)
+            missing = [pid for pid in removals if pid not in products]
+            if missing:
+                print(f"❗ {len(missing)} sản phẩm không tồn tại, bỏ qua: "
+                      f"{missing[:20]}{' …' if len(missing) > 20 else ''}")
+            updates, deletes = [], []
+            for pid, rem in removals.items():
+                if pid not in products:
+                    continue
+                new = [c for c in products[pid].category_ids if c not in rem]
+                if new:
+                    updates.append({'id': pid, 'categories': [{'id': cid} for cid in new]})
+                else:
+                    deletes.append(pid)
+
+            if dry_run:
+                plan = RequestPlan(f"Remove association {len(removals)} product", max_workers)
+                plan.probe(wo.client, '/products')      # chỉ để đo latency
+                plan.add('Tra sản phẩm (include=)', 'list', -(-len(removals) // wo.batch_size), len(removals))
+                plan.add('Batch update', 'batch', -(-len(updates) // sizer.target), len(updates))
+                plan.add('Batch delete', 'batch', -(-len(deletes) // sizer.target), len(deletes))
+                result = plan.report()
+            else:
+                # Bulk update/remove
+                send_batches('update', updates, "✔ Updated {} products")
+                send_batches('delete', deletes, "✔ Deleted {} products")
+
+        else:
+            print("❗ Lựa chọn không hợp lệ.")
+
+        if not dry_run and choice in {'1', '2', '3', '4'}:
+            sizer.save()
+            result = tracker.summary()
+            result['batch_size'] = sizer.snapshot()
+    finally:
+        # Dọn dẹp cả khi thao tác lỗi giữa chừng (Ctrl+C, lỗi mạng khi liệt kê...)
+        if pool is not None:
+            pool.shutdown()
+        tracker.close()
+        # Mỗi dòng journal đã được flush khi ghi; close() chỉ fsync phần còn lại xuống đĩa
+        if journal is not None:
+            journal.close()
+    return result
@@ -1,66 +1,346 @@
+import os
 import csv
 import sys
+import time
+import heapq
+import threading
+from collections import Counter
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import whois
+from whois_cache import WhoisCache
+from whois_scheduler import WhoisScheduler
 
+# File cache WHOIS mặc định (dùng lại giữa các lần chạy)
+WHOIS_CACHE_PATH = 'whois_cache.sqlite'
+# Số dòng CSV đọc mỗi lần ở chế độ streaming
+CHUNK_ROWS = 200_000
 
-def get_domain_age(domain):
-    """Trả về tuổi domain (năm), hoặc None nếu không tra được"""
+
+def lookup_creation_date(domain):
+    """Tra WHOIS, trả về (ngày tạo hoặc None, failed) - failed = True nếu lookup lỗi"""
+    import whois    # import lúc cần: python-whois chỉ dùng khi phải tra thật (cache miss)
     print ('domain' ,domain)
     try:
-        # w = whois.whois(domain)
-        try:
-            w = whois.whois(domain)
-        except Exception as e:
-            print(f"✖ Lỗi khi gọi whois.whois({domain}): {e}")
-            return None
-        created = w.creation_date
-        if isinstance(created, list):
-            created = created[0]
-        if not created:
-            return None
-        age = (datetime.now() - created).days / 365.25
-        return round(age, 2)
-    except Exception:
+        w = whois.whois(domain)
+    except Exception as e:
+        print(f"✖ Lỗi khi gọi whois.whois({domain}): {e}")
+        return None, True
+    created = w.creation_date
+    if isinstance(created, list):
+        created = created[0]
+    if not isinstance(created, datetime):
+        return None, False
+    return created, False
+
+
+def age_from_created(created):
+    """Tuổi domain (năm) từ ngày tạo, None nếu không có ngày tạo"""
+    if not created:
+        return None
+    age = (datetime.now(created.tzinfo) - created).days / 365.25
+    return round(age, 2)
+
+
+def get_domain_age(domain, cache=None):
+    """Trả về tuổi domain (năm), hoặc None nếu không tra được; cache: WhoisCache (tùy chọn)"""
+    if cache is not None:
+        hit, created = cache.get(domain)
+        if hit:
+            return age_from_created(created)
+    created, failed = lookup_creation_date(domain)
+    if cache is not None:
+        cache.put(domain, created, failed)
+    return age_from_created(created)
+
+
+def _pandas():
+    # pandas chỉ dùng để lọc trước theo cột (nhanh hơn nhiều với file hàng triệu dòng);
+    # không có thì đọc bằng csv thuần
+    try:
+        import pandas
+    except ImportError:
         return None
+    return pandas
+
+
+def _iter_rows_pandas(pd, path, domain_col, price_col, max_price, tld, chunk_rows, stats):
+    reader = pd.read_csv(path, usecols=[domain_col, price_col], dtype=str,
+                         keep_default_na=False, chunksize=chunk_rows)
+    for chunk in reader:
+        stats['rows'] += len(chunk)
+        # Lọc vector hóa cả chunk: giá parse được, <= max_price, đúng đuôi tên miền
+        domains = chunk[domain_col].str.strip()
+        prices = pd.to_numeric(chunk[price_col].str.strip(), errors='coerce')
+        mask = domains.ne('')
+        stats['bad_price'] += int((prices.isna() & mask).sum())
+        mask &= prices.notna()
+        if max_price is not None:
+            mask &= prices <= max_price
+        if tld:
+            mask &= domains.str.lower().str.endswith(tld)
+        for d, p in zip(domains[mask].tolist(), prices[mask].tolist()):
+            yield {'domain': d, 'price': p}
+
+
+def _iter_rows_csv(path, domain_col, price_col, max_price, tld, stats):
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            stats['rows'] += 1
+            d = (row.get(domain_col) or '').strip()
+            if not d:
+                continue
+            try:
+                price = float((row.get(price_col) or '').strip())
+            except ValueError:
+                stats['bad_price'] += 1
+                continue
+            if max_price is not None and price > max_price:
+                continue
+            if tld and not d.lower().endswith(tld):
+                continue
+            yield {'domain': d, 'price': price}
+
+
+def iter_domains_from_csv(path, domain_col, price_col='price', max_price=None, tld=None,
+                          chunk_rows=CHUNK_ROWS, stats=None):
+    """
+    Đọc CSV theo kiểu streaming, sinh {'domain': ..., 'price': ...} đã lọc trước theo
+    giá (<= max_price) và đuôi tên miền (tld, ví dụ '.com') - không giữ cả file trong bộ nhớ.
+    Có pandas: đọc từng chunk chunk_rows dòng và lọc vector hóa; không có: csv thuần.
+    stats (dict, tùy chọn): được cập nhật 'rows', 'bad_price' (giá không parse được), 'kept'.
+    """
+    stats = stats if stats is not None else {}
+    for key in ('rows', 'bad_price', 'kept'):
+        stats.setdefault(key, 0)
+    tld = tld.lower() if tld else None
+    pd = _pandas()
+    if pd is not None:
+        rows = _iter_rows_pandas(pd, path, domain_col, price_col, max_price, tld, chunk_rows, stats)
+    else:
+        rows = _iter_rows_csv(path, domain_col, price_col, max_price, tld, stats)
+    for dom in rows:
+        stats['kept'] += 1
+        yield dom
 
 
 def load_domains_from_csv(path, domain_col, price_col='price'):
     """Đọc file CSV và trả về list các dict: {'domain': ..., 'price': ...} """
-    domains = []
+    stats = {}
     try:
-        with open(path, newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                d = row.get(domain_col, '').strip()
-                p = row.get(price_col, '').strip()
-                try:
-                    price = float(p)
-                except:
-                    continue
-                if d:
-                    domains.append({'domain': d, 'price': price})
+        domains = list(iter_domains_from_csv(path, domain_col, price_col, stats=stats))
     except FileNotFoundError:
         print(f"Không tìm thấy file: {path}")
+        return []
+    if stats['bad_price']:
+        print(f"⚠ Bỏ qua {stats['bad_price']} dòng có giá không hợp lệ")
     return domains
 
 
-def filter_domains(domains, min_age, max_price, max_workers=3):
-    """Lọc các domain thỏa mãn tuổi >= min_age và giá <= max_price"""
+class ResultWriter:
+    """
+    Ghi domain thỏa mãn ra CSV ngay khi xác nhận được: flush sau mỗi flush_every dòng
+    hoặc flush_interval giây (kèm fsync), nên dừng giữa chừng vẫn giữ được kết quả đã có.
+    """
+    FIELDS = ['domain', 'age', 'price']
+
+    def __init__(self, path, flush_every=20, flush_interval=5.0):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.count = 0
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=self.FIELDS)
+        self._writer.writeheader()
+        self._file.flush()
+
+    def write(self, result):
+        with self._lock:
+            self._writer.writerow({k: result[k] for k in self.FIELDS})
+            self.count += 1
+            self._unflushed += 1
+            if (self._unflushed >= self.flush_every
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush()
+
+    def _flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._flush()
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def filter_domains(domains, min_age, max_price, max_workers=32, cache=None, scheduler=None, top_k=None,
+                   on_result=None):
+    """
+    Lọc các domain thỏa mãn tuổi >= min_age và giá <= max_price
+    domains: list hoặc iterable (ví dụ iter_domains_from_csv) - chỉ được duyệt 1 lần
+    max_workers: tổng số lookup WHOIS đồng thời tối đa (mọi registry)
+    cache: WhoisCache - domain còn hạn trong cache được xử lý ngay,
+           chỉ domain chưa có / hết hạn mới được tra WHOIS qua mạng
+    scheduler: WhoisScheduler - giới hạn song song / tốc độ riêng cho từng WHOIS server,
+               mặc định tạo mới với max_in_flight = max_workers
+    top_k: chỉ cần top_k domain RẺ NHẤT thỏa mãn - tra theo thứ tự giá tăng dần (heap) và
+           ngừng lập lịch khi đã có top_k domain thỏa mãn mà không còn ứng viên rẻ hơn đang chờ;
+           trả về tối đa top_k domain, sắp theo giá
+    on_result: hàm gọi với từng domain thỏa mãn ngay khi xác nhận được (ví dụ ResultWriter.write);
+               với top_k chỉ gọi cho top_k domain cuối cùng
+    """
     results = []
-    com_domains = [d for d in domains if d['domain'].lower().endswith('.com') and d['price'] <= max_price]
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_dom = {executor.submit(get_domain_age, d['domain']): d for d in com_domains}
-        for future in as_completed(future_to_dom):
-            dom = future_to_dom[future]
-            age = future.result()
-            if age is not None and age >= min_age and dom['price'] <= max_price:
+    best = []     # top-K: max-heap (-giá) của top_k domain thỏa mãn rẻ nhất hiện có
+    # Dòng đầu vào được đọc trong thread cấp domain của scheduler (lookup_all), kết quả WHOIS
+    # được xử lý ở thread gọi hàm -> trạng thái chung được bảo vệ bởi lock
+    lock = threading.RLock()
+
+    def accept(dom, age):
+        if age is not None and age >= min_age and dom['price'] <= max_price:
+            with lock:
                 results.append({'domain': dom['domain'], 'age': age, 'price': dom['price']})
                 print('ℹ️ domain thỏa mãn yêu cầu' , {dom['domain']})
+                if on_result is not None and not top_k:
+                    on_result(results[-1])
+                if top_k:
+                    heapq.heappush(best, -dom['price'])
+                    if len(best) > top_k:
+                        heapq.heappop(best)
+
+    # domain -> các dòng cùng domain đang chờ kết quả tra (file có thể lặp domain), mỗi domain chỉ tra 1 lần
+    to_lookup = {}
+    # domain đã tra xong -> ngày tạo: dòng lặp lại đến sau được xử lý ngay, không tra lại
+    finished = {}
+    counts = Counter()
+
+    def scan(dom) -> bool:
+        # 1 dòng đầu vào: lọc đuôi / giá, dùng cache; True nếu domain cần đưa đi tra WHOIS
+        if not (dom['domain'].lower().endswith('.com') and dom['price'] <= max_price):
+            return False
+        counts['candidates'] += 1
+        hit, created = cache.get(dom['domain']) if cache is not None else (False, None)
+        if hit:
+            counts['cached'] += 1
+            accept(dom, age_from_created(created))
+            return False
+        with lock:
+            if dom['domain'] in finished:
+                created = finished[dom['domain']]
+            else:
+                rows = to_lookup.setdefault(dom['domain'], [])
+                rows.append(dom)
+                return len(rows) == 1
+        accept(dom, age_from_created(created))
+        return False
+
+    scheduler = scheduler or WhoisScheduler(max_in_flight=max_workers)
+    if top_k:
+        # Cần mọi ứng viên để tra theo giá tăng dần: chỉ chế độ top-K mới đọc hết đầu vào trước
+        for dom in domains:
+            scan(dom)
+        # Ứng viên theo giá tăng dần; pending = đã đưa đi tra nhưng chưa có kết quả
+        queue_ = [(min(d['price'] for d in doms), domain) for domain, doms in to_lookup.items()]
+        heapq.heapify(queue_)
+        pending = {}
+
+        def candidates():
+            while True:
+                with lock:
+                    if not queue_:
+                        return
+                    price, domain = heapq.heappop(queue_)
+                    pending[domain] = price
+                yield domain
+
+        def settled():
+            # Đủ top_k và mọi ứng viên chưa xong (đang tra / chưa đưa đi) đều không rẻ hơn
+            with lock:
+                if len(best) < top_k:
+                    return False
+                waiting = list(pending.values()) + ([queue_[0][0]] if queue_ else [])
+                return not waiting or min(waiting) >= -best[0]
+
+        lookups = candidates() if not settled() else iter(())
+    else:
+        # Streaming: domain được đưa đi tra ngay khi đọc tới, không giữ cả file trong bộ nhớ
+        def stream():
+            try:
+                for dom in domains:
+                    if scan(dom):
+                        yield dom['domain']
+            except Exception as e:
+                # Đầu vào được đọc trong thread của scheduler: giữ lỗi để raise ở thread gọi hàm
+                read_errors.append(e)
+
+        read_errors = []
+        lookups = stream()
+    # Chỉ đưa đi tối đa 2 x max_in_flight domain chưa có kết quả: đọc đầu vào theo tốc độ tra
+    # và dừng sớm được (top-K)
+    lookups = scheduler.lookup_all(lookups, window=2 * scheduler.max_in_flight)
+
+    for domain, created, failed in lookups:
+        if cache is not None:
+            cache.put(domain, created, failed)
+        with lock:
+            rows = to_lookup.pop(domain, [])
+            finished[domain] = created
+        for dom in rows:
+            accept(dom, age_from_created(created))
+        if top_k:
+            with lock:
+                pending.pop(domain, None)
+            if settled():
+                scheduler.stop()
+                print(f"⏹ Đã có {top_k} domain rẻ nhất thỏa mãn, ngừng tra "
+                      f"({len(queue_) + len(pending)} domain chưa cần tra)")
+                break
+    if not top_k and read_errors:
+        raise read_errors[0]
+    if cache is not None:
+        print(f"📇 {counts['cached']} / {counts['candidates']} domain có trong cache, "
+              f"tra WHOIS {len(finished)} domain")
+    scheduler.report()
+    if cache is not None:
+        cache.report()
+    if top_k:
+        results = sorted(results, key=lambda r: r['price'])[:top_k]
+        if on_result is not None:
+            for r in results:
+                on_result(r)
     return results
 
 
+def check_domains_file(path, domain_col, min_age, max_price, output_file='output.csv', top_k=None,
+                       tld='.com', cache_path=WHOIS_CACHE_PATH, max_workers=32):
+    """
+    Lọc 1 file CSV domain (không hỏi input, dùng cho run() và job_runner): streaming theo giá / đuôi,
+    tra tuổi qua WHOIS (có cache), ghi dần kết quả vào output_file.
+    Trả về {'rows', 'kept', 'bad_price', 'matched', 'output', 'results'}; lỗi đọc / ghi file được raise.
+    """
+    stats = {}
+    domains = iter_domains_from_csv(path, domain_col, max_price=max_price, tld=tld, stats=stats)
+    cache = WhoisCache(cache_path)
+    try:
+        with ResultWriter(output_file) as writer:
+            results = filter_domains(domains, min_age, max_price, max_workers=max_workers, cache=cache,
+                                     top_k=top_k, on_result=writer.write)
+    finally:
+        cache.close()
+    print(f"Đã đọc {stats['rows']} dòng, {stats['kept']} domain qua lọc giá / đuôi"
+          + (f", bỏ qua {stats['bad_price']} dòng giá không hợp lệ" if stats['bad_price'] else ''))
+    return {**stats, 'matched': len(results), 'output': output_file, 'results': results}
+
+
 def run():
     print("=== DOMAIN AGE & PRICE CHECKER ===")
     print("1. Check Auctions file")
@@ -83,25 +363,28 @@ def run():
     except ValueError:
         print("Tuổi hoặc giá không hợp lệ.")
         return
+    top_k = input("Chỉ lấy N domain rẻ nhất (Enter = tất cả): ").strip()
+    top_k = int(top_k) if top_k.isdigit() and int(top_k) > 0 else None
 
-    domains = load_domains_from_csv(path,domain_col)
-    print(f"\nĐang kiểm tra {len(domains)} domain...\n")
-    results = filter_domains(domains, min_age, max_price)
-    output_file = input("list_domain_check.csv").strip() or "output.csv"
+    output_file = input("Nhập file kết quả (Enter = output.csv): ").strip() or "output.csv"
+
+    print(f"\nĐang kiểm tra domain .com giá <= ${max_price} trong {path}...\n")
+    try:
+        summary = check_domains_file(path, domain_col, min_age, max_price, output_file, top_k=top_k)
+    except FileNotFoundError:
+        print(f"Không tìm thấy file: {path}")
+        return
+    except OSError as e:
+        print(f"✖ Lỗi khi đọc / ghi file: {e}")
+        return
+    results = summary['results']
     if not results:
         print("Không tìm thấy domain nào thỏa mãn điều kiện.")
     else:
         print(f"\nDanh sách domain >={min_age} năm & <=${max_price}:\n")
         for r in results:
             print(f"- {r['domain']} | Age: {r['age']} năm | Price: ${r['price']}")
-    try:
-        with open(output_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=['domain', 'age', 'price'])
-            writer.writeheader()
-            writer.writerows(results)
-        print(f"✅ Đã lưu {len(results)} domain thỏa mãn vào file: {output_file}")
-    except Exception as e:
-        print(f"✖ Lỗi khi lưu file: {e}")
+    print(f"✅ Đã lưu {len(results)} domain thỏa mãn vào file: {output_file}")
 
 if __name__ == '__main__':
     run()
@@ -1,54 +1,127 @@
 # feed_product.py
 
 import csv
+import sys
 import json
-import time
+import queue
+import asyncio
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import html
+import time
+import hashlib
+import threading
+from collections import Counter
+from itertools import islice
+from types import MappingProxyType
 import requests
-from woocommerce import API
-from io import BytesIO
-from PIL import Image
+from woo_client import WooClient
+from woo_async import AsyncWooClient, check_transport
+from rate_control import make_limiter
+from job_journal import JobJournal, batch_key
+from batch_results import BatchResultTracker
+from batch_sizer import (AdaptiveBatchSizer, send_splitting, send_splitting_async,
+                         DEFAULT_MAX_BYTES, BATCH_STATE_PATH)
+from product_records import CATEGORY_FIELDS
+from request_plan import plan_feed
+from woo_metrics import metrics_session
 
 # Thiết lập cấu hình logging để theo dõi quá trình thực thi
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+# Mô tả HTML dài của nhà cung cấp có thể vượt giới hạn mặc định 128KB / ô của module csv
+csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+# Giới hạn số item trong 1 request batch của WooCommerce
+CATEGORY_BATCH_SIZE = 100
+# Meta lưu hash payload của lần feed gần nhất (mode 'upsert')
+FEED_HASH_META = '_feed_payload_hash'
 
 class WooHelper:
     """
     Lớp hỗ trợ tương tác với WooCommerce API,
     bao gồm lấy và tạo category, cũng như gửi batch tạo sản phẩm.
     """
-    def __init__(self, base_url, consumer_key, consumer_secret):
-        # Khởi tạo kết nối API
-        self.wcapi = API(
-            url=base_url,
-            consumer_key=consumer_key,
-            consumer_secret=consumer_secret,
-            version="wc/v3",
-            timeout=30
-        )
+    def __init__(self, base_url, consumer_key, consumer_secret, pool_size=10, client=None):
+        # Khởi tạo kết nối API (client dùng chung: connection pool + retry)
+        self.client = client or WooClient(base_url, consumer_key, consumer_secret,
+                                          pool_size=pool_size, timeout=(10, 30))
         # Bản đồ lưu trữ category đã có: tên -> id
         self.cat_map = {}
+        # Đường dẫn đầy đủ ('Parent', 'Child') -> id, dùng cho 'Parent > Child' trong CSV
+        self.path_map = {}
+        # Map chỉ-đọc (path -> id) sau bước resolve_categories(), payload builder đọc không cần lock
+        self.category_map = MappingProxyType({})
 
     def prefetch_categories(self):
         """
         Tải trước toàn bộ category hiện có trong WooCommerce vào self.cat_map
         để tránh gọi API nhiều lần cho từng tên category.
         """
-        page = 1
-        per_page = 100
-        while True:
-            resp = self.wcapi.get(
-                f"products/categories?page={page}&per_page={per_page}"
-            ).json()
-            if not resp:
-                break
-            # Lưu mỗi category vào bản đồ
+        by_id = {}
+        for resp in self.client.iter_pages('/products/categories', {'_fields': CATEGORY_FIELDS}):
+            # Lưu mỗi category vào bản đồ (API trả tên đã escape HTML, vd '&amp;')
             for cat in resp:
-                self.cat_map[cat['name']] = cat['id']
-            page += 1
+                name = html.unescape(cat['name'])
+                self.cat_map[name] = cat['id']
+                by_id[cat['id']] = (name, cat.get('parent', 0))
+
+        # Dựng đường dẫn đầy đủ của từng category bằng cách đi ngược lên parent
+        def path_of(cid, depth=0):
+            name, parent = by_id[cid]
+            if parent and parent in by_id and depth < 50:
+                return path_of(parent, depth + 1) + (name,)
+            return (name,)
+        for cid in by_id:
+            self.path_map[path_of(cid)] = cid
         logging.info(f"Đã load {len(self.cat_map)} categories từ store")
 
+    def _create_category_level(self, paths):
+        """
+        Tạo các category cùng 1 cấp (parent đã có id) theo batch tối đa 100,
+        ghi id vào self.path_map.
+        """
+        for chunk in chunk_list(paths, CATEGORY_BATCH_SIZE):
+            create_list = [{'name': p[-1], 'parent': self.path_map[p[:-1]] if len(p) > 1 else 0}
+                           for p in chunk]
+            resp = self.client.post('/products/categories/batch', json={'create': create_list})
+            # Phản hồi batch giữ đúng thứ tự item đã gửi
+            for path, cat in zip(chunk, resp.get('create', [])):
+                err = cat.get('error')
+                if err:
+                    # Đã tồn tại (vd tạo song song từ nơi khác): WooCommerce trả id trong resource_id
+                    existing = (err.get('data') or {}).get('resource_id')
+                    if existing:
+                        self.path_map[path] = existing
+                    else:
+                        logging.error(f"Không tạo được category {' > '.join(path)}: {err.get('message')}")
+                    continue
+                self.path_map[path] = cat['id']
+                self.cat_map.setdefault(path[-1], cat['id'])
+            logging.info(f"Đã tạo {len(chunk)} category mới (cấp {len(chunk[0])})")
+
+    def resolve_categories(self, paths):
+        """
+        Bước resolve category trước khi build payload:
+        - paths: tập đường dẫn category cần dùng, vd {('Áo',), ('Áo', 'Áo thun')}
+        - tạo những category còn thiếu theo từng cấp (cha trước, con sau), mỗi cấp theo batch <= 100
+        - đóng băng kết quả vào self.category_map (chỉ đọc) cho các payload builder
+        Tên đơn (không có '>') khớp category cùng tên ở bất kỳ cấp nào, như trước đây.
+        """
+        # Bổ sung mọi tiền tố để cha luôn được resolve trước con
+        wanted = {p[:i] for p in paths for i in range(1, len(p) + 1)}
+        for path in wanted:
+            if len(path) == 1 and path not in self.path_map and path[0] in self.cat_map:
+                self.path_map[path] = self.cat_map[path[0]]
+
+        for depth in range(1, max(map(len, wanted), default=0) + 1):
+            # Cấp con chỉ tạo được khi cha đã có id (cha tạo lỗi -> bỏ qua cả nhánh)
+            missing = sorted(p for p in wanted
+                             if len(p) == depth and p not in self.path_map
+                             and (depth == 1 or p[:-1] in self.path_map))
+            if missing:
+                self._create_category_level(missing)
+
+        self.category_map = MappingProxyType({p: self.path_map[p] for p in wanted if p in self.path_map})
+        return self.category_map
+
     def batch_create_categories(self, names):
         """
         Tạo nhiều category mới trong 1 request batch
@@ -59,7 +132,7 @@ class WooHelper:
         if not create_list:
             return
         payload = {'create': create_list}
-        resp = self.wcapi.post('products/categories/batch', payload).json()
+        resp = self.client.post('/products/categories/batch', json=payload)
         # Cập nhật map với category vừa tạo
         for cat in resp.get('create', []):
             self.cat_map[cat['name']] = cat['id']
@@ -67,35 +140,193 @@ class WooHelper:
 
     def get_category_id(self, name):
         """
-        Lấy id từ tên category trong self.cat_map.
+        Lấy id từ tên category (hoặc đường dẫn tuple) trong map đã resolve,
+        fallback về self.cat_map theo tên.
         """
-        return self.cat_map.get(name)
+        if isinstance(name, tuple):
+            return self.category_map.get(name) or (self.cat_map.get(name[0]) if len(name) == 1 else None)
+        return self.category_map.get((name,)) or self.cat_map.get(name)
 
     def batch_create_products(self, products):
         """
         Gửi request batch để tạo nhiều sản phẩm cùng lúc.
         """
         payload = {'create': products}
-        resp = self.wcapi.post('products/batch', payload).json()
+        resp = self.client.post('/products/batch', json=payload)
         # logging.info(f"Batch response: {json.dumps(resp, indent=4)}")  # Kiểm tra phản hồi API
         return resp
 
+    def batch_products(self, body):
+        """
+        Gửi 1 request /products/batch kết hợp, vd {'create': [...], 'update': [...]}.
+        """
+        return self.client.post('/products/batch', json=body)
+
+    def prefetch_skus(self, per_page=100):
+        """
+        Tải map SKU -> (product id, hash payload feed lần trước) của mọi sản phẩm trên store,
+        chỉ lấy các trường cần thiết (_fields) để nhẹ phản hồi.
+        """
+        sku_map = {}
+        params = {'status': 'any', '_fields': 'id,sku,meta_data'}
+        for resp in self.client.iter_pages('/products', params, per_page):
+            for p in resp:
+                if not p.get('sku'):
+                    continue
+                old_hash = next((m.get('value') for m in p.get('meta_data', [])
+                                 if m.get('key') == FEED_HASH_META), None)
+                sku_map[p['sku']] = (p['id'], old_hash)
+        logging.info(f"Đã load {len(sku_map)} SKU từ store")
+        return sku_map
+
+
+def iter_csv(csv_path):
+    """
+    Đọc file CSV từng dòng (generator), mỗi dòng là 1 dict.
+    Không giữ cả file trong bộ nhớ.
+    """
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
 
 def read_csv(csv_path):
     """
     Đọc toàn bộ dòng từ file CSV đầu vào,
     trả về list các dict, mỗi dict tương ứng 1 dòng.
     """
-    with open(csv_path, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        return list(reader)
+    return list(iter_csv(csv_path))
+
+def chunk_list(iterable, chunk_size):
+    """
+    Chia iterable (list hoặc generator) thành các chunk (list) có kích thước tối đa chunk_size.
+    """
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def parse_category_paths(cell):
+    """
+    Tách ô Categories thành list đường dẫn tuple:
+    'Áo > Áo thun, Quần' -> [('Áo', 'Áo thun'), ('Quần',)]
+    """
+    paths = []
+    for part in (cell or '').split(','):
+        path = tuple(name.strip() for name in part.split('>') if name.strip())
+        if path:
+            paths.append(path)
+    return paths
+
+def scan_category_paths(rows):
+    """
+    Quét CSV 1 lượt, trả về tập đường dẫn category duy nhất.
+    """
+    paths = set()
+    for row in rows:
+        paths.update(parse_category_paths(row.get('Categories', '')))
+    return paths
+
+def iter_payloads(rows, helper):
+    """
+    Build payload cho từng dòng (generator) để nối vào pipeline streaming.
+    """
+    for row in rows:
+        yield build_product_payload(row, helper)
+
+def payload_hash(payload):
+    """
+    Hash ổn định của payload đã chuẩn hóa (thứ tự key không ảnh hưởng).
+    """
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def iter_create_ops(rows, helper):
+    """
+    Mode 'create': mọi dòng đều là thao tác tạo mới.
+    """
+    for payload in iter_payloads(rows, helper):
+        yield 'create', payload
+
+def iter_upsert_ops(rows, helper, sku_map, counts):
+    """
+    Mode 'upsert': so khớp dòng CSV với sản phẩm có sẵn theo SKU.
+    - SKU chưa có -> ('create', payload)
+    - SKU có, hash payload khác lần feed trước -> ('update', payload + id)
+    - SKU có, hash giống -> bỏ qua (không gửi gì)
+    Hash được lưu vào meta _feed_payload_hash của sản phẩm để lần sau so sánh.
+    counts: dict đếm create / update / unchanged / duplicate.
+    """
+    seen = set()
+    for row in rows:
+        payload = build_product_payload(row, helper)
+        sku = (row.get('SKU') or '').strip()
+        if sku:
+            if sku in seen:
+                # SKU lặp trong cùng file: WooCommerce sẽ từ chối, chỉ giữ dòng đầu
+                counts['duplicate'] += 1
+                continue
+            seen.add(sku)
+            payload['sku'] = sku
+        digest = payload_hash(payload)
+        payload.setdefault('meta_data', []).append({'key': FEED_HASH_META, 'value': digest})
+        existing = sku_map.get(sku) if sku else None
+        if existing is None:
+            counts['create'] += 1
+            yield 'create', payload
+        elif existing[1] == digest:
+            counts['unchanged'] += 1
+        else:
+            counts['update'] += 1
+            payload['id'] = existing[0]
+            yield 'update', payload
+
+def _batch_body(ops) -> dict:
+    body = {}
+    for action, payload in ops:
+        body.setdefault(action, []).append(payload)
+    return body
+
 
-def chunk_list(lst, chunk_size):
+def iter_batch_bodies(ops, batch_size, tracker=None, sizer=None):
     """
-    Chia list lst thành các chunk có kích thước tối đa chunk_size.
+    Gom các thao tác (action, payload) thành body /products/batch kết hợp, tối đa batch_size item.
+    Sinh (body, retry).
+    Có sizer (batch_sizer.AdaptiveBatchSizer): số item tối đa là sizer.target tại lúc gom batch,
+    và batch dừng trước item làm body vượt sizer.max_bytes (item đó mở đầu batch sau).
+    Có tracker (batch_results.BatchResultTracker): item lỗi tạm thời đã tới hạn retry được gửi thành
+    body riêng (retry=True), KHÔNG ghép vào batch CSV: ranh giới batch CSV (và khóa journal) phải
+    giống nhau giữa các lần chạy để resume nhận ra batch đã xong. Hết CSV thì tiếp tục chờ tới khi
+    không còn item retry / batch đang gửi.
     """
-    for i in range(0, len(lst), chunk_size):
-        yield lst[i:i+chunk_size]
+    ops = iter(ops)
+    carry = None
+    while True:
+        limit = sizer.target if sizer is not None else batch_size
+        if tracker is not None:
+            due = tracker.take_due(limit)
+            if due:
+                yield _batch_body(due), True
+                continue
+        chunk = [carry] if carry is not None else []
+        carry = None
+        if sizer is None:
+            chunk += islice(ops, limit - len(chunk))
+        else:
+            nbytes = sum(sizer.size_of(payload) for _, payload in chunk)
+            for op in islice(ops, limit - len(chunk)):
+                size = sizer.size_of(op[1])
+                if chunk and nbytes + size > sizer.max_bytes:
+                    carry = op
+                    break
+                chunk.append(op)
+                nbytes += size
+        if not chunk:
+            if tracker is None or not tracker.has_pending():
+                return
+            time.sleep(min(0.5, tracker.next_due_in()))
+            continue
+        yield _batch_body(chunk), False
 
 def build_product_payload(row, helper):
     """
@@ -104,15 +335,9 @@ def build_product_payload(row, helper):
     - Xử lý images (split 'src')
     - Lưu các trường cơ bản: type, price, description, name
     """
-    # Xử lý danh sách category (split theo dấu ,)
-    cat_names = [c.strip() for c in row['Categories'].split(',') if c.strip()]
-    # Tìm những category chưa có trong map
-    missing = [name for name in cat_names if name not in helper.cat_map]
-    # Tạo batch category mới nếu có
-    if missing:
-        helper.batch_create_categories(missing)
-    # Lấy id tương ứng
-    cat_ids = [helper.get_category_id(name) for name in cat_names]
+    # Xử lý danh sách category (split theo dấu , và '>' cho category con).
+    # Category đã được tạo sẵn ở bước resolve_categories(), ở đây chỉ đọc map.
+    cat_ids = [helper.get_category_id(path) for path in parse_category_paths(row.get('Categories', ''))]
 
     # Xử lý danh sách ảnh, tách theo ký tự ',,'
     img_urls = [u.strip() for u in row['Images'].split(',,') if u.strip()]
@@ -166,43 +391,242 @@ def build_product_payload(row, helper):
         })
     return payload
 
-def feed_products(csv_path, base_url, ck, cs,
-                  batch_size=80, max_workers=3, throttle=1.0):
-    """
-    Chạy quy trình import:
-    1) Prefetch tất cả category
-    2) Đọc CSV thành rows
-    3) Build payloads và tự động tạo category thiếu
-    4) Chia thành batches và tạo song song
-    5) Throttling giữa các batch
-    """
-    helper = WooHelper(base_url, ck, cs)
-    helper.prefetch_categories()
-
-    # Đọc dữ liệu từ file CSV
-    rows = read_csv(csv_path)
-    logging.info(f"Đã load {len(rows)} dòng từ CSV")
-
-    # Build payload cho mỗi dòng (và tạo category nếu cần)
-    payloads = [build_product_payload(r, helper) for r in rows]
-
-    # Chia thành các batch
-    chunks = list(chunk_list(payloads, batch_size))
-    logging.info(f"Chia thành {len(chunks)} batch, mỗi batch tối đa {batch_size} sản phẩm")
-
-    # Gửi song song với ThreadPoolExecutor
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(helper.batch_create_products, chunk): idx
-                   for idx, chunk in enumerate(chunks)}
-        for fut in as_completed(futures):
-            idx = futures[fut]
+def _log_batch_result(idx, result, error, outcome):
+    if error is None:
+        ok = lambda action: sum(1 for r in result.get(action, []) if not r.get('error'))
+        msg = f"Batch #{idx} tạo thành công: {ok('create')} sản phẩm"
+        if 'update' in result:
+            msg += f", cập nhật {ok('update')} sản phẩm"
+        if outcome.get('retry') or outcome.get('dead'):
+            msg += f" | lỗi item: retry {outcome.get('retry', 0)}, dead-letter {outcome.get('dead', 0)}"
+        logging.info(msg)
+    else:
+        logging.error(f"Batch #{idx} lỗi: {error}")
+
+
+def _batch_inputs(body):
+    # Input rút gọn ghi vào journal: SKU (hoặc tên nếu không có SKU) của từng item
+    return {action: [p.get('sku') or p.get('name') for p in items] for action, items in body.items()}
+
+
+def _finish_batch(item, result, error, journal, tracker):
+    idx, key, body = item
+    outcome = tracker.handle(body, result, error, key=key)
+    _log_batch_result(idx, result, error, outcome)
+    if journal is None or key is None:
+        # Body retry: kết quả được ghi cho batch gốc khi các item của nó xong (tracker.on_settled)
+        return
+    if error is None and not outcome.get('retry'):
+        journal.record(key, 'done', _batch_inputs(body), batch=idx, **outcome)
+    elif error is None:
+        # Còn item chờ retry: 'done' được ghi khi các item đó xong (tracker.on_settled)
+        journal.record(key, 'retrying', _batch_inputs(body), batch=idx, **outcome)
+    else:
+        journal.record(key, 'failed', _batch_inputs(body), batch=idx, error=str(error))
+
+
+def iter_journal_batches(batches, journal, counts, tracker):
+    """
+    Đánh số batch và gắn khóa journal: (idx, key, body).
+    Có journal: bỏ qua batch đã 'done' ở lần chạy trước (resume), đếm vào counts['resumed'].
+    Body retry không có khóa riêng: item của nó được tính cho batch CSV gốc (tracker.on_settled).
+    Batch được đưa đi gửi được báo cho tracker (tracker.begin) để chờ kết quả retry của nó.
+    """
+    for idx, (body, retry) in enumerate(batches):
+        key = None
+        if journal is not None and not retry:
+            key = batch_key('batch', body)
+            if journal.is_done(key):
+                counts['resumed'] += 1
+                continue
+        tracker.begin()
+        yield idx, key, body
+
+
+def _send_batches_threaded(batches, helper, max_workers, queue_size, tracker, journal=None, sizer=None):
+    """
+    Sender thread: `max_workers` worker lấy batch từ hàng đợi giới hạn `queue_size`.
+    Batch được gửi qua batch_sizer.send_splitting (báo latency cho sizer, chia đôi batch quá lớn).
+    Luồng chính (producer) bị chặn ở queue.put khi worker gửi không kịp -> backpressure,
+    nên bộ nhớ chỉ giữ tối đa queue_size + max_workers batch tại 1 thời điểm.
+    Trả về số batch đã đưa vào hàng đợi.
+    """
+    q = queue.Queue(maxsize=queue_size)
+
+    def worker():
+        while True:
+            item = q.get()
+            if item is None:
+                return
             try:
-                result = fut.result()
-                logging.info(f"Batch #{idx} tạo thành công: {len(result.get('create', []))} sản phẩm")
+                result = send_splitting(helper.batch_products, item[2], sizer)
             except Exception as e:
-                logging.error(f"Batch #{idx} lỗi: {e}")
-            # Throttle giãn cách giữa các batch để tránh spike
-            time.sleep(throttle)
+                _finish_batch(item, None, e, journal, tracker)
+            else:
+                _finish_batch(item, result, None, journal, tracker)
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(max_workers)]
+    for t in workers:
+        t.start()
+    sent = 0
+    try:
+        for item in batches:
+            q.put(item)
+            sent += 1
+    finally:
+        # Kể cả khi producer lỗi: báo dừng cho worker sau khi gửi hết phần đã xếp hàng
+        for _ in workers:
+            q.put(None)
+        for t in workers:
+            t.join()
+    return sent
+
+
+async def _send_batches_async(batches, base_url, ck, cs, max_in_flight, limiter, queue_size,
+                              tracker, journal=None, sizer=None):
+    """
+    Bản asyncio của bước gửi batch: producer (đọc CSV + build payload, chạy trong
+    thread phụ để không chặn event loop) đẩy vào asyncio.Queue giới hạn; `max_in_flight`
+    sender lấy ra gửi. AsyncWooClient (và limiter nếu có) giới hạn số request đang bay.
+    """
+    q = asyncio.Queue(maxsize=queue_size)
+    loop = asyncio.get_running_loop()
+    batches = iter(batches)
+    sent = 0
+
+    async with AsyncWooClient(base_url, ck, cs, max_in_flight=max_in_flight,
+                              timeout=(10, 30), limiter=limiter) as client:
+        post = lambda body: client.post('/products/batch', json=body)
+
+        async def sender():
+            while True:
+                item = await q.get()
+                if item is None:
+                    return
+                try:
+                    result = await send_splitting_async(post, item[2], sizer)
+                except Exception as e:
+                    _finish_batch(item, None, e, journal, tracker)
+                else:
+                    _finish_batch(item, result, None, journal, tracker)
+
+        senders = [asyncio.create_task(sender()) for _ in range(max_in_flight)]
+        try:
+            while True:
+                item = await loop.run_in_executor(None, next, batches, None)
+                if item is None:
+                    break
+                await q.put(item)
+                sent += 1
+        finally:
+            for _ in senders:
+                await q.put(None)
+            await asyncio.gather(*senders)
+    return sent
+
+
+def feed_products(csv_path, base_url, ck, cs,
+                  batch_size=80, max_workers=3, throttle=0.0, transport='thread',
+                  adaptive=True, queue_size=None, mode='create', journal_path=None, resume=False,
+                  dead_letter_path=None, max_attempts=3, dry_run=False, metrics_json=None, metrics_prom=None,
+                  max_batch_bytes=DEFAULT_MAX_BYTES, adaptive_batch=True, batch_state_path=BATCH_STATE_PATH):
+    """
+    Chạy quy trình import theo kiểu streaming (bộ nhớ không phụ thuộc kích thước file):
+    1) Prefetch tất cả category, quét CSV và tạo trước category thiếu
+       (hỗ trợ 'Parent > Child', tạo theo cấp, batch <= 100)
+    2) Đọc CSV từng dòng (iter_csv)
+    3) Build payload từng dòng, chỉ đọc map category đã đóng băng (iter_payloads)
+    4) Gom thành batch (iter_batch_bodies) -> hàng đợi giới hạn queue_size -> sender song song
+       (transport='thread': thread worker, 'async': asyncio/aiohttp).
+       Batch đầu tiên được gửi ngay khi đủ batch_size dòng, không chờ đọc hết file.
+    5) Điều khiển tốc độ: adaptive=True dùng AIMD (rate_control), max_workers là trần
+       song song; throttle = khoảng cách tối thiểu (giây) giữa 2 lần bắt đầu request
+    mode: 'create' (mọi dòng đều tạo mới) hoặc 'upsert' (khớp theo SKU: chỉ tạo dòng mới,
+          chỉ cập nhật dòng thay đổi, bỏ qua dòng không đổi - xem iter_upsert_ops)
+    journal_path: file journal (job_journal.JobJournal) ghi kết quả từng batch;
+          resume=True bỏ qua batch đã xong ở lần chạy trước (cùng file CSV và tham số).
+          Batch đang bay lúc job chết chưa có kết quả nên sẽ được gửi lại: với mode='create'
+          có thể tạo trùng vài sản phẩm, dùng mode='upsert' nếu cần tránh hẳn.
+    Kết quả batch được đọc theo từng item (batch_results): item lỗi tạm thời được gửi lại
+    trong các batch sau (tối đa max_attempts lần, có backoff), item lỗi vĩnh viễn ghi vào
+    dead_letter_path (.csv hoặc .jsonl). Trả về summary của lượt chạy.
+    dry_run: chỉ lập kế hoạch (request_plan.plan_feed): đếm dòng CSV và probe X-WP-Total,
+          in số trang / batch / API call và thời gian ước tính, không tạo category hay sản phẩm;
+          trả về plan dict.
+    metrics_json, metrics_prom: file JSON summary / Prometheus text của metrics request
+          (woo_metrics); dòng tiến độ request được in định kỳ trong lúc chạy.
+    Kích thước batch (batch_sizer.AdaptiveBatchSizer): batch_size là số item ban đầu, mỗi batch
+          còn bị giới hạn max_batch_bytes byte; adaptive_batch=True chỉnh số item theo latency /
+          timeout (tối đa 100) và lưu lại theo store vào batch_state_path (None = không lưu).
+          Có journal_path thì số item cố định = batch_size để ranh giới batch giống lần chạy trước.
+          Batch lỗi vì quá lớn (timeout, 413, 5xx) được chia đôi và gửi lại; batch create có sản phẩm
+          không SKU chỉ được chia khi 413 (timeout / 5xx có thể đã tạo một phần -> cả batch thành lỗi).
+    """
+    check_transport(transport)
+    if mode not in ('create', 'upsert'):
+        raise ValueError(f"mode không hợp lệ: {mode!r} (chỉ 'create' hoặc 'upsert')")
+    queue_size = queue_size or max_workers * 2
+    if dry_run:
+        rows = sum(1 for _ in iter_csv(csv_path))
+        helper = WooHelper(base_url, ck, cs, pool_size=max_workers)
+        if adaptive_batch and not journal_path:
+            # Kế hoạch theo kích thước batch đã chỉnh của store (nếu có)
+            batch_size = AdaptiveBatchSizer(batch_size, store=base_url, operation='feed',
+                                            state_path=batch_state_path).target
+        return plan_feed(helper.client, rows, batch_size, mode, max_workers).report()
+    with metrics_session('feed', metrics_json, metrics_prom):
+        # Tạo client trong session để request ghi vào metrics của lượt chạy này
+        helper = WooHelper(base_url, ck, cs, pool_size=max_workers)
+        limiter = make_limiter(max_workers, adaptive, throttle, use_async=transport == 'async')
+        helper.prefetch_categories()
+        # Quét CSV 1 lượt lấy category, tạo category thiếu theo cấp rồi đóng băng map
+        helper.resolve_categories(scan_category_paths(iter_csv(csv_path)))
+
+        # Pipeline lazy: CSV -> payload -> batch; chỉ chạy khi sender lấy batch tiếp theo
+        counts = Counter()
+        if mode == 'upsert':
+            ops = iter_upsert_ops(iter_csv(csv_path), helper, helper.prefetch_skus(), counts)
+        else:
+            ops = iter_create_ops(iter_csv(csv_path), helper)
+        sizer = AdaptiveBatchSizer(batch_size, max_bytes=max_batch_bytes,
+                                   adaptive=adaptive_batch and not journal_path,
+                                   store=base_url, operation='feed', state_path=batch_state_path)
+        journal = None
+        if journal_path:
+            journal = JobJournal(journal_path, job={'kind': 'feed', 'csv': csv_path, 'mode': mode,
+                                                    'batch_size': batch_size, 'max_batch_bytes': max_batch_bytes},
+                                 resume=resume)
+        tracker = BatchResultTracker(dead_letter_path, max_attempts=max_attempts,
+                                     on_settled=journal and (lambda key: journal.record(key, 'done', retried=True)))
+        batches = iter_journal_batches(iter_batch_bodies(ops, batch_size, tracker, sizer), journal, counts, tracker)
+        logging.info(f"Bắt đầu feed streaming: batch {sizer.target} sản phẩm ({'tự chỉnh' if sizer.adaptive else 'cố định'}, "
+                     f"tối đa {max_batch_bytes} byte), hàng đợi {queue_size} batch")
+
+        try:
+            if transport == 'async':
+                sent = asyncio.run(_send_batches_async(batches, base_url, ck, cs, max_workers, limiter,
+                                                       queue_size, tracker, journal, sizer))
+            else:
+                helper.client.limiter = limiter
+                sent = _send_batches_threaded(batches, helper, max_workers, queue_size, tracker, journal, sizer)
+        finally:
+            sizer.save()
+            tracker.close()
+            if journal is not None:
+                journal.close()
+        logging.info(f"Đã gửi {sent} batch")
+        if counts['resumed']:
+            logging.info(f"Resume: bỏ qua {counts['resumed']} batch đã xong ở lần chạy trước")
+        if mode == 'upsert':
+            logging.info(f"Upsert: tạo {counts['create']}, cập nhật {counts['update']}, "
+                         f"không đổi {counts['unchanged']}, SKU trùng trong file {counts['duplicate']}")
+        if limiter:
+            logging.info(f"Rate control: {limiter.snapshot()}")
+        batch_sizes = sizer.snapshot()
+        logging.info(f"Batch size: {batch_sizes}")
+        summary = tracker.summary()
+        summary.update(batches=sent, batch_size=batch_sizes, **counts)
+        return summary
 
 if __name__ == '__main__':
     import argparse
@@ -213,9 +637,32 @@ if __name__ == '__main__':
     parser.add_argument('--url', required=True, help='URL gốc của store')
     parser.add_argument('--ck', required=True, help='Consumer Key')
     parser.add_argument('--cs', required=True, help='Consumer Secret')
-    parser.add_argument('--batch', type=int, default=80, help='Kích thước batch')
+    parser.add_argument('--batch', type=int, default=80, help='Kích thước batch ban đầu (số sản phẩm)')
+    parser.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES, help='Số byte body tối đa của 1 batch')
+    parser.add_argument('--fixed-batch', dest='adaptive_batch', action='store_false',
+                        help='Không tự chỉnh số sản phẩm / batch theo latency')
+    parser.add_argument('--batch-state', default=BATCH_STATE_PATH,
+                        help='File lưu kích thước batch đã chỉnh theo store (mặc định trong ~/.cache)')
     parser.add_argument('--workers', type=int, default=3, help='Số luồng song song')
-    parser.add_argument('--throttle', type=float, default=1.0, help='Giãn cách (giây) giữa các batch')
+    parser.add_argument('--mode', choices=['create', 'upsert'], default='create',
+                        help="'create': tạo mới mọi dòng; 'upsert': khớp SKU, chỉ gửi dòng mới/thay đổi")
+    parser.add_argument('--journal', help='File journal ghi kết quả từng batch (JSON Lines)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Tiếp tục job từ --journal, bỏ qua các batch đã xong')
+    parser.add_argument('--dead-letter', help='File ghi item lỗi vĩnh viễn (.csv hoặc .jsonl)')
+    parser.add_argument('--attempts', type=int, default=3, help='Số lần gửi tối đa cho 1 item lỗi tạm thời')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Chỉ in kế hoạch request và thời gian ước tính, không gửi gì lên store')
+    parser.add_argument('--metrics-json', help='Ghi metrics request (JSON summary) ra file')
+    parser.add_argument('--metrics-prom', help='Ghi metrics request dạng Prometheus text ra file')
+    parser.add_argument('--queue', type=int, default=None,
+                        help='Số batch tối đa chờ gửi trong hàng đợi (mặc định 2 x workers)')
+    parser.add_argument('--throttle', type=float, default=0.0,
+                        help='Khoảng cách tối thiểu (giây) giữa 2 lần bắt đầu request, 0 = không giới hạn')
+    parser.add_argument('--no-adaptive', dest='adaptive', action='store_false',
+                        help='Tắt điều khiển song song thích ứng (AIMD), chạy cố định --workers')
+    parser.add_argument('--transport', choices=['thread', 'async'], default='thread',
+                        help="Cách chạy song song: 'thread' hoặc 'async' (cần aiohttp)")
     args = parser.parse_args()
 
     # Gọi hàm chính
@@ -227,4 +674,18 @@ if __name__ == '__main__':
         batch_size=args.batch,
         max_workers=args.workers,
         throttle=args.throttle,
+        transport=args.transport,
+        adaptive=args.adaptive,
+        queue_size=args.queue,
+        mode=args.mode,
+        journal_path=args.journal,
+        resume=args.resume,
+        dead_letter_path=args.dead_letter,
+        max_attempts=args.attempts,
+        dry_run=args.dry_run,
+        metrics_json=args.metrics_json,
+        metrics_prom=args.metrics_prom,
+        max_batch_bytes=args.max_bytes,
+        adaptive_batch=args.adaptive_batch,
+        batch_state_path=args.batch_state,
     )
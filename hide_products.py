@@ -1,31 +1,427 @@
 # File: hide_products.py
+import time
+import asyncio
+import threading
 import requests
-from requests.auth import HTTPBasicAuth
+from woo_client import WooClient, LIST_CONCURRENCY
+from woo_async import AsyncWooClient, check_transport
+from rate_control import make_limiter
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from delete_product import chunked
+from product_records import HIDE_FIELDS
+from request_plan import plan_hide
+from woo_metrics import metrics_session
 
 
+HIDE_META_KEY = "_hwp_hide_product"
+# Giới hạn số item trong 1 request /products/batch của WooCommerce
+MAX_BATCH_SIZE = 100
 
-def _hide_one_product(prod_id: int, api_base: str, auth: HTTPBasicAuth) -> str:
+
+def _hide_fields() -> dict:
     """
-    Helper: ẩn 1 sản phẩm qua REST API, trả về thông điệp kết quả.
+    Các trường cần cập nhật để ẩn 1 sản phẩm (dùng chung cho PUT lẻ và batch).
     """
-    update_url = f"{api_base}/products/{prod_id}"
-    payload = {
+    return {
         "catalog_visibility": "hidden",
-        "meta_data": [{"key": "_hwp_hide_product", "value": "yes"}]
+        "meta_data": [{"key": HIDE_META_KEY, "value": "yes"}]
     }
-    r = requests.put(update_url, json=payload, auth=auth)
+
+
+class _HideStats:
+    """
+    Bộ đếm thread-safe: số request, số sản phẩm đã ẩn / lỗi, để báo cáo tốc độ.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.hidden = 0
+        self.failed = 0
+        self.duplicates = 0
+
+    def add(self, requests_: int = 0, hidden: int = 0, failed: int = 0, duplicates: int = 0):
+        with self._lock:
+            self.requests += requests_
+            self.hidden += hidden
+            self.failed += failed
+            self.duplicates += duplicates
+
+    def report(self, label: str) -> dict:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        summary = {
+            "requests": self.requests,
+            "hidden": self.hidden,
+            "failed": self.failed,
+            "duplicates": self.duplicates,
+            "elapsed": round(elapsed, 3),
+            "requests_per_sec": round(self.requests / elapsed, 2),
+            "products_per_sec": round(self.hidden / elapsed, 2),
+        }
+        print(f"📊 {label}: {summary['requests']} requests, {summary['hidden']} ẩn, "
+              f"{summary['failed']} lỗi, "
+              f"{summary['duplicates']} trùng lặp trong {summary['elapsed']}s "
+              f"({summary['requests_per_sec']} req/s, {summary['products_per_sec']} products/s)")
+        return summary
+
+
+def _print_outcome(stats: _HideStats) -> None:
+    # Chỉ báo thành công khi không có sản phẩm nào lỗi
+    if stats.failed:
+        print(f"⚠️ {stats.failed} products could not be hidden (see errors above).")
+    else:
+        print("✅ All products hidden.")
+
+
+def _needs_hide(p: dict) -> bool:
+    """
+    True nếu sản phẩm CHƯA bị ẩn (chưa hidden và chưa có meta _hwp_hide_product = yes).
+    """
+    # nếu đã ẩn qua catalog_visibility thì bỏ qua
+    if p.get("catalog_visibility") == "hidden":
+        return False
+    # nếu đã có meta _hwp_hide_product = yes thì bỏ qua
+    for m in p.get("meta_data", []):
+        if m.get("key") == HIDE_META_KEY and m.get("value") == "yes":
+            return False
+    return True
+
+
+def _hide_one_product(prod_id: int, client: WooClient) -> str:
+    """
+    Helper: ẩn 1 sản phẩm qua REST API, trả về thông điệp kết quả.
+    Đây là đường cũ (1 PUT / sản phẩm), giữ lại làm fallback cho mode='single'.
+    """
+    r = client.request("PUT", f"/products/{prod_id}", json=_hide_fields())
     if r.status_code == 200:
         return f"✔ Hid product ID {prod_id}"
     else:
         return f"✖ Failed to hide product ID {prod_id}: {r.status_code}"
 
+
+def _parse_hide_batch(prod_ids: list[int], status: int, body) -> list[tuple[int, bool, str]]:
+    """
+    Đọc phản hồi /products/batch thành kết quả từng item: (product_id, ok, thông điệp).
+    Dùng chung cho transport thread và async.
+    """
+    if status != 200:
+        return [(pid, False, f"✖ Failed to hide product ID {pid}: batch {status}")
+                for pid in prod_ids]
+
+    results = []
+    seen = set()
+    for item in (body or {}).get("update", []):
+        pid = item.get("id")
+        err = item.get("error")
+        if err:
+            results.append((pid, False, f"✖ Failed to hide product ID {pid}: {err.get('code')} {err.get('message')}"))
+        else:
+            results.append((pid, True, f"✔ Hid product ID {pid}"))
+        seen.add(pid)
+    # Item không có trong phản hồi coi như lỗi để không bị "mất" âm thầm
+    for pid in prod_ids:
+        if pid not in seen:
+            results.append((pid, False, f"✖ Failed to hide product ID {pid}: missing in batch response"))
+    return results
+
+
+def _hide_batch(prod_ids: list[int], client: WooClient) -> list[tuple[int, bool, str]]:
+    """
+    Ẩn tối đa 100 sản phẩm trong 1 request POST /products/batch (action 'update').
+    Trả về kết quả từng item: (product_id, ok, thông điệp).
+    """
+    fields = _hide_fields()
+    payload = {"update": [{"id": pid, **fields} for pid in prod_ids]}
+    r = client.request("POST", "/products/batch", json=payload, idempotent=True)
+    return _parse_hide_batch(prod_ids, r.status_code, r.json() if r.status_code == 200 else None)
+
+
+def _record_batch_results(results: list[tuple[int, bool, str]], stats: "_HideStats") -> None:
+    ok_count = sum(1 for _, ok, _ in results if ok)
+    stats.add(requests_=1, hidden=ok_count, failed=len(results) - ok_count)
+    for _, ok, msg in results:
+        if not ok:
+            print(msg)
+    print(f"✔ Batch: ẩn {ok_count}/{len(results)} sản phẩm")
+
+
+def _run_hide_job(prod_ids: list[int], mode: str, client: WooClient, stats: "_HideStats",
+                  index=None) -> None:
+    """
+    1 job trong pool chung: 1 batch (mode='batch') hoặc 1 sản phẩm (mode='single').
+    Lỗi mạng không làm dừng cả lượt chạy mà được tính vào số lỗi.
+    index: CatalogIndex (nếu có) được đánh dấu ẩn cho các sản phẩm thành công.
+    """
+    try:
+        if mode == "single":
+            msg = _hide_one_product(prod_ids[0], client)
+            ok = msg.startswith("✔")
+            stats.add(requests_=1, hidden=int(ok), failed=int(not ok))
+            if not ok:
+                print(msg)      # thành công không in từng sản phẩm: xem dòng tiến độ (woo_metrics)
+            results = [(prod_ids[0], ok, msg)]
+        else:
+            results = _hide_batch(prod_ids, client)
+            _record_batch_results(results, stats)
+    except requests.RequestException as e:
+        stats.add(requests_=1, failed=len(prod_ids))
+        print(f"✖ Failed to hide {len(prod_ids)} products: {e}")
+        return
+    if index is not None:
+        index.mark_hidden([pid for pid, ok, _ in results if ok])
+
+
+def hide_categories(category_ids: list[int],
+                    base_url: str,
+                    consumer_key: str,
+                    consumer_secret: str,
+                    per_page: int = 100,
+                    max_workers: int = 10,
+                    mode: str = "batch",
+                    batch_size: int = MAX_BATCH_SIZE,
+                    list_workers: int = None,
+                    transport: str = "thread",
+                    adaptive: bool = True,
+                    index=None,
+                    dry_run: bool = False,
+                    metrics_json: str = None,
+                    metrics_prom: str = None) -> dict:
+    """
+    Hide all products of several categories in one run.
+
+    Every category is listed concurrently (up to `list_workers` listers) and each
+    page is handed to ONE shared update pool of `max_workers` threads as soon as it
+    arrives, so listing keeps running ahead while earlier pages are being updated.
+    A bounded number of queued jobs (2 x max_workers) provides backpressure.
+    Product IDs that appear in several categories are hidden only once.
+
+    Args:
+        category_ids: IDs of the product categories.
+        base_url, consumer_key, consumer_secret: see hide_products().
+        per_page: Number of products per listing page (max 100).
+        max_workers: Size of the shared update pool.
+        mode: 'batch' or 'single' (see hide_products()).
+        batch_size: Items per batch request in 'batch' mode (capped at 100).
+        list_workers: Number of categories listed at the same time
+                      (default: all of them, capped at max_workers).
+        transport: 'thread' (ThreadPoolExecutor) or 'async' (asyncio/aiohttp,
+                   max_workers is then the number of requests in flight).
+        adaptive: Adapt the number of concurrent requests (AIMD, see rate_control)
+                  below the max_workers ceiling; False = always run at the ceiling.
+        index: Optional catalog_index.CatalogIndex. When given, it is synced
+               incrementally and the products to hide are planned from it
+               instead of paging every category through the API.
+        dry_run: Only plan the run (see request_plan.plan_hide): count probes per
+                 category, then print pages / batches / API calls and the estimated
+                 time. Nothing is changed on the store.
+        metrics_json, metrics_prom: Optional paths for the request metrics of the
+                 run (woo_metrics): JSON summary and Prometheus text file. A
+                 progress line is printed periodically in any case.
+
+    Returns:
+        Summary dict with request/product counts and requests/products per second
+        (dry_run: the plan dict).
+    """
+    if mode not in ("batch", "single"):
+        raise ValueError(f"mode không hợp lệ: {mode!r} (chỉ 'batch' hoặc 'single')")
+    check_transport(transport)
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE)) if mode == "batch" else 1
+    category_ids = list(dict.fromkeys(category_ids))
+    if not category_ids:
+        return _HideStats().report("Không có category")
+    label = f"{len(category_ids)} categories ({mode}, {transport})" if len(category_ids) > 1 \
+        else f"Category {category_ids[0]} ({mode}, {transport})"
+    if dry_run:
+        client = WooClient(base_url, consumer_key, consumer_secret, pool_size=max_workers)
+        try:
+            return plan_hide(client, category_ids, per_page, batch_size, max_workers).report()
+        finally:
+            client.close()
+    with metrics_session("hide", metrics_json, metrics_prom):
+        return _hide_categories_run(category_ids, base_url, consumer_key, consumer_secret, per_page,
+                                    max_workers, mode, batch_size, list_workers, transport, adaptive,
+                                    index, label)
+
+
+def _hide_categories_run(category_ids, base_url, consumer_key, consumer_secret, per_page,
+                         max_workers, mode, batch_size, list_workers, transport, adaptive,
+                         index, label) -> dict:
+    # Phần chạy thật của hide_categories() (đã kiểm tra tham số, trong metrics_session)
+    if transport == "async":
+        stats = asyncio.run(_hide_categories_async(
+            category_ids, base_url, consumer_key, consumer_secret,
+            per_page, max_workers, mode, batch_size,
+            make_limiter(max_workers, adaptive, use_async=True), index))
+        _print_outcome(stats)
+        return stats.report(label)
+    list_workers = max(1, min(list_workers or len(category_ids), len(category_ids), max_workers))
+
+    # 1 connection pool dùng chung cho worker cập nhật và lister (mỗi lister tải song song
+    # tối đa LIST_CONCURRENCY trang, WooClient.iter_pages)
+    client = WooClient(base_url, consumer_key, consumer_secret,
+                       pool_size=max_workers + list_workers * LIST_CONCURRENCY,
+                       limiter=make_limiter(max_workers + list_workers, adaptive))
+    stats = _HideStats()
+
+    seen = set()
+    seen_lock = threading.Lock()
+    # Giới hạn số job đang chờ/chạy để lister không chạy quá xa so với worker
+    slots = threading.BoundedSemaphore(max_workers * 2)
+
+    def claim(ids: list[int]) -> list[int]:
+        # Chỉ giữ lại ID chưa được category khác nhận xử lý
+        with seen_lock:
+            fresh = [pid for pid in ids if pid not in seen]
+            seen.update(fresh)
+        stats.add(duplicates=len(ids) - len(fresh))
+        return fresh
+
+    with ThreadPoolExecutor(max_workers=max_workers) as updater:
+
+        def job_done(fut, batch: list[int]):
+            slots.release()
+            # Lỗi ngoài dự kiến trong job (không phải lỗi mạng đã được _run_hide_job tính) vẫn phải vào số lỗi
+            err = fut.exception()
+            if err is not None:
+                stats.add(failed=len(batch))
+                print(f"✖ Failed to hide {len(batch)} products: {err!r}")
+
+        def dispatch(ids: list[int]):
+            for batch in chunked(ids, batch_size):
+                slots.acquire()
+                fut = updater.submit(_run_hide_job, batch, mode, client, stats, index)
+                fut.add_done_callback(lambda f, b=batch: job_done(f, b))
+
+        def list_category(cat_id: int):
+            # Trang 2..N tải song song, nhận về theo thứ tự trang (WooClient.iter_pages)
+            page = 0
+            for page, products in enumerate(
+                    client.iter_pages("/products", {"category": cat_id, "_fields": HIDE_FIELDS}, per_page), 1):
+                stats.add(requests_=1)
+                to_hide = claim([p["id"] for p in products if "id" in p and _needs_hide(p)])
+                if to_hide:
+                    dispatch(to_hide)
+                else:
+                    print(f"ℹ️  Category {cat_id} page {page}: không có sản phẩm mới cần ẩn.")
+            print(f"✅ Category {cat_id}: đã liệt kê xong {page} trang.")
+
+        if index is not None:
+            # Lập kế hoạch từ chỉ mục local: không cần liệt kê từng category qua API
+            index.sync(client)
+            planned = claim(index.ids_to_hide(category_ids))
+            print(f"📇 Catalog index: {len(planned)} sản phẩm cần ẩn")
+            dispatch(planned)
+        else:
+            with ThreadPoolExecutor(max_workers=list_workers) as lister:
+                listings = {lister.submit(list_category, cid): cid for cid in category_ids}
+                for fut in as_completed(listings):
+                    try:
+                        fut.result()
+                    except requests.RequestException as e:
+                        print(f"✖ Lỗi khi liệt kê Category {listings[fut]}: {e}")
+        # Thoát khỏi `with updater` = chờ mọi job cập nhật hoàn tất
+    client.close()
+
+    _print_outcome(stats)
+    return stats.report(label)
+
+
+async def _hide_categories_async(category_ids: list[int], base_url: str,
+                                 consumer_key: str, consumer_secret: str,
+                                 per_page: int, max_in_flight: int,
+                                 mode: str, batch_size: int, limiter=None,
+                                 index=None) -> _HideStats:
+    """
+    Bản asyncio của hide_categories(): mọi category được liệt kê đồng thời,
+    mỗi batch là 1 task; AsyncWooClient giới hạn số request đang bay.
+    """
+    stats = _HideStats()
+    seen = set()
+    # Giới hạn số task đang chờ (backpressure) giống bản thread
+    pending = asyncio.Semaphore(max_in_flight * 2)
+    tasks = []
+
+    async with AsyncWooClient(base_url, consumer_key, consumer_secret,
+                              max_in_flight=max_in_flight, limiter=limiter) as client:
+
+        async def hide_job(prod_ids: list[int]):
+            try:
+                if mode == "single":
+                    r = await client.request("PUT", f"/products/{prod_ids[0]}", json=_hide_fields())
+                    ok = r.status == 200
+                    stats.add(requests_=1, hidden=int(ok), failed=int(not ok))
+                    print(f"✔ Hid product ID {prod_ids[0]}" if ok
+                          else f"✖ Failed to hide product ID {prod_ids[0]}: {r.status}")
+                    hidden = [prod_ids[0]] if ok else []
+                else:
+                    fields = _hide_fields()
+                    r = await client.request("POST", "/products/batch", idempotent=True,
+                                             json={"update": [{"id": pid, **fields} for pid in prod_ids]})
+                    results = _parse_hide_batch(prod_ids, r.status, r.data)
+                    _record_batch_results(results, stats)
+                    hidden = [pid for pid, ok, _ in results if ok]
+                if index is not None:
+                    index.mark_hidden(hidden)
+            except Exception as e:
+                stats.add(requests_=1, failed=len(prod_ids))
+                print(f"✖ Failed to hide {len(prod_ids)} products: {e}")
+            finally:
+                pending.release()
+
+        async def list_category(cat_id: int):
+            page = 0
+            async for products in client.iter_pages("/products", {"category": cat_id, "_fields": HIDE_FIELDS},
+                                                    per_page):
+                page += 1
+                stats.add(requests_=1)
+                # Chạy trên 1 event loop nên không cần lock cho `seen`
+                ids = [p["id"] for p in products if "id" in p and _needs_hide(p)]
+                to_hide = [pid for pid in ids if pid not in seen]
+                seen.update(to_hide)
+                stats.add(duplicates=len(ids) - len(to_hide))
+                if not to_hide:
+                    print(f"ℹ️  Category {cat_id} page {page}: không có sản phẩm mới cần ẩn.")
+                for batch in chunked(to_hide, batch_size):
+                    await pending.acquire()
+                    tasks.append(asyncio.create_task(hide_job(batch)))
+            print(f"✅ Category {cat_id}: đã liệt kê xong {page} trang.")
+
+        if index is not None:
+            # Sync chỉ mục (đồng bộ, qua WooClient) trong thread phụ để không chặn event loop
+            sync_client = WooClient(base_url, consumer_key, consumer_secret)
+            try:
+                await asyncio.to_thread(index.sync, sync_client)
+            finally:
+                sync_client.close()
+            planned = index.ids_to_hide(category_ids)
+            print(f"📇 Catalog index: {len(planned)} sản phẩm cần ẩn")
+            for batch in chunked(planned, batch_size):
+                await pending.acquire()
+                tasks.append(asyncio.create_task(hide_job(batch)))
+        else:
+            listings = await asyncio.gather(*(list_category(cid) for cid in category_ids),
+                                            return_exceptions=True)
+            for cid, res in zip(category_ids, listings):
+                if isinstance(res, Exception):
+                    print(f"✖ Lỗi khi liệt kê Category {cid}: {res}")
+        await asyncio.gather(*tasks)
+    return stats
+
+
 def hide_products(category_id: int,
                   base_url: str,
                   consumer_key: str,
                   consumer_secret: str,
                   per_page: int = 100,
-                  max_workers: int = 5) -> None:
+                  max_workers: int = 5,
+                  mode: str = "batch",
+                  batch_size: int = MAX_BATCH_SIZE,
+                  transport: str = "thread",
+                  adaptive: bool = True,
+                  index=None,
+                  dry_run: bool = False,
+                  metrics_json: str = None,
+                  metrics_prom: str = None) -> dict:
     """
     Hide all products in a WooCommerce category by:
       - Setting 'catalog_visibility' to 'hidden' (excludes from shop, search, archives)
@@ -37,52 +433,21 @@ def hide_products(category_id: int,
         consumer_key: WooCommerce REST API Consumer Key.
         consumer_secret: WooCommerce REST API Consumer Secret.
         per_page: Number of products per page (max 100).
+        max_workers: Number of concurrent update requests.
+        mode: 'batch' (POST /products/batch, up to 100 items per request)
+              or 'single' (legacy: one PUT /products/{id} per product).
+        batch_size: Items per batch request in 'batch' mode (capped at 100).
+        transport: 'thread' or 'async' (see hide_categories()).
+        adaptive: Adaptive concurrency (see hide_categories()).
+        index: Optional CatalogIndex to plan from (see hide_categories()).
+        dry_run: Only print the request plan (see hide_categories()).
+        metrics_json, metrics_prom: Request metrics outputs (see hide_categories()).
+
+    Returns:
+        Summary dict with request/product counts and requests/products per second.
     """
-    auth = HTTPBasicAuth(consumer_key, consumer_secret)
-    api_base = base_url.rstrip('/') + '/wp-json/wc/v3'
-    page = 1
-    while True:
-        # Fetch products in the category
-        list_url = f"{api_base}/products"
-        resp = requests.get(
-            list_url,
-            params={"category": category_id, "per_page": per_page, "page": page},
-            auth=auth
-        )
-        resp.raise_for_status()
-        products = resp.json()
-        if not products:
-            print("✅ All products hidden.")
-            break
-
-         # 2) Lọc chỉ những sản phẩm CHƯA ẩn
-        to_hide = []
-        for p in products:
-            # nếu đã ẩn qua catalog_visibility thì bỏ qua
-            if p.get("catalog_visibility") == "hidden":
-                continue
-            # nếu đã có meta _hwp_hide_product = yes thì bỏ qua
-            for m in p.get("meta_data", []):
-                if m.get("key") == "_hwp_hide_product" and m.get("value") == "yes":
-                    break
-            else:
-                # không break => chưa có meta, thêm vào danh sách xử lý
-                to_hide.append(p)
-
-        if not to_hide:
-            print(f"ℹ️  Page {page}: không có sản phẩm mới cần ẩn.")
-            page += 1
-            continue
-
-
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # submit tất cả các job
-            futures = {
-                executor.submit(_hide_one_product, p["id"], api_base, auth): p["id"]
-                for p in to_hide  if "id" in p
-            }
-            # in kết quả khi từng job hoàn thành
-            for fut in as_completed(futures):
-                print(fut.result())
-
-        page += 1
+    return hide_categories([category_id], base_url, consumer_key, consumer_secret,
+                           per_page=per_page, max_workers=max_workers,
+                           mode=mode, batch_size=batch_size, transport=transport,
+                           adaptive=adaptive, index=index, dry_run=dry_run,
+                           metrics_json=metrics_json, metrics_prom=metrics_prom)
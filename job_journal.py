@@ -0,0 +1,119 @@
+# job_journal.py
+# Nhật ký job chỉ-ghi-thêm (JSON Lines) cho feed / delete chạy lâu:
+# mỗi batch ghi 1 dòng gồm khóa batch (hash input), input rút gọn (SKU / ID) và kết quả.
+# Khi chạy lại với resume=True, batch đã 'done' được bỏ qua, job tiếp tục từ chỗ dừng.
+#
+# fsync gom nhóm: mỗi dòng được flush ngay (sống sót khi process chết / Ctrl-C),
+# còn fsync xuống đĩa chỉ sau `fsync_every` dòng hoặc `fsync_interval` giây
+# -> mất điện chỉ làm mất tối đa vài dòng cuối, batch tương ứng sẽ được gửi lại.
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+
+def batch_key(action: str, items) -> str:
+    """
+    Khóa ổn định của 1 batch: hash của action + nội dung item (thứ tự key không ảnh hưởng).
+    """
+    raw = json.dumps([action, items], sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class JobJournal:
+    """
+    Journal của 1 job, dùng chung được giữa các thread.
+
+    Tham số:
+      - path: file .jsonl của journal
+      - job: dict mô tả job (vd {'kind': 'feed', 'csv': ...}); khi resume phải khớp
+        với dòng đầu của journal, tránh resume nhầm job khác
+      - resume: True = đọc lại các batch đã xong và ghi tiếp; False = bắt đầu journal mới
+      - fsync_every, fsync_interval: ngưỡng gom nhóm fsync (số dòng / giây)
+    """
+    def __init__(self, path: str, job: dict = None, resume: bool = False,
+                 fsync_every: int = 50, fsync_interval: float = 1.0):
+        self.path = path
+        self.job = job or {}
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._done = set()
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+        if resume and os.path.exists(path):
+            self._load()
+            self._file = open(path, 'a', encoding='utf-8')
+        else:
+            self._file = open(path, 'w', encoding='utf-8')
+            self._write({'job': self.job, 'started': time.time()})
+            self.sync()
+
+    def _load(self):
+        with open(self.path, encoding='utf-8') as f:
+            for n, line in enumerate(f):
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # Dòng cuối có thể bị cắt dở khi process chết giữa chừng
+                    logging.warning(f"Journal {self.path}: bỏ qua dòng {n + 1} hỏng")
+                    continue
+                if n == 0 and 'job' in rec:
+                    if self.job and rec['job'] != self.job:
+                        raise ValueError(f"Journal {self.path} thuộc job khác: {rec['job']} != {self.job}")
+                    continue
+                if rec.get('status') == 'done':
+                    self._done.add(rec['key'])
+        logging.info(f"Resume từ journal {self.path}: {len(self._done)} batch đã xong")
+
+    def _write(self, rec: dict):
+        self._file.write(json.dumps(rec, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def sync(self):
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def is_done(self, key: str) -> bool:
+        with self._lock:
+            return key in self._done
+
+    @property
+    def done_count(self) -> int:
+        with self._lock:
+            return len(self._done)
+
+    def record(self, key: str, status: str, inputs=None, **outcome):
+        """
+        Ghi kết quả 1 batch: status 'done' hoặc 'failed', inputs = danh sách SKU / ID của batch,
+        outcome = thông tin thêm (số item tạo/cập nhật/xóa, lỗi...).
+        """
+        rec = {'key': key, 'status': status, 'ts': round(time.time(), 3)}
+        if inputs is not None:
+            rec['inputs'] = inputs
+        rec.update(outcome)
+        with self._lock:
+            self._write(rec)
+            if status == 'done':
+                self._done.add(key)
+            self._pending += 1
+            if (self._pending >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self.sync()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self.sync()
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,275 @@
+# job_runner.py
+# Chạy job không cần input() trên nhiều store cùng lúc, theo 1 file job JSON:
+#
+# {
+#   "max_parallel_stores": 4,                 # số store chạy song song (mặc định 4)
+#   "report": "report.json",                  # file báo cáo gộp (hoặc --report)
+#   "stop_on_error": false,                   # true: job lỗi -> bỏ các job còn lại của store đó
+#   "stores": {
+#     "shop1": {"url": "https://shop1.com", "max_workers": 10},
+#     "shop2": {"url": "https://shop2.com", "key_env": "SHOP2_CK", "secret_env": "SHOP2_CS"}
+#   },
+#   "jobs": [
+#     {"store": "shop1", "op": "hide", "categories": [171, 128]},
+#     {"store": ["shop1", "shop2"], "op": "delete", "action": 1, "categories": [140],
+#      "dead_letter": "dead-{store}.csv"},
+#     {"store": "*", "op": "feed", "csv": "products.csv", "mode": "upsert", "journal": "feed-{store}.jsonl"},
+#     {"op": "domains", "csv": "auctions.csv", "column": "name", "min_age": 10, "max_price": 50}
+#   ]
+# }
+#
+# Key / secret KHÔNG nằm trong file job mà đọc từ biến môi trường: mặc định
+# WOO_<TÊN STORE>_KEY / WOO_<TÊN STORE>_SECRET (vd WOO_SHOP1_KEY), hoặc tên biến ở key_env / secret_env.
+# Mỗi store chạy các job của mình lần lượt (max_workers của store là trần request đồng thời tới
+# store đó), các store chạy song song. Giá trị chuỗi của job có thể dùng {store}
+# (file journal / dead-letter / metrics riêng cho từng store).
+# Module của từng thao tác (hide / delete / feed / domains: requests, aiohttp, whois ...) chỉ được
+# import khi có job cần tới nên job ngắn khởi động nhanh.
+#
+# Chạy: python job_runner.py jobs.json [--report report.json] [--dry-run]
+# --dry-run: hide / delete / feed chỉ in kế hoạch request; job domains (không có dry-run) bị bỏ qua
+# và được ghi 'skipped' trong báo cáo.
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PARALLEL_STORES = 4
+DEFAULT_STORE_WORKERS = 10
+# "Store" của job không cần store (kiểm tra domain)
+LOCAL_LANE = '(local)'
+
+
+def _hide(store, job):
+    from hide_products import hide_categories
+    return hide_categories(job['categories'], store['url'], store['key'], store['secret'],
+                           max_workers=store['max_workers'], **job['options'])
+
+
+def _delete(store, job):
+    from delete_product import run_delete
+    return run_delete(store['url'], store['key'], store['secret'], store['max_workers'],
+                      choice=str(job['action']), **job['options'])
+
+
+def _feed(store, job):
+    from feed_product import feed_products
+    return feed_products(job['csv'], store['url'], store['key'], store['secret'],
+                         max_workers=store['max_workers'], **job['options'])
+
+
+def _domains(store, job):
+    from domain_check import check_domains_file
+    summary = check_domains_file(job['csv'], job['column'], job['min_age'], job['max_price'], **job['options'])
+    summary.pop('results')      # danh sách domain đã nằm trong file output
+    return summary
+
+
+# op -> (hàm chạy, trường bắt buộc, trường tùy chọn của job -> tên tham số, cần store?)
+OPERATIONS = {
+    'hide': (_hide, ('categories',),
+             {'mode': 'mode', 'batch_size': 'batch_size', 'per_page': 'per_page', 'transport': 'transport',
+              'adaptive': 'adaptive', 'dry_run': 'dry_run', 'metrics_json': 'metrics_json',
+              'metrics_prom': 'metrics_prom'}, True),
+    'delete': (_delete, ('action',),
+               {'categories': 'category_ids', 'ids': 'product_ids', 'file': 'associations_path',
+                'transport': 'transport', 'adaptive': 'adaptive', 'journal': 'journal_path',
+                'resume': 'resume', 'dead_letter': 'dead_letter_path', 'dry_run': 'dry_run',
+                'metrics_json': 'metrics_json', 'metrics_prom': 'metrics_prom',
+                'adaptive_batch': 'adaptive_batch', 'batch_state': 'batch_state_path'}, True),
+    'feed': (_feed, ('csv',),
+             {'batch_size': 'batch_size', 'mode': 'mode', 'throttle': 'throttle', 'transport': 'transport',
+              'adaptive': 'adaptive', 'journal': 'journal_path', 'resume': 'resume',
+              'dead_letter': 'dead_letter_path', 'max_attempts': 'max_attempts', 'dry_run': 'dry_run',
+              'metrics_json': 'metrics_json', 'metrics_prom': 'metrics_prom', 'max_batch_bytes': 'max_batch_bytes',
+              'adaptive_batch': 'adaptive_batch', 'batch_state': 'batch_state_path'}, True),
+    'domains': (_domains, ('csv', 'column', 'min_age', 'max_price'),
+                {'output': 'output_file', 'top_k': 'top_k', 'tld': 'tld', 'cache': 'cache_path',
+                 'workers': 'max_workers'}, False),
+}
+# Trường chung của mọi job (không truyền xuống hàm thao tác)
+JOB_FIELDS = {'store', 'op', 'name'}
+# action của delete -> trường dữ liệu bắt buộc (thiếu thì run_delete sẽ chờ input())
+DELETE_ACTION_FIELDS = {'1': 'categories', '2': 'categories', '3': 'ids', '4': 'file'}
+
+
+def env_name(store_name: str, suffix: str) -> str:
+    """Tên biến môi trường mặc định của store: WOO_<TÊN>_<SUFFIX> (ký tự khác chữ / số -> '_')."""
+    return f"WOO_{re.sub(r'[^A-Z0-9]', '_', store_name.upper())}_{suffix}"
+
+
+def _format(value, store_name):
+    # Thay {store} trong chuỗi (đường dẫn file riêng cho từng store)
+    return value.replace('{store}', store_name) if isinstance(value, str) else value
+
+
+def load_jobs(doc: dict, dry_run: bool = False) -> dict:
+    """
+    Kiểm tra file job và trải job ra từng store: trả về {store: [job, ...]} theo thứ tự trong file.
+    Mỗi job: {'index', 'name', 'op', 'store', trường bắt buộc..., 'options': {tham số: giá trị}}.
+    Lỗi cấu hình (store / op / trường không hợp lệ) -> ValueError trước khi chạy bất kỳ job nào.
+    """
+    stores = doc.get('stores') or {}
+    for name, cfg in stores.items():
+        if not isinstance(cfg, dict) or not cfg.get('url'):
+            raise ValueError(f"Store {name!r}: thiếu 'url'")
+    lanes = {}
+    for index, raw in enumerate(doc.get('jobs') or [], 1):
+        op = raw.get('op')
+        if op not in OPERATIONS:
+            raise ValueError(f"Job {index}: op không hợp lệ {op!r} (chỉ {', '.join(OPERATIONS)})")
+        _, required, optional, needs_store = OPERATIONS[op]
+        missing = [f for f in required if f not in raw]
+        unknown = set(raw) - JOB_FIELDS - set(required) - set(optional)
+        if missing or unknown:
+            raise ValueError(f"Job {index} ({op}): thiếu {missing}" if missing
+                             else f"Job {index} ({op}): trường không hỗ trợ {sorted(unknown)}")
+        if op == 'delete':
+            field = DELETE_ACTION_FIELDS.get(str(raw['action']))
+            if field is None:
+                raise ValueError(f"Job {index}: action của delete phải là 1-4")
+            if raw.get(field) in (None, '', []):
+                raise ValueError(f"Job {index} (delete action {raw['action']}): thiếu {field!r}")
+        if not needs_store:
+            targets = [LOCAL_LANE]
+        else:
+            target = raw.get('store')
+            targets = list(stores) if target == '*' else [target] if isinstance(target, str) else target or []
+            bad = [t for t in targets if t not in stores]
+            if not targets or bad:
+                raise ValueError(f"Job {index} ({op}): store không hợp lệ {bad or target!r}")
+        for store_name in targets:
+            job = {f: _format(raw[f], store_name) for f in required}
+            job['options'] = {param: _format(raw[f], store_name) for f, param in optional.items() if f in raw}
+            if dry_run and 'dry_run' in optional:
+                job['options']['dry_run'] = True
+            elif dry_run:
+                # Thao tác không có chế độ dry-run (vd domains tra WHOIS, ghi file) -> không chạy thật
+                job['skip'] = f"dry-run: op {op} không có chế độ dry-run, không chạy"
+            job.update(index=index, op=op, store=store_name, name=raw.get('name') or f"{op}#{index}")
+            lanes.setdefault(store_name, []).append(job)
+    if not lanes:
+        raise ValueError("File job không có job nào")
+    return lanes
+
+
+def resolve_store(name: str, cfg: dict) -> dict:
+    """URL, key / secret (từ biến môi trường) và trần request đồng thời của 1 store."""
+    if name == LOCAL_LANE:
+        return {'name': name}
+    key_env = cfg.get('key_env') or env_name(name, 'KEY')
+    secret_env = cfg.get('secret_env') or env_name(name, 'SECRET')
+    missing = [v for v in (key_env, secret_env) if not os.environ.get(v)]
+    if missing:
+        raise KeyError(f"Thiếu biến môi trường {', '.join(missing)} cho store {name}")
+    return {'name': name, 'url': cfg['url'], 'key': os.environ[key_env], 'secret': os.environ[secret_env],
+            'max_workers': int(cfg.get('max_workers', DEFAULT_STORE_WORKERS))}
+
+
+def _jsonable(value):
+    # Kết quả của thao tác (summary / plan) -> giá trị ghi được vào JSON
+    return json.loads(json.dumps(value, default=str))
+
+
+def run_store(name: str, cfg: dict, jobs: list, stop_on_error: bool = False) -> list:
+    """Chạy lần lượt các job của 1 store, trả về kết quả từng job (không raise)."""
+    results = []
+    try:
+        store = resolve_store(name, cfg)
+        error = None
+    except KeyError as e:
+        store, error = None, e.args[0]
+    for job in jobs:
+        entry = {'store': name, 'job': job['name'], 'op': job['op'], 'index': job['index']}
+        if error is not None:
+            results.append({**entry, 'status': 'skipped' if store else 'failed', 'error': error})
+            continue
+        if job.get('skip'):
+            results.append({**entry, 'status': 'skipped', 'error': job['skip']})
+            continue
+        print(f"▶ [{name}] {job['name']} ...", flush=True)
+        start = time.perf_counter()
+        try:
+            result = OPERATIONS[job['op']][0](store, job)
+            entry.update(status='ok', result=_jsonable(result))
+        except Exception as e:
+            entry.update(status='failed', error=f"{type(e).__name__}: {e}")
+            print(f"✖ [{name}] {job['name']}: {entry['error']}", flush=True)
+            traceback.print_exc()
+            if stop_on_error:
+                error = f"Bỏ qua vì job {job['name']} lỗi"
+        entry['elapsed_s'] = round(time.perf_counter() - start, 3)
+        if entry['status'] == 'ok':
+            print(f"✔ [{name}] {job['name']} xong sau {entry['elapsed_s']}s", flush=True)
+        results.append(entry)
+    return results
+
+
+def run_jobs(doc: dict, dry_run: bool = False, max_parallel_stores: int = None) -> dict:
+    """
+    Chạy mọi job của file job (dict): các store song song (tối đa max_parallel_stores),
+    job của cùng 1 store lần lượt. Trả về báo cáo gộp {'created', 'elapsed_s', 'stores', 'jobs'}.
+    """
+    lanes = load_jobs(doc, dry_run)
+    stores = doc.get('stores') or {}
+    parallel = max_parallel_stores or int(doc.get('max_parallel_stores', DEFAULT_PARALLEL_STORES))
+    stop_on_error = bool(doc.get('stop_on_error', False))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(parallel, len(lanes)))) as pool:
+        futures = [pool.submit(run_store, name, stores.get(name, {}), jobs, stop_on_error)
+                   for name, jobs in lanes.items()]
+        jobs = sorted((r for fut in futures for r in fut.result()), key=lambda r: (r['index'], r['store']))
+    per_store = {}
+    for r in jobs:
+        counts = per_store.setdefault(r['store'], {'ok': 0, 'failed': 0, 'skipped': 0, 'elapsed_s': 0.0})
+        counts[r['status']] += 1
+        counts['elapsed_s'] = round(counts['elapsed_s'] + r.get('elapsed_s', 0.0), 3)
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'elapsed_s': round(time.perf_counter() - start, 3),
+        'dry_run': dry_run,
+        'stores': per_store,
+        'jobs': jobs,
+    }
+
+
+def print_report(report: dict):
+    print(f"\n=== BÁO CÁO JOB ({report['elapsed_s']}s) ===")
+    for name, c in report['stores'].items():
+        print(f"{name:<20} ok {c['ok']:>3}  lỗi {c['failed']:>3}  bỏ qua {c['skipped']:>3}  {c['elapsed_s']:>9.3f}s")
+    for r in report['jobs']:
+        if r['status'] != 'ok':
+            print(f"  ✖ [{r['store']}] {r['job']}: {r['status']} - {r.get('error')}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Chạy job hide / delete / feed / domains trên nhiều store')
+    parser.add_argument('job_file', help='File job JSON')
+    parser.add_argument('--report', help='File báo cáo JSON (mặc định: trường "report" của file job)')
+    parser.add_argument('--dry-run', action='store_true', help='Chỉ lập kế hoạch request cho mọi job')
+    parser.add_argument('--parallel', type=int, help='Số store chạy song song (ghi đè max_parallel_stores)')
+    args = parser.parse_args(argv)
+
+    with open(args.job_file, encoding='utf-8') as f:
+        doc = json.load(f)
+    try:
+        report = run_jobs(doc, args.dry_run, args.parallel)
+    except ValueError as e:
+        print(f"❗ File job không hợp lệ: {e}")
+        return 2
+    print_report(report)
+    report_path = args.report or doc.get('report')
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"✅ Đã ghi báo cáo vào {report_path}")
+    return 1 if any(c['failed'] for c in report['stores'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
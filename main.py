@@ -1,9 +1,9 @@
+import os
 import sys
-from hide_products import hide_products
-from domain_check import run as check_domains
-from delete_product import run_delete
-from feed_product import feed_products  # Nhúng module feed sản phẩm
+from getpass import getpass
 
+# Module chức năng được import trong từng nhánh menu (chỉ nạp requests / whois ... khi cần).
+# Chạy không cần input() trên nhiều store: python main.py jobs.json (xem job_runner.py)
 
 
 def main():
@@ -12,45 +12,60 @@ def main():
     print("2. Xóa sản phẩm theo yêu cầu")
     print("3. Feed sản phẩm từ file CSV")
     print("4. Kiểm tra domain (tuổi & giá)")
-    api_url = 'https://hartca.com'
-    ck      = 'ck_e6339b1b9b988258eb0faa7cef2a7adf03a55f5f'
-    cs      = 'cs_a4ff2993fb69780aa08f15db40e78b7eaeee959b'
+    # Thông tin store lấy từ biến môi trường, không ghi key trong code
+    api_url = os.environ.get('WOO_URL', 'https://hartca.com')
+    ck      = os.environ.get('WOO_CONSUMER_KEY', '')
+    cs      = os.environ.get('WOO_CONSUMER_SECRET', '')
     categories  = [171,128,1726,140,1728,1724,1722,138,135,1723,270]
     max_workers = 10
 
     choice = input("Chọn chức năng (1-4): ").strip()
-    
+    if choice in {"1", "2", "3"} and not (ck and cs):
+        # Chưa đặt biến môi trường -> hỏi trực tiếp (secret nhập ẩn, không hiện trên màn hình)
+        print("Chưa đặt biến môi trường WOO_CONSUMER_KEY / WOO_CONSUMER_SECRET, nhập trực tiếp:")
+        ck = ck or input("Consumer key: ").strip()
+        cs = cs or getpass("Consumer secret: ").strip()
+        if not (ck and cs):
+            print("❗ Thiếu consumer key / secret. Thoát.")
+            return
+
     if choice == "1":
-        for cat_id in categories :
-            hide_products(
-                category_id=cat_id,
-                base_url=api_url,
-                consumer_key=ck,
-                consumer_secret=cs,
-                max_workers = max_workers,
-            )
+        from hide_products import hide_categories
+        # Ẩn tất cả category trong 1 lượt: liệt kê song song, 1 pool cập nhật dùng chung
+        hide_categories(
+            category_ids=categories,
+            base_url=api_url,
+            consumer_key=ck,
+            consumer_secret=cs,
+            max_workers=max_workers,
+        )
     elif choice == "4":
         # Chạy trình kiểm tra domain tuổi và giá
+        from domain_check import run as check_domains
         check_domains()
     elif choice == "2":
+        from delete_product import run_delete
         run_delete(api_url, ck, cs, max_workers)
     elif choice == "3":
         # Feed sản phẩm từ file CSV
+        from feed_product import feed_products
         # 1) Nhập đường dẫn file CSV từ người dùng
         csv_path = input("Nhập đường dẫn tới file CSV: ").strip()
         # 2) Gọi hàm feed_products đã cài ở feed_product.py
-        #    Tham số: đường dẫn CSV, URL store, key/secret, batch_size, workers, throttle
+        #    Tham số: đường dẫn CSV, URL store, key/secret, batch_size, workers
         feed_products(
             csv_path=csv_path,
             base_url=api_url,
             ck=ck,
             cs=cs,
             batch_size=80,    # số sản phẩm gửi 1 batch
-            max_workers=3,    # số batch chạy song song
-            throttle=1.0      # giãn cách (giây) giữa các batch
+            max_workers=max_workers,  # trần số batch song song, AIMD tự điều chỉnh bên dưới
         )
     else:
         print("❗ Lựa chọn không hợp lệ. Vui lòng chạy lại và chọn 1-4.")
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        from job_runner import main as run_job_file
+        sys.exit(run_job_file(sys.argv[1:]))
     main()
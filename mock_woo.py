@@ -0,0 +1,392 @@
+# mock_woo.py
+# Mock WooCommerce REST API (wc/v3) chạy local, trong cùng process, để thử tải
+# hide / delete / feed mà không đụng tới store thật.
+#
+# Ví dụ:
+#     with MockWooServer(products=1000, latency=0.02) as srv:
+#         hide_categories([srv.store.default_category], srv.url, 'ck', 'cs')
+
+import json
+import re
+import time
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+API_PREFIX = '/wp-json/wc/v3'
+
+
+class MockWooStore:
+    """
+    Dữ liệu trong bộ nhớ của mock: products và categories, thread-safe (RLock).
+    """
+    def __init__(self, products: int = 0, categories: int = 1):
+        self.lock = threading.RLock()
+        self.products = {}
+        self.categories = {}
+        self._next_product = 1
+        self._next_category = 100
+        for i in range(categories):
+            self.add_category(f"Category {i + 1}")
+        self.default_category = min(self.categories) if self.categories else None
+        for i in range(products):
+            self.add_product(sku=f"SKU-{i + 1}", name=f"Product {i + 1}",
+                             categories=[self.default_category] if self.default_category else [])
+
+    def add_category(self, name: str, parent: int = 0) -> dict:
+        with self.lock:
+            cid = self._next_category
+            self._next_category += 1
+            cat = {'id': cid, 'name': name, 'slug': name.lower().replace(' ', '-'),
+                   'parent': parent, 'count': 0}
+            self.categories[cid] = cat
+            return cat
+
+    def add_product(self, categories=(), **fields) -> dict:
+        with self.lock:
+            pid = self._next_product
+            self._next_product += 1
+            prod = {
+                'id': pid, 'name': '', 'sku': '', 'status': 'publish', 'type': 'simple',
+                'catalog_visibility': 'visible', 'regular_price': '', 'description': '',
+                'date_modified_gmt': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime()),
+                'meta_data': [],
+            }
+            prod.update(fields)
+            prod['categories'] = [{'id': c} if isinstance(c, int) else c for c in categories]
+            self.products[pid] = prod
+            return prod
+
+    def update_product(self, pid: int, fields: dict) -> dict:
+        prod = self.products[pid]
+        for key, value in fields.items():
+            if key == 'meta_data':
+                # Giống WooCommerce: meta theo key được ghi đè, không thay cả list
+                metas = {m['key']: m for m in prod['meta_data']}
+                for m in value:
+                    metas[m['key']] = {'key': m['key'], 'value': m.get('value')}
+                prod['meta_data'] = list(metas.values())
+            elif key != 'id':
+                prod[key] = value
+        prod['date_modified_gmt'] = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime())
+        return prod
+
+    def descendants(self, cid: int) -> set:
+        """cid cùng mọi category con cháu (filter category= của WooCommerce gồm cả category con)."""
+        with self.lock:
+            tree = {cid}
+            while True:
+                more = {c['id'] for c in self.categories.values() if c.get('parent') in tree} - tree
+                if not more:
+                    return tree
+                tree |= more
+
+    def category_count(self, cid: int) -> int:
+        return sum(1 for p in self.products.values() if any(c['id'] == cid for c in p['categories']))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'          # keep-alive như server thật
+    disable_nagle_algorithm = True         # tránh trễ 40ms do Nagle + delayed ACK
+    server_version = 'MockWoo/1.0'
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def store(self) -> MockWooStore:
+        return self.server.store
+
+    # ---- tiện ích ----
+    def _send(self, obj, status: int = 200, headers: dict = None):
+        body = obj if isinstance(obj, bytes) else json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Handler endpoint trả về (obj, status, headers); _route gửi đi sau khi nhả lock
+    @staticmethod
+    def _error(status: int, code: str, message: str):
+        return {'code': code, 'message': message, 'data': {'status': status}}, status, None
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}') if length else {}
+
+    @staticmethod
+    def _paginate(items: list, query: dict):
+        per_page = int(query.get('per_page', ['10'])[0])
+        page = int(query.get('page', ['1'])[0])
+        total = len(items)
+        total_pages = (total + per_page - 1) // per_page
+        start = (page - 1) * per_page
+        return items[start:start + per_page], 200, {'X-WP-Total': total, 'X-WP-TotalPages': total_pages}
+
+    @staticmethod
+    def _project(obj, query: dict):
+        # Hỗ trợ `_fields` (chỉ trường cấp 1) như WordPress REST API
+        if '_fields' not in query:
+            return obj
+        fields = query['_fields'][0].split(',')
+        pick = lambda item: {k: item[k] for k in fields if k in item}
+        return [pick(o) for o in obj] if isinstance(obj, list) else pick(obj)
+
+    def _route(self, method: str):
+        url = urlparse(self.path)
+        body = self._read_body() if method in ('POST', 'PUT') else {}
+        if not url.path.startswith(API_PREFIX):
+            return self._send(*self._error(404, 'rest_no_route', 'No route was found.'))
+        path = url.path[len(API_PREFIX):]
+        query = parse_qs(url.query)
+        start = time.perf_counter()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.inject('throttle_rate'):
+            # Giả lập rate limit của host: 429 + Retry-After, request không được xử lý
+            self._send(*self._error(429, 'too_many_requests', 'Too Many Requests.')[:2],
+                       {'Retry-After': self.server.retry_after})
+            self.server.record(method, path, time.perf_counter() - start, throttled=True)
+            return
+        if method == 'POST' and path.endswith('/batch'):
+            # Giả lập chi phí xử lý theo số item và giới hạn bộ nhớ PHP theo kích thước body
+            items = sum(len(body.get(action) or ()) for action in ('create', 'update', 'delete'))
+            if self.server.item_latency:
+                time.sleep(self.server.item_latency * items)
+            limit = self.server.max_batch_bytes
+            if limit and int(self.headers.get('Content-Length') or 0) > limit:
+                self._send(*self._error(500, 'internal_server_error', 'Allowed memory size exhausted.')[:2])
+                self.server.record(method, path, time.perf_counter() - start)
+                return
+        handler = getattr(self, f"_{method.lower()}")
+        with self.store.lock:
+            obj, status, headers = handler(path, query, body)
+            if method == 'GET' and status == 200:
+                obj = self._project(obj, query)
+            # Serialize trong lock (dữ liệu còn đang được thread khác sửa), gửi ngoài lock
+            payload = json.dumps(obj).encode('utf-8')
+        self._send(payload, status, headers)
+        self.server.record(method, path, time.perf_counter() - start)
+
+    do_GET = lambda self: self._route('GET')
+    do_POST = lambda self: self._route('POST')
+    do_PUT = lambda self: self._route('PUT')
+    do_DELETE = lambda self: self._route('DELETE')
+
+    # ---- endpoints ----
+    def _get(self, path, query, body):
+        store = self.store
+        if path == '/products':
+            items = list(store.products.values())
+            if 'category' in query:
+                tree = store.descendants(int(query['category'][0]))
+                items = [p for p in items if any(c['id'] in tree for c in p['categories'])]
+            if 'include' in query:
+                include = {int(x) for x in query['include'][0].split(',') if x}
+                items = [p for p in items if p['id'] in include]
+            if 'sku' in query:
+                items = [p for p in items if p['sku'] == query['sku'][0]]
+            if 'modified_after' in query:
+                after = query['modified_after'][0]
+                items = [p for p in items if p['date_modified_gmt'] > after]
+            return self._paginate(items, query)
+        m = re.fullmatch(r'/products/(\d+)', path)
+        if m:
+            prod = store.products.get(int(m.group(1)))
+            if prod is None:
+                return self._error(404, 'woocommerce_rest_product_invalid_id', 'Invalid ID.')
+            return prod, 200, None
+        if path == '/products/categories':
+            cats = [dict(c, count=store.category_count(c['id'])) for c in store.categories.values()]
+            return self._paginate(cats, query)
+        return self._error(404, 'rest_no_route', 'No route was found.')
+
+    def _put(self, path, query, body):
+        m = re.fullmatch(r'/products/(\d+)', path)
+        if not m:
+            return self._error(404, 'rest_no_route', 'No route was found.')
+        pid = int(m.group(1))
+        if pid not in self.store.products:
+            return self._error(404, 'woocommerce_rest_product_invalid_id', 'Invalid ID.')
+        return self.store.update_product(pid, body), 200, None
+
+    def _delete(self, path, query, body):
+        m = re.fullmatch(r'/products/categories/(\d+)', path)
+        if not m:
+            return self._error(404, 'rest_no_route', 'No route was found.')
+        cat = self.store.categories.pop(int(m.group(1)), None)
+        if cat is None:
+            return self._error(404, 'woocommerce_rest_term_invalid', 'Resource does not exist.')
+        return cat, 200, None
+
+    def _post(self, path, query, body):
+        if path == '/products/batch':
+            return self._products_batch(body), 200, None
+        if path == '/products/categories/batch':
+            return self._categories_batch(body), 200, None
+        return self._error(404, 'rest_no_route', 'No route was found.')
+
+    def _item_error(self, item_id):
+        # Lỗi item tạm thời (item không được xử lý), tỉ lệ theo server.item_error_rate
+        if not self.server.inject('item_error_rate'):
+            return None
+        return {'id': item_id or 0, 'error': {'code': 'db_update_error', 'message': 'Could not write to database.',
+                                              'data': {'status': 500}}}
+
+    def _products_batch(self, body: dict) -> dict:
+        store = self.store
+        invalid = lambda pid: {'id': pid, 'error': {'code': 'woocommerce_rest_product_invalid_id',
+                                                    'message': 'Invalid ID.', 'data': {'status': 400}}}
+        out = {}
+        if 'create' in body:
+            out['create'] = []
+            for item in body['create']:
+                fields = {k: v for k, v in item.items() if k != 'categories'}
+                out['create'].append(self._item_error(0)
+                                     or store.add_product(item.get('categories', []), **fields))
+        if 'update' in body:
+            out['update'] = [self._item_error(item.get('id'))
+                             or (store.update_product(item['id'], item) if item.get('id') in store.products
+                                 else invalid(item.get('id'))) for item in body['update']]
+        if 'delete' in body:
+            out['delete'] = [self._item_error(pid)
+                             or (store.products.pop(pid) if pid in store.products else invalid(pid))
+                             for pid in body['delete']]
+        return out
+
+    def _categories_batch(self, body: dict) -> dict:
+        store = self.store
+        invalid = lambda cid: {'id': cid, 'error': {'code': 'woocommerce_rest_term_invalid',
+                                                    'message': 'Resource does not exist.', 'data': {'status': 404}}}
+        out = {}
+        if 'create' in body:
+            out['create'] = [store.add_category(item['name'], item.get('parent', 0)) for item in body['create']]
+        if 'update' in body:
+            out['update'] = []
+            for item in body['update']:
+                cat = store.categories.get(item.get('id'))
+                if cat is not None:
+                    cat.update({k: v for k, v in item.items() if k in ('name', 'parent', 'slug')})
+                out['update'].append(cat if cat is not None else invalid(item.get('id')))
+        if 'delete' in body:
+            out['delete'] = [store.categories.pop(cid, None) or invalid(cid) for cid in body['delete']]
+        return out
+
+
+class MockWooServer(ThreadingHTTPServer):
+    """
+    HTTP server mock chạy trên thread nền, dùng trong `with`.
+
+    Tham số:
+      - products, categories: số sản phẩm / category tạo sẵn
+        (mọi sản phẩm thuộc category đầu tiên: store.default_category)
+      - latency: độ trễ giả lập (giây) cho mỗi request
+      - item_error_rate: tỉ lệ item trong /products/batch trả về lỗi tạm thời (db_update_error, 500)
+        thay vì được xử lý
+      - throttle_rate: tỉ lệ request bị trả 429 (kèm Retry-After: retry_after giây)
+      - item_latency: độ trễ thêm (giây) cho mỗi item của request batch
+      - max_batch_bytes: request batch có body lớn hơn -> HTTP 500 (giả lập PHP hết bộ nhớ)
+      - seed: seed cho việc chọn item lỗi / request 429 (lặp lại được giữa các lần chạy)
+      - port: 0 = chọn cổng trống
+
+    request_log: list (method, path); request_times: thời gian xử lý mỗi request phía server
+    (giây, kể cả latency giả lập); throttled / item_errors: số lần đã giả lập lỗi.
+    """
+    daemon_threads = True
+    request_queue_size = 1024     # mặc định 5: nhiều client kết nối cùng lúc sẽ bị SYN retransmit ~1s
+
+    def __init__(self, products: int = 0, categories: int = 1, latency: float = 0.0,
+                 host: str = '127.0.0.1', port: int = 0, store: MockWooStore = None,
+                 item_error_rate: float = 0.0, throttle_rate: float = 0.0, retry_after: int = 0,
+                 seed: int = None, item_latency: float = 0.0, max_batch_bytes: int = None):
+        super().__init__((host, port), _Handler)
+        self.store = store or MockWooStore(products, categories)
+        self.latency = latency
+        self.item_error_rate = item_error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.item_latency = item_latency
+        self.max_batch_bytes = max_batch_bytes
+        self.throttled = 0
+        self.item_errors = 0
+        self._random = random.Random(seed)
+        self.request_log = []
+        self.request_times = []
+        self._log_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, method: str, path: str, seconds: float = None, throttled: bool = False):
+        with self._log_lock:
+            self.request_log.append((method, path))
+            if seconds is not None:
+                self.request_times.append(seconds)
+            if throttled:
+                self.throttled += 1
+
+    def inject(self, rate_attr: str) -> bool:
+        """True nếu lần này cần giả lập lỗi theo tỉ lệ self.<rate_attr>."""
+        rate = getattr(self, rate_attr)
+        if not rate:
+            return False
+        with self._log_lock:
+            hit = self._random.random() < rate
+            if hit and rate_attr == 'item_error_rate':
+                self.item_errors += 1
+        return hit
+
+    def stats(self) -> dict:
+        """Số liệu tổng hợp của mock (dùng cho benchmark)."""
+        with self._log_lock:
+            return {'requests': len(self.request_log), 'throttled': self.throttled,
+                    'item_errors': self.item_errors, 'request_times': list(self.request_times),
+                    'products': len(self.store.products)}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Chạy mock WooCommerce REST API local')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--categories', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0, help='Độ trễ giả lập mỗi request (giây)')
+    parser.add_argument('--item-errors', type=float, default=0.0,
+                        help='Tỉ lệ item batch trả lỗi tạm thời (0-1)')
+    parser.add_argument('--throttle', type=float, default=0.0, help='Tỉ lệ request trả 429 (0-1)')
+    parser.add_argument('--item-latency', type=float, default=0.0, help='Độ trễ thêm mỗi item batch (giây)')
+    parser.add_argument('--max-batch-bytes', type=int, default=None,
+                        help='Body batch lớn hơn số byte này -> HTTP 500')
+    args = parser.parse_args()
+
+    server = MockWooServer(args.products, args.categories, args.latency, port=args.port,
+                           item_error_rate=args.item_errors, throttle_rate=args.throttle,
+                           item_latency=args.item_latency, max_batch_bytes=args.max_batch_bytes)
+    print(f"Mock WooCommerce đang chạy tại {server.url} (category mặc định: {server.store.default_category})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,53 @@
+# product_records.py
+# Chế độ liệt kê "lean": chỉ xin các trường cần dùng qua `_fields` (phản hồi nhỏ hơn nhiều
+# so với JSON đầy đủ có description, images, meta_data, _links...) và chuyển mỗi trang
+# thành bản ghi gọn dùng __slots__ thay vì giữ dict JSON.
+# 100k sản phẩm: vài chục MB dict -> vài MB bản ghi.
+
+# Trường cần cho từng thao tác
+DELETE_FIELDS = 'id,categories'
+HIDE_FIELDS = 'id,catalog_visibility,meta_data'
+CATEGORY_FIELDS = 'id,name,parent'
+
+
+class ProductRef:
+    """
+    Bản ghi tối thiểu của 1 sản phẩm cho delete / remove association:
+    id và tuple ID category (int), không giữ JSON gốc.
+    """
+    __slots__ = ('id', 'category_ids')
+
+    def __init__(self, id: int, category_ids=()):
+        self.id = id
+        self.category_ids = tuple(category_ids)
+
+    @classmethod
+    def from_json(cls, product: dict) -> 'ProductRef':
+        return cls(product['id'], (c['id'] for c in product.get('categories', ())))
+
+    def __repr__(self):
+        return f"ProductRef(id={self.id}, category_ids={self.category_ids})"
+
+    def __eq__(self, other):
+        return (isinstance(other, ProductRef) and self.id == other.id
+                and self.category_ids == other.category_ids)
+
+    def __hash__(self):
+        # Cùng các trường với __eq__: dùng được trong set / làm khóa dict
+        return hash((self.id, self.category_ids))
+
+
+def iter_product_refs(client, params=None, concurrency: int = None, slots=None):
+    """
+    Liệt kê /products ở chế độ lean (song song theo trang, WooClient.iter_pages),
+    sinh ProductRef; mỗi trang JSON được bỏ đi ngay sau khi chuyển đổi.
+    slots: semaphore giới hạn tổng số trang đang tải (xem WooClient.iter_pages).
+    """
+    params = {**(params or {}), '_fields': DELETE_FIELDS}
+    kwargs = {'concurrency': concurrency} if concurrency else {}
+    if slots is not None:
+        kwargs['slots'] = slots
+    for page in client.iter_pages('/products', params, **kwargs):
+        for product in page:
+            if 'id' in product:
+                yield ProductRef.from_json(product)
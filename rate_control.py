@@ -0,0 +1,213 @@
+# rate_control.py
+# Điều khiển song song thích ứng (AIMD) cho request tới store:
+#  - tăng dần số request đồng thời khi latency và tỉ lệ lỗi còn thấp (+1 mỗi "vòng")
+#  - giảm nhân (x0.5) khi gặp 429/5xx, timeout hoặc p95 latency tăng vọt so với baseline của chính
+#    loại request đó (method + endpoint: GET liệt kê nhanh hơn nhiều so với POST batch)
+#  - tôn trọng Retry-After: tạm dừng cấp slot mới trong khoảng thời gian server yêu cầu
+# WooClient / AsyncWooClient gọi acquire() trước mỗi lần gửi và release() sau khi có kết quả.
+
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+
+# Mỗi cửa sổ p95, baseline trôi về phía p95 đo được theo tỉ lệ này: baseline không bị kẹt ở
+# giá trị thấp nhất từng thấy mà theo kịp khi server chậm đi (hoặc nhanh lên) lâu dài
+BASELINE_DRIFT = 0.1
+
+
+def _p95(samples) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class _AIMDPolicy:
+    """
+    Phần tính toán của bộ điều khiển (không khóa, không chờ).
+    Lớp limiter bên ngoài chịu trách nhiệm đồng bộ hóa.
+    """
+    def __init__(self, initial: int, min_limit: int, max_limit: int,
+                 decrease: float, window: int, latency_factor: float, min_interval: float):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.min_interval = min_interval
+        self.window_size = window
+        self.windows = {}           # loại request -> deque latency
+        self.baselines = {}         # loại request -> baseline p95
+        self.in_flight = 0
+        self.pause_until = 0.0
+        self.next_start = 0.0
+        self.last_decrease = 0.0
+        self._successes = 0
+        self.requests = 0
+        self.overloads = 0
+
+    @property
+    def slots(self) -> int:
+        return int(self.limit)
+
+    def wait_time(self, now: float) -> float:
+        """0 nếu được cấp slot ngay, >0 = số giây nên chờ rồi thử lại, None = chờ có slot trống."""
+        if now < self.pause_until:
+            return self.pause_until - now
+        if now < self.next_start:
+            return self.next_start - now
+        if self.in_flight >= self.slots:
+            return None
+        return 0.0
+
+    def on_start(self, now: float):
+        self.in_flight += 1
+        self.next_start = now + self.min_interval
+
+    @property
+    def baseline_p95(self):
+        # Baseline nhỏ nhất trong các loại request (cho snapshot / log)
+        return min(self.baselines.values()) if self.baselines else None
+
+    def on_finish(self, started: float, now: float, overloaded: bool, retry_after: float = None,
+                  key=None):
+        """key: loại request (vd (method, endpoint)); latency chỉ so với baseline của cùng loại."""
+        self.in_flight -= 1
+        self.requests += 1
+        if retry_after:
+            self.pause_until = max(self.pause_until, now + retry_after)
+        if overloaded:
+            self.overloads += 1
+            # Chỉ giảm 1 lần cho cả loạt request đã gửi trước lần giảm gần nhất
+            if started >= self.last_decrease:
+                self._decrease(now, "server quá tải")
+            return
+
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = deque(maxlen=self.window_size)
+        window.append(now - started)
+        if len(window) == window.maxlen:
+            p95 = _p95(window)
+            window.clear()
+            baseline = self.baselines.get(key)
+            if baseline is None or p95 < baseline:
+                self.baselines[key] = p95
+            else:
+                self.baselines[key] = baseline + (p95 - baseline) * BASELINE_DRIFT
+                if p95 > baseline * self.latency_factor:
+                    self._decrease(now, f"p95 {p95:.2f}s > {self.latency_factor}x baseline {baseline:.2f}s"
+                                   + (f" ({' '.join(map(str, key))})" if isinstance(key, tuple) else ''))
+                    return
+
+        # Additive increase: +1 slot sau khoảng `limit` request thành công (~1 vòng RTT)
+        self._successes += 1
+        if self._successes >= self.slots and self.limit < self.max_limit:
+            self._successes = 0
+            self.limit = min(self.max_limit, self.limit + 1)
+
+    def _decrease(self, now: float, reason: str):
+        old = self.slots
+        self.limit = max(self.min_limit, self.limit * self.decrease)
+        self.last_decrease = now
+        self._successes = 0
+        if self.slots != old:
+            logging.info(f"⚙ Giảm số request đồng thời {old} -> {self.slots} ({reason})")
+
+
+class AdaptiveLimiter:
+    """
+    Limiter AIMD cho transport thread (dùng chung giữa các thread).
+
+    Tham số:
+      - initial: số request đồng thời ban đầu
+      - min_limit, max_limit: biên dưới / trên (max_limit thường = max_workers)
+      - decrease: hệ số giảm nhân khi quá tải
+      - window: số mẫu latency để tính p95
+      - latency_factor: p95 vượt baseline bao nhiêu lần thì coi là quá tải
+      - min_interval: khoảng cách tối thiểu (giây) giữa 2 lần bắt đầu request, 0 = không giới hạn
+    """
+    def __init__(self, initial: int = 2, min_limit: int = 1, max_limit: int = 10,
+                 decrease: float = 0.5, window: int = 20, latency_factor: float = 2.0,
+                 min_interval: float = 0.0):
+        self.policy = _AIMDPolicy(initial, min_limit, max_limit, decrease,
+                                  window, latency_factor, min_interval)
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return self.policy.slots
+
+    def acquire(self) -> float:
+        """Chờ tới khi được gửi request; trả về thời điểm bắt đầu để truyền lại cho release()."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = self.policy.wait_time(now)
+                if wait == 0.0:
+                    self.policy.on_start(now)
+                    return now
+                self._cond.wait(wait)
+
+    def release(self, started: float, overloaded: bool = False, retry_after: float = None, key=None):
+        """key: loại request (vd (method, endpoint)) để so latency với baseline của cùng loại."""
+        with self._cond:
+            self.policy.on_finish(started, time.monotonic(), overloaded, retry_after, key)
+            self._cond.notify_all()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            p = self.policy
+            return {'limit': p.slots, 'in_flight': p.in_flight, 'requests': p.requests,
+                    'overloads': p.overloads, 'baseline_p95': p.baseline_p95}
+
+
+class AsyncAdaptiveLimiter(AdaptiveLimiter):
+    """
+    Limiter AIMD cho transport async (chỉ dùng trong 1 event loop, không cần lock).
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wakeup = None
+
+    async def acquire(self) -> float:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        while True:
+            now = time.monotonic()
+            wait = self.policy.wait_time(now)
+            if wait == 0.0:
+                self.policy.on_start(now)
+                return now
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, started: float, overloaded: bool = False, retry_after: float = None, key=None):
+        self.policy.on_finish(started, time.monotonic(), overloaded, retry_after, key)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def snapshot(self) -> dict:
+        p = self.policy
+        return {'limit': p.slots, 'in_flight': p.in_flight, 'requests': p.requests,
+                'overloads': p.overloads, 'baseline_p95': p.baseline_p95}
+
+
+def make_limiter(max_limit: int, adaptive: bool = True, min_interval: float = 0.0,
+                 use_async: bool = False):
+    """
+    Tạo limiter cho 1 lượt chạy:
+      - adaptive=True: AIMD từ max_limit/2, trần max_limit (thường = max_workers)
+      - adaptive=False: song song cố định = max_limit, chỉ áp min_interval (nếu > 0)
+    Trả về None nếu không cần giới hạn gì thêm.
+    """
+    if not adaptive and not min_interval:
+        return None
+    cls = AsyncAdaptiveLimiter if use_async else AdaptiveLimiter
+    max_limit = max(1, max_limit)
+    if adaptive:
+        return cls(initial=max(1, max_limit // 2), max_limit=max_limit, min_interval=min_interval)
+    return cls(initial=max_limit, min_limit=max_limit, max_limit=max_limit, min_interval=min_interval)
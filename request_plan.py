@@ -0,0 +1,155 @@
+# request_plan.py
+# Chế độ dry-run cho hide / delete / feed: lập kế hoạch request trước khi chạy thật.
+# Chỉ dùng các probe rẻ (GET per_page=1 đọc X-WP-Total, trường `count` của category,
+# đếm dòng CSV local) để tính số trang liệt kê, số batch, số API call của lượt chạy thật
+# (không tính chính các probe) và ước tính thời gian theo latency đo được từ các probe -
+# không thay đổi gì trên store.
+
+import math
+import time
+import statistics
+
+from product_records import CATEGORY_FIELDS
+
+# 1 batch ghi (/products/batch, tới 100 item) chậm hơn nhiều so với 1 GET per_page=1:
+# hệ số ước lượng thô khi không truyền latency batch đo thật (write_latency)
+WRITE_LATENCY_FACTOR = 5.0
+# Latency giả định khi chưa đo được probe nào (giây)
+DEFAULT_LATENCY = 0.3
+
+
+class RequestPlan:
+    """
+    Kế hoạch request của 1 thao tác: danh sách bước (tên, loại, số request, số item).
+    Loại bước: 'list' (trang liệt kê GET), 'batch' (POST batch), 'call' (request lẻ khác).
+    """
+    KINDS = ('list', 'batch', 'call')
+
+    def __init__(self, label: str, concurrency: int = 1):
+        self.label = label
+        self.concurrency = max(1, concurrency)
+        self.steps = []
+        self.latencies = []
+
+    def add(self, name: str, kind: str, requests_: int, items: int = 0):
+        if kind not in self.KINDS:
+            raise ValueError(f"Loại bước không hợp lệ: {kind!r}")
+        self.steps.append((name, kind, requests_, items))
+
+    def probe(self, client, path: str, params=None) -> int:
+        """Đếm item bằng WooClient.count (per_page=1 + X-WP-Total), ghi lại latency của probe."""
+        start = time.perf_counter()
+        total = client.count(path, params)
+        self.latencies.append(time.perf_counter() - start)
+        return total
+
+    def total(self, kind: str) -> int:
+        return sum(n for _, k, n, _ in self.steps if k == kind)
+
+    @property
+    def api_calls(self) -> int:
+        return sum(n for _, _, n, _ in self.steps)
+
+    def latency(self) -> float:
+        """Latency đọc đo được (trung vị các probe), mặc định DEFAULT_LATENCY."""
+        return statistics.median(self.latencies) if self.latencies else DEFAULT_LATENCY
+
+    def estimate(self, write_latency: float = None) -> float:
+        """
+        Thời gian ước tính (giây): request chạy thành từng đợt `concurrency` request song song,
+        đọc theo latency probe, batch ghi theo write_latency (mặc định latency x WRITE_LATENCY_FACTOR).
+        """
+        read = self.latency()
+        write = write_latency if write_latency is not None else read * WRITE_LATENCY_FACTOR
+        waves = lambda n: math.ceil(n / self.concurrency)
+        return (waves(self.total('list') + self.total('call')) * read
+                + waves(self.total('batch')) * write)
+
+    def report(self, write_latency: float = None) -> dict:
+        """In kế hoạch và trả về dạng dict."""
+        plan = {
+            'label': self.label,
+            'steps': [{'name': n, 'kind': k, 'requests': r, 'items': i} for n, k, r, i in self.steps],
+            'pages': self.total('list'),
+            'batches': self.total('batch'),
+            'calls': self.total('call'),
+            'api_calls': self.api_calls,
+            'concurrency': self.concurrency,
+            'probe_latency': round(self.latency(), 4),
+            'estimated_seconds': round(self.estimate(write_latency), 1),
+        }
+        print(f"\n📋 Kế hoạch (dry-run) - {self.label}:")
+        for name, kind, requests_, items in self.steps:
+            print(f"   - {name}: {requests_} request {kind}" + (f" ({items} item)" if items else ''))
+        print(f"   => {plan['pages']} trang liệt kê, {plan['batches']} batch, {plan['calls']} request khác: "
+              f"{plan['api_calls']} API call, ước tính ~{plan['estimated_seconds']} giây "
+              f"(latency probe {plan['probe_latency'] * 1000:.0f} ms, song song {self.concurrency})")
+        return plan
+
+
+def _pages(total: int, per_page: int) -> int:
+    return math.ceil(total / per_page) if total else 1
+
+
+def _category_counts(client) -> dict:
+    # Trường `count` của category (1 lượt liệt kê category, chỉ để hiển thị): số sản phẩm đã publish
+    cats = client.list_all('/products/categories', {'_fields': CATEGORY_FIELDS + ',count'})
+    return {c['id']: c for c in cats}
+
+
+def plan_hide(client, category_ids, per_page: int = 100, batch_size: int = 100,
+              concurrency: int = 10) -> RequestPlan:
+    """
+    Kế hoạch ẩn sản phẩm của các category: mỗi category 1 probe X-WP-Total,
+    số trang = total / per_page, số batch tối đa = total / batch_size
+    (sản phẩm đã ẩn hoặc trùng giữa các category sẽ được bỏ qua khi chạy thật).
+    """
+    plan = RequestPlan(f"Ẩn {len(category_ids)} category", concurrency)
+    cats = _category_counts(client)
+    for cid in category_ids:
+        total = plan.probe(client, '/products', {'category': cid})
+        name = cats.get(cid, {}).get('name', cid)
+        plan.add(f"Liệt kê {name} (count {cats.get(cid, {}).get('count', '?')})", 'list',
+                 _pages(total, per_page), total)
+        plan.add(f"Ẩn {name}", 'batch', math.ceil(total / batch_size), total)
+    return plan
+
+
+def plan_delete(client, category_ids, remove_association: bool, batch_size: int = 100,
+                concurrency: int = 10) -> RequestPlan:
+    """
+    Kế hoạch thao tác 1 (remove association) / 2 (xóa hẳn) của run_delete cho các category:
+    liệt kê, batch update + delete (thao tác 1 có thể tách thành 2 loại batch nên +1),
+    kiểm tra category rỗng (thao tác 2) và xóa category.
+    """
+    label = 'Remove association' if remove_association else 'Xóa hẳn products'
+    plan = RequestPlan(f"{label} - {len(category_ids)} category", concurrency)
+    cats = _category_counts(client)
+    for cid in category_ids:
+        total = plan.probe(client, '/products', {'category': cid})
+        name = cats.get(cid, {}).get('name', cid)
+        batches = math.ceil(total / batch_size) + (1 if remove_association and total else 0)
+        plan.add(f"Liệt kê {name} (count {cats.get(cid, {}).get('count', '?')})", 'list',
+                 _pages(total, 100), total)
+        plan.add(f"Batch {'update/delete' if remove_association else 'delete'} {name}", 'batch', batches, total)
+        if not remove_association:
+            plan.add(f"Kiểm tra {name} rỗng", 'call', 1)
+        plan.add(f"Xóa category {name}", 'call', 1)
+    return plan
+
+
+def plan_feed(client, rows: int, batch_size: int, mode: str = 'create',
+              concurrency: int = 3) -> RequestPlan:
+    """
+    Kế hoạch feed `rows` dòng CSV: prefetch category, (upsert) prefetch SKU toàn store,
+    batch gửi sản phẩm (upsert: tối đa - dòng không đổi sẽ không được gửi).
+    Category thiếu được tạo thêm khi chạy thật (không tính trước).
+    """
+    plan = RequestPlan(f"Feed {rows} dòng ({mode})", concurrency)
+    categories = plan.probe(client, '/products/categories')
+    plan.add('Prefetch category', 'list', _pages(categories, 100), categories)
+    if mode == 'upsert':
+        products = plan.probe(client, '/products', {'status': 'any'})
+        plan.add('Prefetch SKU', 'list', _pages(products, 100), products)
+    plan.add('Batch sản phẩm', 'batch', math.ceil(rows / batch_size), rows)
+    return plan
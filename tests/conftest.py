@@ -0,0 +1,34 @@
+# Kiểm thử chạy trên mock WooCommerce local (mock_woo), không cần store thật:
+#   python -m pytest -q
+import os
+import sys
+import logging
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_woo import MockWooServer  # noqa: E402
+
+
+@pytest.fixture
+def woo_server():
+    """Tạo mock server (tham số như MockWooServer), tự dừng khi test kết thúc."""
+    servers = []
+
+    def start(**kwargs):
+        server = MockWooServer(**kwargs).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture(autouse=True)
+def _quiet_logs():
+    # Log từng batch / retry làm output test rất dài
+    logging.disable(logging.WARNING)
+    yield
+    logging.disable(logging.NOTSET)
@@ -0,0 +1,35 @@
+from batch_results import BatchResultTracker
+
+RETRYABLE = {'code': 'db_update_error', 'data': {'status': 500}}
+
+
+def test_delete_ids_tracked_by_value():
+    settled = []
+    tracker = BatchResultTracker(backoff=0, max_backoff=0, on_settled=settled.append)
+    tracker.begin()
+    out = tracker.handle({'delete': [5, 100000]}, {'delete': [{'id': 5}, {'id': 100000, 'error': RETRYABLE}]},
+                         key='b1')
+    assert out == {'ok': 1, 'retry': 1}
+    due = tracker.take_due(10)
+    assert due == [('delete', 100000)]
+    # Body gửi lại có thể chứa object int khác cùng giá trị (vd đọc lại từ journal / file)
+    retry_id = int('100000')
+    tracker.begin()
+    out = tracker.handle({'delete': [retry_id]}, {'delete': [{'id': retry_id}]})
+    assert out == {'ok': 1}
+    assert tracker.counts['recovered'] == 1
+    assert settled == ['b1']
+    assert not tracker.has_pending()
+
+
+def test_retry_exhausted_goes_to_dead_letter(tmp_path):
+    dead = tmp_path / 'dead.jsonl'
+    tracker = BatchResultTracker(str(dead), max_attempts=2, backoff=0, max_backoff=0)
+    body = {'update': [{'id': 7}]}
+    for _ in range(2):
+        tracker.begin()
+        tracker.handle(body, {'update': [{'id': 7, 'error': RETRYABLE}]})
+        body = {'update': [item for _, item in tracker.take_due(10)]} or body
+    tracker.close()
+    assert tracker.counts['dead'] == 1
+    assert '"attempts": 2' in dead.read_text(encoding='utf-8')
@@ -0,0 +1,30 @@
+import json
+
+import delete_product
+import woo_async
+
+
+def test_async_delete_keeps_results_of_other_chunks(tmp_path, woo_server, monkeypatch):
+    srv = woo_server(products=250)
+    post = woo_async.AsyncWooClient.post
+
+    async def failing_post(self, path, json=None, idempotent=None):
+        # Chunk chứa product 120 lỗi hẳn (lỗi không retry được), các chunk khác vẫn thành công
+        if 120 in (json or {}).get('delete', []):
+            raise ValueError('chunk hỏng')
+        return await post(self, path, json=json, idempotent=idempotent)
+    monkeypatch.setattr(woo_async.AsyncWooClient, 'post', failing_post)
+
+    dead_path, journal_path = str(tmp_path / 'dead.jsonl'), str(tmp_path / 'journal.jsonl')
+    result = delete_product.run_delete(srv.url, 'ck', 'cs', 4, transport='async', choice='3',
+                                       product_ids=range(1, 251), dead_letter_path=dead_path,
+                                       journal_path=journal_path, adaptive_batch=False,
+                                       batch_state_path=None)
+
+    # 3 chunk (100/100/50): chunk 101-200 vào dead-letter, 2 chunk còn lại đã xóa
+    assert result['delete_ok'] == 150
+    assert result['dead'] == 100
+    assert sorted(srv.store.products) == list(range(101, 201))
+    with open(dead_path, encoding='utf-8') as f:
+        dead = [json.loads(line) for line in f]
+    assert sorted(d['item'] for d in dead) == list(range(101, 201))
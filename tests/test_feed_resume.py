@@ -0,0 +1,55 @@
+import csv
+import functools
+
+import feed_product
+from batch_results import BatchResultTracker
+from job_journal import JobJournal
+
+
+def _write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Name', 'Categories', 'Images', 'Regular price'])
+        for i in range(rows):
+            writer.writerow([f"Resume {i}", 'Shop > Feed', '', '9.99'])
+
+
+def test_resume_after_run_with_retries(tmp_path, woo_server, monkeypatch, capsys):
+    # Backoff ngắn để item retry tới hạn trong lúc CSV vẫn đang được gửi
+    monkeypatch.setattr(feed_product, 'BatchResultTracker',
+                        functools.partial(BatchResultTracker, backoff=0.01, max_backoff=0.05))
+    srv = woo_server(products=0, latency=0.02, item_error_rate=0.05, seed=7)
+    csv_path, journal_path = str(tmp_path / 'feed.csv'), str(tmp_path / 'journal.jsonl')
+    _write_csv(csv_path, 400)
+    run = functools.partial(feed_product.feed_products, csv_path, srv.url, 'ck', 'cs', batch_size=20,
+                            max_workers=4, journal_path=journal_path, batch_state_path=None)
+
+    first = run()
+    assert first['create_ok'] == 400
+    assert srv.item_errors > 0 and first.get('retried', 0) > 0
+    products = len(srv.store.products)
+    assert products == 400
+
+    before = len(srv.request_log)
+    second = run(resume=True)
+    # Mọi batch CSV (20 item / batch) đã được journal ghi 'done' -> không gửi lại gì
+    assert second['resumed'] == 20
+    assert not any(path.endswith('/products/batch') for _, path in srv.request_log[before:])
+    assert len(srv.store.products) == products
+
+
+def test_batch_with_pending_retries_is_not_done(tmp_path):
+    journal = JobJournal(str(tmp_path / 'j.jsonl'), job={'kind': 'test'})
+    tracker = BatchResultTracker(backoff=0, max_backoff=0,
+                                 on_settled=lambda key: journal.record(key, 'done'))
+    body = {'update': [{'id': 1}, {'id': 2}]}
+    error = {'id': 2, 'error': {'code': 'db_update_error', 'data': {'status': 500}}}
+    tracker.begin()
+    feed_product._finish_batch((0, 'k1', body), {'update': [{'id': 1}, error]}, None, journal, tracker)
+    assert not journal.is_done('k1')
+
+    retry = {'update': [item for _, item in tracker.take_due(10)]}
+    tracker.begin()
+    feed_product._finish_batch((1, None, retry), {'update': [{'id': 2}]}, None, journal, tracker)
+    assert journal.is_done('k1')
+    journal.close()
@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_control import AdaptiveLimiter
+from woo_client import WooClient
+
+
+def _run(policy, latencies, now=1.0):
+    # Mỗi request: (key, latency) bắt đầu tại now, kết thúc sau latency giây
+    for key, latency in latencies:
+        policy.on_start(now)
+        policy.on_finish(now, now + latency, overloaded=False, key=key)
+        now += 0.001
+    return now
+
+
+def test_slow_endpoint_does_not_throttle_healthy_server():
+    # GET nhanh và POST batch chậm hơn hẳn nhưng ổn định: không được giảm limit
+    policy = AdaptiveLimiter(initial=2, max_limit=10).policy
+    mixed = [(('GET', '/products'), 0.01), (('POST', '/products/batch'), 0.5)] * 200
+    _run(policy, mixed)
+    assert policy.last_decrease == 0.0
+    assert policy.limit == 10
+    assert policy.baselines[('GET', '/products')] < policy.baselines[('POST', '/products/batch')]
+
+
+def test_baseline_follows_new_steady_latency():
+    # Latency tăng lên mức ổn định mới: giảm vài lần trong lúc baseline trôi theo,
+    # sau đó không giảm nữa và limit tăng lại tới trần
+    policy = AdaptiveLimiter(initial=10, max_limit=10).policy
+    key = ('POST', '/products/batch')
+    now = _run(policy, [(key, 0.1)] * 40)
+    now = _run(policy, [(key, 0.3)] * 200, now)
+    assert policy.last_decrease > 0.0
+    decreased_at = policy.last_decrease
+    _run(policy, [(key, 0.3)] * 2000, now)
+    assert policy.last_decrease == decreased_at
+    assert policy.limit == 10
+
+
+def test_aimd_on_healthy_mock_server(woo_server):
+    srv = woo_server(products=300, latency=0.005, item_latency=0.001)
+    limiter = AdaptiveLimiter(initial=2, max_limit=8)
+    client = WooClient(srv.url, 'ck', 'cs', pool_size=8, limiter=limiter)
+    try:
+        ids = [p['id'] for p in client.list_all('/products', concurrency=4)]
+        chunks = [ids[i:i + 50] for i in range(0, len(ids), 50)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            for _ in range(4):
+                list(pool.map(lambda chunk: client.post('/products/batch', json={
+                    'update': [{'id': pid, 'catalog_visibility': 'hidden'} for pid in chunk]}), chunks))
+                client.list_all('/products', concurrency=4)
+    finally:
+        client.close()
+    policy = limiter.policy
+    assert policy.overloads == 0
+    assert policy.last_decrease == 0.0
+    assert policy.limit > 2
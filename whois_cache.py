@@ -0,0 +1,120 @@
+# whois_cache.py
+# Cache kết quả WHOIS trên đĩa (SQLite) cho domain_check:
+# ngày tạo domain gần như không đổi nên danh sách auction / buy-now chồng lấn giữa các ngày
+# không cần tra lại. Lookup lỗi / không có ngày tạo được cache ngắn hơn (negative TTL).
+
+import time
+import sqlite3
+import threading
+from datetime import datetime
+
+DAY = 86400
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS whois_cache (
+    domain      TEXT PRIMARY KEY,
+    created     TEXT,
+    looked_up   REAL NOT NULL,
+    failed      INTEGER NOT NULL DEFAULT 0,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_whois_cache_access ON whois_cache (last_access);
+'''
+
+
+class WhoisCache:
+    """
+    Cache WHOIS theo domain: ngày tạo, thời điểm tra và trạng thái lỗi.
+
+    Tham số:
+      - path: file SQLite (':memory:' = chỉ trong lượt chạy)
+      - ttl: thời hạn (giây) của kết quả có ngày tạo, mặc định 30 ngày
+      - negative_ttl: thời hạn của lookup lỗi / không có ngày tạo, mặc định 1 ngày
+      - max_entries: số domain tối đa, vượt quá thì xóa các domain lâu không dùng nhất
+    """
+    def __init__(self, path: str, ttl: float = 30 * DAY, negative_ttl: float = DAY,
+                 max_entries: int = 200_000):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, domain: str):
+        """
+        Tra cache: trả về (True, created) nếu còn hạn (created = datetime hoặc None
+        với kết quả âm), (False, None) nếu chưa có / đã hết hạn.
+        """
+        domain = domain.lower()
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT created, looked_up, failed FROM whois_cache WHERE domain = ?',
+                                   (domain,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return False, None
+            created, looked_up, failed = row
+            ttl = self.ttl if created and not failed else self.negative_ttl
+            if now - looked_up > ttl:
+                self.expired += 1
+                self.misses += 1
+                return False, None
+            self._db.execute('UPDATE whois_cache SET last_access = ? WHERE domain = ?', (now, domain))
+            if created:
+                self.hits += 1
+                return True, datetime.fromisoformat(created)
+            self.negative_hits += 1
+            return True, None
+
+    def put(self, domain: str, created, failed: bool = False):
+        """Ghi kết quả 1 lookup: created = datetime hoặc None; failed = lookup lỗi (mạng, timeout...)."""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO whois_cache (domain, created, looked_up, failed, last_access) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (domain.lower(), created.isoformat() if created else None, now, int(failed), now))
+
+    def evict(self) -> int:
+        """Xóa các domain lâu không dùng nhất cho tới khi còn max_entries, trả về số đã xóa."""
+        with self._lock, self._db:
+            count = self._db.execute('SELECT COUNT(*) FROM whois_cache').fetchone()[0]
+            extra = count - self.max_entries
+            if extra <= 0:
+                return 0
+            self._db.execute('DELETE FROM whois_cache WHERE domain IN '
+                             '(SELECT domain FROM whois_cache ORDER BY last_access LIMIT ?)', (extra,))
+            self.evicted += extra
+            return extra
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            'lookups': lookups,
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'hit_rate': round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    def report(self) -> dict:
+        s = self.stats()
+        print(f"📇 WHOIS cache: {s['hits']} hit, {s['negative_hits']} hit âm, {s['misses']} miss "
+              f"({s['expired']} hết hạn) - tỉ lệ hit {s['hit_rate']:.1%}")
+        return s
+
+    def close(self):
+        self.evict()
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,325 @@
+# whois_scheduler.py
+# Bộ lập lịch tra WHOIS theo từng registry cho domain_check:
+#  - mỗi WHOIS server (theo TLD) có hàng đợi, số kết nối đồng thời và tốc độ riêng
+#    (rate_control.AdaptiveLimiter: min_interval = 1 / rate, giảm song song khi bị chặn)
+#  - khi registry trả thông báo giới hạn / cắt kết nối: tạm dừng server đó có backoff
+#    rồi thử lại, các registry khác vẫn chạy bình thường
+#  - tổng số kết nối đang mở của mọi registry bị chặn bởi max_in_flight
+# Tra qua socket port 43 trực tiếp nên trỏ được vào stub server local (whois_stub.py).
+#
+# Tách I/O và CPU: thread chỉ tra mạng; văn bản WHOIS được đọc bằng fast-path regex
+# 'Creation Date' (đa số registry), chỉ phản hồi lạ mới parse đầy đủ bằng python-whois
+# trong process pool (không tranh GIL với các thread I/O).
+
+import os
+import re
+import queue
+import random
+import socket
+import logging
+import threading
+from datetime import datetime, timezone
+from collections import namedtuple, Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from rate_control import AdaptiveLimiter
+
+WHOIS_PORT = 43
+
+# Giới hạn của 1 registry: số kết nối đồng thời và số lookup / giây
+RegistryLimit = namedtuple('RegistryLimit', ['concurrency', 'rate'])
+
+# WHOIS server theo TLD (registry "thin": ngày tạo có ngay trong phản hồi registry)
+WHOIS_SERVERS = {
+    'com': 'whois.verisign-grs.com',
+    'net': 'whois.verisign-grs.com',
+    'org': 'whois.pir.org',
+    'info': 'whois.nic.info',
+    'io': 'whois.nic.io',
+    'co': 'whois.nic.co',
+}
+DEFAULT_WHOIS_SERVER = 'whois.iana.org'
+
+# Giới hạn thận trọng theo server; server không có trong bảng dùng DEFAULT_LIMIT
+REGISTRY_LIMITS = {
+    'whois.verisign-grs.com': RegistryLimit(concurrency=8, rate=8.0),
+    'whois.pir.org': RegistryLimit(concurrency=2, rate=1.0),
+}
+DEFAULT_LIMIT = RegistryLimit(concurrency=2, rate=1.0)
+
+# Dấu hiệu registry đang giới hạn tốc độ (so khớp chữ thường)
+THROTTLE_MARKERS = ('limit exceeded', 'exceeded the query limit', 'rate limit', 'too many requests',
+                    'quota exceeded', 'try again later', 'excessive querying')
+
+
+def fetch_whois(domain: str, host: str, port: int = WHOIS_PORT, timeout: float = 10.0) -> str:
+    """Gửi 1 truy vấn WHOIS qua TCP, trả về toàn bộ văn bản phản hồi."""
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall(f"{domain}\r\n".encode('idna'))
+        chunks = []
+        while True:
+            data = sock.recv(4096)
+            if not data:
+                break
+            chunks.append(data)
+    return b''.join(chunks).decode('utf-8', 'replace')
+
+
+def is_throttled(text: str) -> bool:
+    if not text.strip():
+        return True
+    lowered = text.lower()
+    return any(marker in lowered for marker in THROTTLE_MARKERS)
+
+
+# Dòng ngày tạo của các registry phổ biến (Verisign, PIR, Afilias, CentralNic...)
+_CREATION_RE = re.compile(r'^\s*(?:Creation Date|Created On|Registration Time|Registered on|created):[ \t]*(\S[^\r\n]*?)\s*$',
+                          re.IGNORECASE | re.MULTILINE)
+_NOT_FOUND_RE = re.compile(r'^\s*(?:No match for|NOT FOUND|Domain not found|No Data Found)', re.IGNORECASE | re.MULTILINE)
+_DATE_FORMATS = ('%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%dT%H:%M:%S%z',
+                 '%Y-%m-%dT%H:%M:%S.%f%z', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d')
+
+
+def fast_creation_date(text: str):
+    """
+    Fast-path: tìm dòng 'Creation Date' bằng 1 regex, không parse toàn bộ văn bản.
+    Trả về (True, created) nếu đọc được (created = None khi domain chưa đăng ký),
+    (False, None) nếu định dạng lạ -> cần parse đầy đủ.
+    """
+    m = _CREATION_RE.search(text)
+    if m is None:
+        return (True, None) if _NOT_FOUND_RE.search(text) else (False, None)
+    value = m.group(1)
+    for fmt in _DATE_FORMATS:
+        try:
+            created = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt.endswith('Z'):
+            created = created.replace(tzinfo=timezone.utc)
+        return True, created
+    return False, None
+
+
+def parse_creation_date(domain: str, text: str):
+    """
+    Đọc ngày tạo từ văn bản WHOIS (python-whois), trả về (created hoặc None, failed).
+    Domain chưa đăng ký -> (None, False): kết quả chắc chắn, không phải lỗi.
+    Chạy được trong process pool (hàm cấp module, tham số / kết quả pickle được).
+    """
+    # Import lúc cần để import module (và job ngắn không tra WHOIS) khởi động nhanh
+    from whois.parser import WhoisEntry
+    from whois.exceptions import WhoisDomainNotFoundError
+    try:
+        created = WhoisEntry.load(domain, text).creation_date
+    except WhoisDomainNotFoundError:
+        return None, False
+    except Exception:
+        return None, True
+    if isinstance(created, list):
+        created = created[0] if created else None
+    return (created if hasattr(created, 'year') else None), False
+
+
+class ThrottledError(Exception):
+    pass
+
+
+class _RegistryLane:
+    """Hàng đợi + limiter + worker của 1 WHOIS server."""
+    def __init__(self, host: str, port: int, limit: RegistryLimit):
+        self.host = host
+        self.port = port
+        self.limit = limit
+        self.limiter = AdaptiveLimiter(initial=limit.concurrency, max_limit=limit.concurrency,
+                                       min_interval=1.0 / limit.rate if limit.rate else 0.0)
+        self.queue = queue.Queue()
+        self.threads = []
+
+
+class WhoisScheduler:
+    """
+    Tra ngày tạo của nhiều domain song song, giới hạn riêng theo từng WHOIS server.
+
+    Tham số:
+      - max_in_flight: tổng số kết nối WHOIS đang mở tối đa (mọi registry)
+      - servers: ghi đè TLD -> host hoặc (host, port), vd {'com': ('127.0.0.1', 4343)}
+      - limits: ghi đè host -> RegistryLimit; default_limit cho server không có trong bảng
+      - max_retries: số lần thử lại khi bị giới hạn / lỗi kết nối
+      - backoff, max_backoff: thời gian tạm dừng registry (giây, mũ + jitter) sau mỗi lần bị chặn
+      - timeout: timeout socket (giây)
+      - parse_workers: số process parse đầy đủ cho phản hồi không qua được fast-path
+        (None = số CPU, 0 = parse ngay trong thread I/O); pool chỉ được tạo khi cần
+      - fetch, parse: hàm tra / parse đầy đủ (thay được khi thử nghiệm;
+        parse phải là hàm cấp module nếu parse_workers > 0)
+    """
+    def __init__(self, max_in_flight: int = 32, servers: dict = None, limits: dict = None,
+                 default_limit: RegistryLimit = DEFAULT_LIMIT, max_retries: int = 4,
+                 backoff: float = 2.0, max_backoff: float = 60.0, timeout: float = 10.0,
+                 parse_workers: int = None, fetch=fetch_whois, parse=parse_creation_date):
+        self.servers = {**WHOIS_SERVERS, **(servers or {})}
+        self.limits = {**REGISTRY_LIMITS, **(limits or {})}
+        self.default_limit = default_limit
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.fetch = fetch
+        self.parse = parse
+        self.parse_workers = (os.cpu_count() or 1) if parse_workers is None else parse_workers
+        self._pool = None
+        self.max_in_flight = max_in_flight
+        self._global = threading.BoundedSemaphore(max_in_flight)
+        self._window = None
+        self._stopped = threading.Event()
+        self._lanes = {}
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def server_for(self, domain: str) -> tuple:
+        server = self.servers.get(domain.rsplit('.', 1)[-1].lower(), DEFAULT_WHOIS_SERVER)
+        return server if isinstance(server, tuple) else (server, WHOIS_PORT)
+
+    def _lane(self, server: tuple, results: queue.Queue) -> _RegistryLane:
+        lane = self._lanes.get(server)
+        if lane is None:
+            limit = self.limits.get(server[0], self.default_limit)
+            lane = self._lanes[server] = _RegistryLane(server[0], server[1], limit)
+            for _ in range(limit.concurrency):
+                t = threading.Thread(target=self._worker, args=(lane, results), daemon=True)
+                t.start()
+                lane.threads.append(t)
+        return lane
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _fetch_text(self, lane: _RegistryLane, domain: str) -> str:
+        """Tra 1 domain, thử lại khi registry giới hạn; raise nếu hết lượt."""
+        for attempt in range(self.max_retries + 1):
+            started = lane.limiter.acquire()
+            try:
+                with self._global:
+                    text = self.fetch(domain, lane.host, lane.port, self.timeout)
+                if is_throttled(text):
+                    raise ThrottledError(text.strip()[:80] or 'phản hồi rỗng')
+            except (OSError, ThrottledError) as e:
+                # Registry thường từ chối / reset kết nối khi bị truy vấn quá nhanh
+                delay = random.uniform(self.backoff, min(self.max_backoff, self.backoff * 2 ** (attempt + 1)))
+                lane.limiter.release(started, overloaded=True, retry_after=delay)
+                self._count('throttled')
+                if attempt >= self.max_retries:
+                    raise
+                logging.debug(f"WHOIS {lane.host}: {domain} {e.__class__.__name__}, tạm dừng {delay:.1f}s")
+                continue
+            lane.limiter.release(started)
+            self._count('requests')
+            return text
+
+    def _finish(self, results: queue.Queue, domain: str, created, failed: bool):
+        self._count('failed' if failed else 'ok')
+        results.put((domain, created, failed))
+        if self._window is not None:
+            self._window.release()
+
+    def stop(self):
+        """
+        Ngừng lập lịch: domain chưa đưa đi / còn trong hàng đợi bị bỏ qua (không có kết quả),
+        lookup đang chạy vẫn hoàn tất. Dùng cho chế độ top-K khi đã đủ kết quả.
+        """
+        self._stopped.set()
+
+    def _parse_full(self, results: queue.Queue, domain: str, text: str):
+        # Parse đầy đủ: trong process pool nếu có, thread I/O không phải chờ
+        self._count('full_parse')
+        if not self.parse_workers:
+            return self._finish(results, domain, *self.parse(domain, text))
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.parse_workers)
+            fut = self._pool.submit(self.parse, domain, text)
+
+        def done(f):
+            try:
+                created, failed = f.result()
+            except Exception as e:
+                logging.warning(f"✖ WHOIS {domain} lỗi parse: {e}")
+                created, failed = None, True
+            self._finish(results, domain, created, failed)
+        fut.add_done_callback(done)
+
+    def _worker(self, lane: _RegistryLane, results: queue.Queue):
+        while True:
+            domain = lane.queue.get()
+            if domain is None:
+                return
+            if self._stopped.is_set():
+                self._count('skipped')
+                if self._window is not None:
+                    self._window.release()
+                continue
+            try:
+                text = self._fetch_text(lane, domain)
+            except Exception as e:
+                logging.warning(f"✖ WHOIS {domain} lỗi: {e}")
+                self._finish(results, domain, None, True)
+                continue
+            ok, created = fast_creation_date(text)
+            if ok:
+                self._count('fast_parse')
+                self._finish(results, domain, created, False)
+            else:
+                self._parse_full(results, domain, text)
+
+    def lookup_all(self, domains, window: int = None):
+        """
+        Tra ngày tạo cho mọi domain, trả về generator (domain, created, failed) theo thứ tự hoàn thành.
+        `domains` được đọc dần (lazy) theo thứ tự; window = số domain tối đa đã đưa đi mà
+        chưa có kết quả (None = không giới hạn), giúp dừng sớm bằng stop() mà không
+        phải xếp hàng trước toàn bộ danh sách.
+        """
+        results = queue.Queue()
+        done = object()
+        self._stopped.clear()
+        self._window = threading.BoundedSemaphore(window) if window else None
+
+        def feed():
+            try:
+                for domain in domains:
+                    if self._window is not None:
+                        while not self._window.acquire(timeout=0.1):
+                            if self._stopped.is_set():
+                                break
+                    if self._stopped.is_set():
+                        break
+                    self._lane(self.server_for(domain), results).queue.put(domain)
+            finally:
+                lanes = list(self._lanes.values())
+                for lane in lanes:
+                    for _ in lane.threads:
+                        lane.queue.put(None)
+                for lane in lanes:
+                    for t in lane.threads:
+                        t.join()
+                self._lanes.clear()
+                # Chờ các phản hồi còn đang parse trong process pool
+                with self._lock:
+                    pool, self._pool = self._pool, None
+                if pool is not None:
+                    pool.shutdown(wait=True)
+                results.put(done)
+
+        threading.Thread(target=feed, daemon=True).start()
+        while True:
+            item = results.get()
+            if item is done:
+                return
+            yield item
+
+    def report(self) -> dict:
+        s = dict(self.stats)
+        print(f"🌐 WHOIS: {s.get('ok', 0)} ok, {s.get('failed', 0)} lỗi, "
+              f"{s.get('requests', 0)} request, {s.get('throttled', 0)} lần bị registry giới hạn, "
+              f"parse nhanh {s.get('fast_parse', 0)} / đầy đủ {s.get('full_parse', 0)}")
+        return s
@@ -0,0 +1,137 @@
+# whois_stub.py
+# Stub WHOIS server (giao thức port 43) chạy local, trong cùng process, để thử
+# whois_scheduler mà không gửi request tới registry thật (và không bị chặn).
+# Trả lời giống định dạng Verisign (.com/.net), có thể giả lập latency và giới hạn tốc độ.
+#
+# Ví dụ:
+#     with StubWhoisServer(max_per_second=20) as srv:
+#         sched = WhoisScheduler(servers={'com': srv.address})
+
+import time
+import zlib
+import threading
+import socketserver
+from collections import deque
+from datetime import datetime, timedelta
+
+THROTTLE_MESSAGE = 'WHOIS LIMIT EXCEEDED - SEE WWW.VERISIGN.COM FOR MORE INFORMATION\r\n'
+
+
+def stub_creation_date(domain: str) -> datetime:
+    """Ngày tạo giả lập, cố định theo tên domain (1995 -> ~2024)."""
+    seed = zlib.crc32(domain.lower().encode('utf-8'))
+    return datetime(1995, 1, 1) + timedelta(days=seed % (30 * 365))
+
+
+def stub_response(domain: str, created) -> str:
+    if created is None:
+        return f'No match for "{domain.upper()}".\r\n>>> Last update of whois database: 2024-01-01T00:00:00Z <<<\r\n'
+    return (f"   Domain Name: {domain.upper()}\r\n"
+            f"   Registry Domain ID: {zlib.crc32(domain.encode())}_DOMAIN_COM-VRSN\r\n"
+            f"   Registrar WHOIS Server: whois.example-registrar.com\r\n"
+            f"   Updated Date: 2024-01-01T00:00:00Z\r\n"
+            f"   Creation Date: {created:%Y-%m-%dT%H:%M:%SZ}\r\n"
+            f"   Registry Expiry Date: 2030-01-01T00:00:00Z\r\n"
+            f"   Registrar: Example Registrar, Inc.\r\n"
+            f">>> Last update of whois database: 2024-01-01T00:00:00Z <<<\r\n")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        query = self.rfile.readline().decode('utf-8', 'replace').strip()
+        domain = query.split()[-1].lstrip('=') if query else ''
+        server = self.server
+        if not server.admit():
+            server.record(domain, throttled=True)
+            self.wfile.write(THROTTLE_MESSAGE.encode())
+            return
+        server.record(domain)
+        if server.latency:
+            time.sleep(server.latency)
+        created = server.records.get(domain.lower(), stub_creation_date(domain))
+        self.wfile.write(stub_response(domain, created).encode())
+
+
+class StubWhoisServer(socketserver.ThreadingTCPServer):
+    """
+    Stub WHOIS server chạy trên thread nền, dùng trong `with`.
+
+    Tham số:
+      - latency: độ trễ giả lập (giây) mỗi lookup
+      - max_per_second: số lookup tối đa mỗi giây (cửa sổ trượt 1s), vượt quá trả
+        thông báo WHOIS LIMIT EXCEEDED như registry thật; None = không giới hạn
+      - records: dict domain -> datetime hoặc None (None = 'No match'), mặc định sinh ngẫu nhiên cố định
+      - port: 0 = chọn cổng trống
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 max_per_second: float = None, records: dict = None):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.max_per_second = max_per_second
+        self.records = {k.lower(): v for k, v in (records or {}).items()}
+        self.lookups = 0
+        self.throttled = 0
+        self.query_log = []
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def address(self) -> tuple:
+        return self.server_address[:2]
+
+    def admit(self) -> bool:
+        if not self.max_per_second:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] >= 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.max_per_second:
+                return False
+            self._recent.append(now)
+            return True
+
+    def record(self, domain: str, throttled: bool = False):
+        with self._lock:
+            self.query_log.append(domain)
+            if throttled:
+                self.throttled += 1
+            else:
+                self.lookups += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Chạy stub WHOIS server local')
+    parser.add_argument('--port', type=int, default=4343)
+    parser.add_argument('--latency', type=float, default=0.0, help='Độ trễ giả lập mỗi lookup (giây)')
+    parser.add_argument('--rate', type=float, default=None, help='Số lookup tối đa mỗi giây')
+    args = parser.parse_args()
+
+    server = StubWhoisServer(port=args.port, latency=args.latency, max_per_second=args.rate)
+    print(f"Stub WHOIS đang chạy tại {server.address[0]}:{server.address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
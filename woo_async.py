@@ -0,0 +1,267 @@
+# woo_async.py
+# Chế độ transport asyncio (aiohttp) cho các thao tác fan-out lớn với store:
+# liệt kê sản phẩm, batch update / delete / create.
+# Giới hạn số request đang bay bằng asyncio.Semaphore thay vì số thread.
+# Chính sách retry giống WooClient (woo_client.py) để 2 transport cho kết quả như nhau.
+
+import time
+import asyncio
+import random
+import json as jsonlib
+import logging
+from collections import namedtuple, deque
+
+from woo_client import (RETRY_STATUSES, UNSAFE_RETRY_STATUSES, IDEMPOTENT_METHODS, LIST_CONCURRENCY,
+                        parse_retry_after, total_pages_of)
+from woo_metrics import CURRENT, resolve_metrics, note_attempt, endpoint_of
+from delete_product import chunked
+from batch_sizer import send_splitting_async, failed_result
+
+# Các giá trị hợp lệ cho tham số `transport` ở hide / delete / feed
+TRANSPORTS = ('thread', 'async')
+
+AsyncResponse = namedtuple('AsyncResponse', ['status', 'headers', 'data'])
+
+
+def _require_aiohttp():
+    # aiohttp chỉ cần khi chọn transport='async'
+    try:
+        import aiohttp
+    except ImportError as e:
+        raise ImportError("transport='async' cần thư viện aiohttp (pip install aiohttp)") from e
+    return aiohttp
+
+
+def check_transport(transport: str):
+    if transport not in TRANSPORTS:
+        raise ValueError(f"transport không hợp lệ: {transport!r} (chỉ {', '.join(TRANSPORTS)})")
+
+
+class AsyncWooClient:
+    """
+    Client WooCommerce REST API (wc/v3) bất đồng bộ, dùng trong `async with`.
+
+    Tham số giống WooClient, thêm:
+      - max_in_flight: số request đồng thời tối đa (Semaphore + giới hạn connector)
+      - limiter: rate_control.AsyncAdaptiveLimiter (AIMD) bên dưới trần max_in_flight
+      - metrics: woo_metrics.RequestMetrics (mặc định: metrics của metrics_session hiện tại, ngoài session là REGISTRY; None = tắt)
+    """
+    def __init__(self, base_url: str, consumer_key: str, consumer_secret: str,
+                 max_in_flight: int = 50, timeout=(10, 60), max_retries: int = 3,
+                 backoff: float = 0.5, max_backoff: float = 30.0,
+                 query_string_auth: bool = False, limiter=None, metrics=CURRENT):
+        self.base = base_url.rstrip('/')
+        self.api_base = f"{self.base}/wp-json/wc/v3"
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._query_string_auth = query_string_auth
+        self.limiter = limiter
+        self.metrics = resolve_metrics(metrics)
+        self._keys = (consumer_key, consumer_secret)
+        self._session = None
+        self._slots = None
+
+    async def __aenter__(self):
+        aiohttp = _require_aiohttp()
+        connect, read = self.timeout
+        ck, cs = self._keys
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_in_flight, keepalive_timeout=30),
+            timeout=aiohttp.ClientTimeout(sock_connect=connect, sock_read=read),
+            auth=None if self._query_string_auth else aiohttp.BasicAuth(ck, cs),
+            headers={'Accept': 'application/json'},
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    def _sleep_for(self, attempt: int, headers=None) -> float:
+        # Full jitter, không ít hơn Retry-After (giống WooClient._sleep_for)
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+        if headers is not None:
+            retry_after = parse_retry_after(headers.get('Retry-After'))
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+    async def _send(self, method, url, params, json) -> AsyncResponse:
+        # 1 lần gửi thực sự; body được đọc hết để trả kết nối về pool ngay
+        started = await self.limiter.acquire() if self.limiter else None
+        overloaded, retry_after = False, None
+        # Tự serialize body để biết số byte gửi đi (metrics)
+        payload = jsonlib.dumps(json).encode('utf-8') if json is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else None
+        path = url[len(self.api_base):]
+        measured = self.metrics.start() if self.metrics is not None else None
+        begin = time.perf_counter()
+        try:
+            async with self._session.request(method, url, params=params, data=payload, headers=headers) as resp:
+                body = await resp.read()
+                note_attempt(time.perf_counter() - begin)
+                if measured is not None:
+                    self.metrics.finish(measured, method, path, resp.status, len(payload or b''), len(body))
+                    measured = None
+                try:
+                    data = jsonlib.loads(body) if body else None
+                except ValueError:
+                    data = None                      # trang lỗi HTML của proxy/CDN
+                overloaded = resp.status == 429 or resp.status >= 500
+                retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+                return AsyncResponse(resp.status, resp.headers, data)
+        except BaseException as e:
+            note_attempt(time.perf_counter() - begin)
+            overloaded = isinstance(e, asyncio.TimeoutError)
+            if measured is not None:
+                self.metrics.fail(measured, method, path, e, len(payload or b''))
+            raise
+        finally:
+            if self.limiter:
+                self.limiter.release(started, overloaded, retry_after, key=(method, endpoint_of(path)))
+
+    async def request(self, method: str, path: str, params=None, json=None,
+                      idempotent: bool = None, raise_for_status: bool = False) -> AsyncResponse:
+        """
+        Gửi request tới /wp-json/wc/v3{path}, tự thử lại lỗi tạm thời.
+        Trả về AsyncResponse(status, headers, data) với data là body JSON đã parse.
+        """
+        aiohttp = _require_aiohttp()
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        retry_statuses = RETRY_STATUSES if idempotent else UNSAFE_RETRY_STATUSES
+        p = {k: str(v) for k, v in (params or {}).items()}
+        if self._query_string_auth:
+            p['consumer_key'], p['consumer_secret'] = self._keys
+        url = f"{self.api_base}{path}"
+
+        attempt = 0
+        while True:
+            try:
+                async with self._slots:
+                    resp = await self._send(method, url, p, json)
+                if resp.status not in retry_statuses or attempt >= self.max_retries:
+                    if raise_for_status and resp.status >= 400:
+                        # request_info phải có URL: str() của lỗi đọc request_info.real_url
+                        from yarl import URL
+                        raise aiohttp.ClientResponseError(
+                            aiohttp.RequestInfo(URL(url), method, {}), (), status=resp.status,
+                            headers=resp.headers, message=f"{method} {path} -> HTTP {resp.status}")
+                    return resp
+                delay = self._sleep_for(attempt, resp.headers)
+                logging.warning(f"{method} {path}: HTTP {resp.status}, thử lại sau {delay:.2f}s")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                # Không gửi lại POST không idempotent nếu có thể server đã xử lý: chỉ lỗi ở bước
+                # kết nối (ClientConnectorError: DNS, connection refused...) là chắc chắn chưa gửi
+                if attempt >= self.max_retries or (not idempotent
+                                                   and not isinstance(e, aiohttp.ClientConnectorError)):
+                    raise
+                delay = self._sleep_for(attempt)
+                logging.warning(f"{method} {path}: {e.__class__.__name__}, thử lại sau {delay:.2f}s")
+            if self.metrics is not None:
+                self.metrics.retry(method, path)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def get(self, path: str, params=None):
+        return (await self.request('GET', path, params=params, raise_for_status=True)).data
+
+    async def post(self, path: str, json=None, idempotent: bool = None):
+        return (await self.request('POST', path, json=json, idempotent=idempotent,
+                                   raise_for_status=True)).data
+
+    async def iter_pages(self, path: str, params=None, per_page: int = 100,
+                         concurrency: int = LIST_CONCURRENCY):
+        """
+        Async generator các trang theo thứ tự, trang 2..X-WP-TotalPages tải song song
+        (tối đa `concurrency` trang đang tải) - giống WooClient.iter_pages().
+        """
+        base = {**(params or {}), 'per_page': per_page}
+        fetch = lambda page: self.get(path, {**base, 'page': page})
+        resp = await self.request('GET', path, params={**base, 'page': 1}, raise_for_status=True)
+        if not resp.data:
+            return
+        yield resp.data
+        total_pages = total_pages_of(resp.headers)
+        if total_pages is None:
+            page = 2
+            while True:
+                items = await fetch(page)
+                if not items:
+                    return
+                yield items
+                page += 1
+
+        pending = deque()
+        next_page = 2
+        try:
+            while pending or next_page <= total_pages:
+                while next_page <= total_pages and len(pending) < max(1, concurrency):
+                    pending.append(asyncio.ensure_future(fetch(next_page)))
+                    next_page += 1
+                items = await pending.popleft()
+                if items:
+                    yield items
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def list_all(self, path: str, params=None, per_page: int = 100,
+                       concurrency: int = LIST_CONCURRENCY) -> list:
+        """
+        Liệt kê toàn bộ item của 1 endpoint có phân trang (vd '/products').
+        """
+        return [item async for items in self.iter_pages(path, params, per_page, concurrency)
+                for item in items]
+
+    async def _batch(self, action: str, items: list, batch_size: int, path: str,
+                     extra: dict = None, idempotent: bool = True, sizer=None) -> list:
+        # Gửi song song các chunk, số request thực sự đang bay do Semaphore giới hạn.
+        # sizer (batch_sizer.AdaptiveBatchSizer): báo latency từng chunk, chunk quá lớn được chia đôi
+        # Chunk lỗi hẳn (đã hết retry) không làm mất kết quả các chunk khác: phản hồi của nó là
+        # failed_result (mỗi item mang lỗi riêng) để BatchResultTracker retry / đưa vào dead-letter
+        post = lambda body: self.post(path, json=body, idempotent=idempotent)
+
+        async def send(chunk):
+            body = {action: chunk, **(extra or {})}
+            try:
+                if sizer is None:
+                    return await post(body)
+                return await send_splitting_async(post, body, sizer)
+            except Exception as e:
+                logging.warning(f"✖ Batch {action} {len(chunk)} item lỗi: {e}")
+                return failed_result(body, e)
+        return await asyncio.gather(*(send(chunk) for chunk in chunked(items, batch_size)))
+
+    async def batch_update(self, payload: list[dict], batch_size: int = 100,
+                           path: str = '/products/batch', sizer=None) -> list:
+        """Batch 'update', trả về list phản hồi theo thứ tự chunk."""
+        return await self._batch('update', payload, batch_size, path, sizer=sizer)
+
+    async def batch_delete(self, ids: list[int], batch_size: int = 100,
+                           path: str = '/products/batch', sizer=None) -> list:
+        """Batch 'delete' (force=True), trả về list phản hồi theo thứ tự chunk."""
+        return await self._batch('delete', ids, batch_size, path, extra={'force': True}, sizer=sizer)
+
+    async def batch_create(self, payload: list[dict], batch_size: int = 100,
+                           path: str = '/products/batch', sizer=None) -> list:
+        """Batch 'create' (không tự gửi lại khi timeout), trả về list phản hồi theo thứ tự chunk."""
+        return await self._batch('create', payload, batch_size, path, idempotent=False, sizer=sizer)
+
+
+def run_client(base_url: str, consumer_key: str, consumer_secret: str, operation,
+               max_in_flight: int = 50, **client_kwargs):
+    """
+    Chạy 1 thao tác async từ code đồng bộ:
+        run_client(url, ck, cs, lambda c: c.batch_delete(ids), max_in_flight=20)
+    `operation` nhận AsyncWooClient và trả về coroutine.
+    """
+    async def main():
+        async with AsyncWooClient(base_url, consumer_key, consumer_secret,
+                                  max_in_flight=max_in_flight, **client_kwargs) as client:
+            return await operation(client)
+    return asyncio.run(main())
@@ -0,0 +1,311 @@
+# woo_client.py
+# Client WooCommerce REST API dùng chung cho hide / delete / feed:
+# 1 requests.Session keep-alive, connection pool điều chỉnh được,
+# timeout (connect, read) và retry có jitter cho 429/5xx (tôn trọng Retry-After).
+
+import time
+import random
+import logging
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from requests.auth import HTTPBasicAuth
+
+from woo_metrics import CURRENT, resolve_metrics, note_attempt, endpoint_of
+
+# Mã HTTP được coi là lỗi tạm thời, có thể thử lại
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Với request không idempotent (POST tạo mới), chỉ thử lại khi server chắc chắn từ chối xử lý
+UNSAFE_RETRY_STATUSES = frozenset({429, 503})
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'})
+# Số trang tải song song mặc định khi liệt kê (iter_pages)
+LIST_CONCURRENCY = 4
+
+
+def total_pages_of(headers):
+    """
+    Đọc X-WP-TotalPages từ header phản hồi trang đầu, None nếu server không gửi.
+    """
+    value = headers.get('X-WP-TotalPages')
+    return int(value) if value and value.strip().isdigit() else None
+
+
+def total_of(headers):
+    """
+    Đọc X-WP-Total (tổng số item khớp bộ lọc) từ header phản hồi, None nếu server không gửi.
+    """
+    value = headers.get('X-WP-Total')
+    return int(value) if value and value.strip().isdigit() else None
+
+
+def is_connect_error(error) -> bool:
+    """
+    True nếu lỗi xảy ra khi đang kết nối (ConnectTimeout, NewConnectionError như DNS / connection
+    refused): request chắc chắn chưa tới server nên gửi lại an toàn kể cả với POST tạo mới.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (requests.ConnectTimeout, NewConnectionError)):
+            return True
+        # requests.ConnectionError bọc urllib3 MaxRetryError (args[0]), lỗi gốc nằm ở .reason
+        reason = getattr(error, 'reason', None)
+        if reason is None and error.args and isinstance(error.args[0], BaseException):
+            reason = error.args[0]
+        error = reason or error.__cause__
+    return False
+
+
+def parse_retry_after(value):
+    """
+    Đọc header Retry-After (số giây hoặc HTTP-date), trả về số giây chờ hoặc None.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class WooClient:
+    """
+    Client WooCommerce REST API (wc/v3) với connection pool và retry.
+
+    Tham số:
+      - base_url: URL gốc của store, vd 'https://your-shop.com'
+      - consumer_key, consumer_secret: key REST API
+      - pool_size: số kết nối keep-alive tối đa giữ trong pool (nên >= số request đồng thời, kể cả
+        các trang tải song song của iter_pages; không nhỏ hơn LIST_CONCURRENCY)
+      - timeout: (connect, read) giây, hoặc 1 số cho cả hai
+      - max_retries: số lần thử lại tối đa cho lỗi tạm thời
+      - backoff, max_backoff: backoff mũ (giây) có full jitter giữa các lần thử
+      - query_string_auth: True = gửi key qua query params thay vì HTTP Basic Auth
+      - limiter: rate_control.AdaptiveLimiter dùng chung giữa các thread (None = không giới hạn)
+      - metrics: woo_metrics.RequestMetrics ghi mỗi request (mặc định: metrics của metrics_session hiện tại, ngoài session là REGISTRY; None = tắt)
+    """
+    def __init__(self, base_url: str, consumer_key: str, consumer_secret: str,
+                 pool_size: int = 10, timeout=(10, 60), max_retries: int = 3,
+                 backoff: float = 0.5, max_backoff: float = 30.0,
+                 query_string_auth: bool = False, limiter=None, metrics=CURRENT):
+        self.base = base_url.rstrip('/')
+        self.api_base = f"{self.base}/wp-json/wc/v3"
+        self.timeout = timeout
+        self.limiter = limiter
+        self.metrics = resolve_metrics(metrics)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.session = requests.Session()                  # reuse TCP/TLS connection
+        pool_size = max(pool_size, LIST_CONCURRENCY)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Accept': 'application/json'})
+
+        if query_string_auth:
+            self._auth_params = {'consumer_key': consumer_key, 'consumer_secret': consumer_secret}
+            self.session.auth = None
+        else:
+            self._auth_params = {}
+            self.session.auth = HTTPBasicAuth(consumer_key, consumer_secret)
+
+    def _sleep_for(self, attempt: int, resp=None) -> float:
+        # Full jitter: random(0, min(max_backoff, backoff * 2^attempt)), không ít hơn Retry-After
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+        if resp is not None:
+            retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+    def _request_once(self, method, url, params, json, timeout) -> requests.Response:
+        # 1 request HTTP, ghi vào metrics (latency không tính thời gian chờ limiter)
+        # và note_attempt (batch_sizer đo latency của lần gửi cuối)
+        begin = time.perf_counter()
+        if self.metrics is None:
+            try:
+                return self.session.request(method, url, params=params, json=json, timeout=timeout)
+            finally:
+                note_attempt(time.perf_counter() - begin)
+        path = url[len(self.api_base):]
+        started = self.metrics.start()
+        try:
+            resp = self.session.request(method, url, params=params, json=json, timeout=timeout)
+        except BaseException as e:
+            note_attempt(time.perf_counter() - begin)
+            self.metrics.fail(started, method, path, e)
+            raise
+        note_attempt(time.perf_counter() - begin)
+        self.metrics.finish(started, method, path, resp.status_code,
+                            len(resp.request.body or b''), len(resp.content))
+        return resp
+
+    def _send(self, method, url, params, json, timeout) -> requests.Response:
+        # 1 lần gửi thực sự; báo kết quả cho limiter (nếu có) để điều chỉnh song song
+        if self.limiter is None:
+            return self._request_once(method, url, params, json, timeout)
+        # Latency được so với baseline của cùng loại request (GET liệt kê / POST batch...)
+        key = (method, endpoint_of(url[len(self.api_base):]))
+        started = self.limiter.acquire()
+        try:
+            resp = self._request_once(method, url, params, json, timeout)
+        except requests.Timeout:
+            self.limiter.release(started, overloaded=True, key=key)
+            raise
+        except BaseException:
+            self.limiter.release(started, key=key)
+            raise
+        self.limiter.release(started, resp.status_code == 429 or resp.status_code >= 500,
+                             parse_retry_after(resp.headers.get('Retry-After')), key=key)
+        return resp
+
+    def request(self, method: str, path: str, params=None, json=None,
+                timeout=None, idempotent: bool = None) -> requests.Response:
+        """
+        Gửi request tới /wp-json/wc/v3{path}, tự thử lại lỗi tạm thời.
+        Trả về requests.Response cuối cùng (KHÔNG raise theo status code).
+
+        idempotent: ghi đè cách phân loại theo method, vd batch update/delete
+        là POST nhưng gửi lại an toàn nên có thể truyền idempotent=True.
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        retry_statuses = RETRY_STATUSES if idempotent else UNSAFE_RETRY_STATUSES
+        p = dict(params) if params else {}
+        p.update(self._auth_params)
+        url = f"{self.api_base}{path}"
+
+        attempt = 0
+        while True:
+            try:
+                resp = self._send(method, url, p, json, timeout or self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # Với request không idempotent, chỉ gửi lại khi lỗi ở bước kết nối: timeout đọc hay
+                # kết nối bị ngắt giữa chừng (RemoteDisconnected, reset) có thể đã được server xử lý
+                if attempt >= self.max_retries or (not idempotent and not is_connect_error(e)):
+                    raise
+                delay = self._sleep_for(attempt)
+                logging.warning(f"{method} {path}: {e.__class__.__name__}, thử lại sau {delay:.2f}s")
+            else:
+                if resp.status_code not in retry_statuses or attempt >= self.max_retries:
+                    return resp
+                delay = self._sleep_for(attempt, resp)
+                logging.warning(f"{method} {path}: HTTP {resp.status_code}, thử lại sau {delay:.2f}s")
+            if self.metrics is not None:
+                self.metrics.retry(method, path)
+            time.sleep(delay)
+            attempt += 1
+
+    def request_json(self, method: str, path: str, params=None, json=None,
+                     timeout=None, idempotent: bool = None):
+        """
+        Như request() nhưng raise HTTPError nếu status lỗi, trả về body JSON.
+        """
+        resp = self.request(method, path, params=params, json=json,
+                            timeout=timeout, idempotent=idempotent)
+        resp.raise_for_status()
+        return resp.json()
+
+    def iter_pages(self, path: str, params=None, per_page: int = 100,
+                   concurrency: int = LIST_CONCURRENCY, slots=None):
+        """
+        Liệt kê endpoint có phân trang, trả về generator các trang (list item) THEO THỨ TỰ trang.
+        Trang 1 cho biết X-WP-TotalPages, các trang còn lại được tải song song (tối đa
+        `concurrency` request, đặt trước tối đa 2 x concurrency trang) nên người gọi xử lý
+        được trang đầu trong khi các trang sau còn đang tải, và không tốn thêm 1 request
+        trang rỗng ở cuối. Server không gửi header -> tải tuần tự tới trang rỗng như cũ.
+        Số trang được chốt ở trang 1: sản phẩm thêm vào trong lúc liệt kê có thể bị bỏ sót.
+        slots: semaphore dùng chung giới hạn TỔNG số trang đang tải khi nhiều lần liệt kê chạy song
+        song (mỗi lần tối đa `concurrency` trang), để số kết nối không vượt pool_size.
+        """
+        base = {**(params or {}), 'per_page': per_page}
+        gate = slots if slots is not None else nullcontext()
+
+        def fetch(page):
+            with gate:
+                return self.get(path, {**base, 'page': page})
+
+        with gate:
+            resp = self.request('GET', path, params={**base, 'page': 1})
+        resp.raise_for_status()
+        first = resp.json()
+        if not first:
+            return
+        yield first
+        total_pages = total_pages_of(resp.headers)
+        if total_pages is None:
+            page = 2
+            while True:
+                items = fetch(page)
+                if not items:
+                    return
+                yield items
+                page += 1
+        if total_pages <= 1:
+            return
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            pending = deque()
+            next_page = 2
+            try:
+                while pending or next_page <= total_pages:
+                    while next_page <= total_pages and len(pending) < concurrency * 2:
+                        pending.append(pool.submit(fetch, next_page))
+                        next_page += 1
+                    items = pending.popleft().result()
+                    if items:      # trang rỗng: store bớt sản phẩm trong lúc liệt kê
+                        yield items
+            finally:
+                # Người gọi dừng sớm / lỗi: hủy các trang chưa bắt đầu tải
+                for fut in pending:
+                    fut.cancel()
+
+    def count(self, path: str, params=None) -> int:
+        """
+        Đếm số item khớp bộ lọc bằng 1 request per_page=1 (đọc X-WP-Total), không tải danh sách.
+        Server không gửi header -> liệt kê lean (_fields=id) để đếm.
+        """
+        base = {**(params or {}), '_fields': 'id'}
+        resp = self.request('GET', path, params={**base, 'per_page': 1, 'page': 1})
+        resp.raise_for_status()
+        total = total_of(resp.headers)
+        if total is not None:
+            return total
+        return sum(len(items) for items in self.iter_pages(path, base))
+
+    def list_all(self, path: str, params=None, per_page: int = 100,
+                 concurrency: int = LIST_CONCURRENCY) -> list:
+        """
+        Như iter_pages() nhưng gom toàn bộ item vào 1 list.
+        """
+        return [item for items in self.iter_pages(path, params, per_page, concurrency) for item in items]
+
+    def get(self, path: str, params=None, **kwargs):
+        return self.request_json('GET', path, params=params, **kwargs)
+
+    def post(self, path: str, json=None, **kwargs):
+        return self.request_json('POST', path, json=json, **kwargs)
+
+    def put(self, path: str, json=None, **kwargs):
+        return self.request_json('PUT', path, json=json, **kwargs)
+
+    def delete(self, path: str, params=None, **kwargs):
+        return self.request_json('DELETE', path, params=params, **kwargs)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,331 @@
+# woo_metrics.py
+# Đo request tới store cho hide / delete / feed: WooClient và AsyncWooClient ghi mỗi lần gửi
+# vào RequestMetrics của lượt chạy hiện tại (metrics_session, mặc định REGISTRY) theo từng (method, endpoint):
+# số request, mã status, histogram latency, byte gửi / nhận, số lần retry, lỗi mạng,
+# và số request đang bay (hiện tại / cao nhất).
+# Mỗi request chỉ tốn 1 lần lấy lock + vài phép cộng (histogram bucket cố định, không giữ
+# từng mẫu) nên có thể bật thường trực khi chạy thật để chỉnh số worker / batch size.
+#
+# Xuất: dòng tiến độ định kỳ (ProgressReporter), JSON summary và file Prometheus text
+# (textfile collector của node_exporter) - xem metrics_session().
+
+import os
+import re
+import json
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+
+# Cận trên các bucket latency (giây), giống mặc định của client Prometheus + vài bucket dài
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Khoảng thời gian (giây) giữa 2 dòng tiến độ
+PROGRESS_INTERVAL = 10.0
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def endpoint_of(path: str) -> str:
+    """'/products/123' -> '/products/{id}' để không tạo 1 series cho mỗi ID."""
+    return _ID_SEGMENT.sub('/{id}', path.split('?', 1)[0])
+
+
+class _Series:
+    __slots__ = ('count', 'statuses', 'buckets', 'latency_sum', 'latency_max',
+                 'bytes_sent', 'bytes_received', 'retries', 'errors')
+
+    def __init__(self):
+        self.count = 0
+        self.statuses = Counter()
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)     # bucket cuối = +Inf
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+        self.errors = Counter()
+
+    def copy(self) -> '_Series':
+        other = _Series()
+        for name in self.__slots__:
+            value = getattr(self, name)
+            setattr(other, name, value.copy() if hasattr(value, 'copy') else value)
+        return other
+
+    def quantile(self, q: float):
+        # Ước lượng từ histogram: cận trên của bucket chứa quantile
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS, self.buckets):
+            seen += n
+            if seen >= target:
+                return round(min(bound, self.latency_max), 4)
+        return round(self.latency_max, 4)
+
+
+class RequestMetrics:
+    """
+    Bộ đếm request thread-safe theo (method, endpoint).
+    Client gọi start() trước khi gửi, finish() / fail() khi có kết quả, retry() trước mỗi lần thử lại.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+            self.started = time.monotonic()
+            self.in_flight = 0
+            self.max_in_flight = 0
+
+    def _get(self, method, path) -> _Series:
+        key = (method, endpoint_of(path))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _Series()
+        return series
+
+    # ---- ghi nhận (gọi từ client) ----
+    def start(self) -> float:
+        with self._lock:
+            self.in_flight += 1
+            if self.in_flight > self.max_in_flight:
+                self.max_in_flight = self.in_flight
+        return time.perf_counter()
+
+    def finish(self, started: float, method: str, path: str, status: int,
+               bytes_sent: int = 0, bytes_received: int = 0):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.in_flight -= 1
+            s = self._get(method, path)
+            s.count += 1
+            s.statuses[status] += 1
+            s.buckets[bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+            s.latency_sum += elapsed
+            if elapsed > s.latency_max:
+                s.latency_max = elapsed
+            s.bytes_sent += bytes_sent
+            s.bytes_received += bytes_received
+
+    def fail(self, started: float, method: str, path: str, error: BaseException, bytes_sent: int = 0):
+        """Request không có phản hồi (lỗi mạng, timeout...)."""
+        with self._lock:
+            self.in_flight -= 1
+            s = self._get(method, path)
+            s.errors[type(error).__name__] += 1
+            s.bytes_sent += bytes_sent
+
+    def retry(self, method: str, path: str):
+        with self._lock:
+            self._get(method, path).retries += 1
+
+    # ---- xuất ----
+    def summary(self) -> dict:
+        """Tổng hợp dạng dict (JSON được): tổng quát + từng (method, endpoint)."""
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            endpoints = []
+            for (method, endpoint), s in sorted(self._series.items(), key=lambda kv: kv[0][::-1]):
+                endpoints.append({
+                    'method': method,
+                    'endpoint': endpoint,
+                    'requests': s.count,
+                    'statuses': {str(k): v for k, v in sorted(s.statuses.items())},
+                    'errors': dict(s.errors),
+                    'retries': s.retries,
+                    'bytes_sent': s.bytes_sent,
+                    'bytes_received': s.bytes_received,
+                    'latency': {
+                        'mean': round(s.latency_sum / s.count, 4) if s.count else None,
+                        'p50': s.quantile(0.5),
+                        'p95': s.quantile(0.95),
+                        'p99': s.quantile(0.99),
+                        'max': round(s.latency_max, 4),
+                    },
+                })
+            total = sum(e['requests'] for e in endpoints)
+            return {
+                'elapsed': round(elapsed, 3),
+                'requests': total,
+                'requests_per_sec': round(total / elapsed, 2),
+                'retries': sum(e['retries'] for e in endpoints),
+                'errors': sum(sum(e['errors'].values()) for e in endpoints),
+                'throttled_or_5xx': sum(n for e in endpoints for code, n in e['statuses'].items()
+                                        if code == '429' or code >= '500'),
+                'bytes_sent': sum(e['bytes_sent'] for e in endpoints),
+                'bytes_received': sum(e['bytes_received'] for e in endpoints),
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'endpoints': endpoints,
+            }
+
+    def progress_line(self) -> str:
+        s = self.summary()
+        p95 = max((e['latency']['p95'] or 0 for e in s['endpoints']), default=0)
+        return (f"⏱ {s['elapsed']:.0f}s | {s['requests']} request ({s['requests_per_sec']} req/s) | "
+                f"đang bay {s['in_flight']} (max {s['max_in_flight']}) | 429/5xx {s['throttled_or_5xx']} | "
+                f"retry {s['retries']} | lỗi mạng {s['errors']} | p95 ≤{p95}s | "
+                f"↑{s['bytes_sent'] / 1e6:.1f}MB ↓{s['bytes_received'] / 1e6:.1f}MB")
+
+    def prometheus_text(self, labels: dict = None) -> str:
+        """Định dạng Prometheus text exposition (counter / histogram / gauge)."""
+        extra = ''.join(f',{k}="{v}"' for k, v in sorted((labels or {}).items()))
+        lines = []
+
+        def metric(name, kind, help_):
+            lines.append(f"# HELP {name} {help_}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            # Chụp lại dưới lock, render ngoài lock để không chặn client
+            series = sorted((key, s.copy()) for key, s in self._series.items())
+            in_flight, max_in_flight = self.in_flight, self.max_in_flight
+        base = lambda m, e: f'method="{m}",endpoint="{e}"{extra}'
+
+        metric('woo_requests_total', 'counter', 'Số request đã có phản hồi theo status')
+        for (m, e), s in series:
+            for code, n in sorted(s.statuses.items()):
+                lines.append(f'woo_requests_total{{{base(m, e)},status="{code}"}} {n}')
+        metric('woo_request_errors_total', 'counter', 'Request không có phản hồi (lỗi mạng, timeout)')
+        for (m, e), s in series:
+            for err, n in sorted(s.errors.items()):
+                lines.append(f'woo_request_errors_total{{{base(m, e)},error="{err}"}} {n}')
+        metric('woo_request_retries_total', 'counter', 'Số lần thử lại')
+        for (m, e), s in series:
+            lines.append(f'woo_request_retries_total{{{base(m, e)}}} {s.retries}')
+        metric('woo_request_duration_seconds', 'histogram', 'Latency request (giây)')
+        for (m, e), s in series:
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS + ('+Inf',), s.buckets):
+                cumulative += n
+                lines.append(f'woo_request_duration_seconds_bucket{{{base(m, e)},le="{bound}"}} {cumulative}')
+            lines.append(f'woo_request_duration_seconds_sum{{{base(m, e)}}} {s.latency_sum:.6f}')
+            lines.append(f'woo_request_duration_seconds_count{{{base(m, e)}}} {s.count}')
+        metric('woo_request_bytes_sent_total', 'counter', 'Byte body request đã gửi')
+        for (m, e), s in series:
+            lines.append(f'woo_request_bytes_sent_total{{{base(m, e)}}} {s.bytes_sent}')
+        metric('woo_response_bytes_received_total', 'counter', 'Byte body phản hồi đã nhận')
+        for (m, e), s in series:
+            lines.append(f'woo_response_bytes_received_total{{{base(m, e)}}} {s.bytes_received}')
+        label_only = f"{{{extra.lstrip(',')}}}" if extra else ''
+        metric('woo_requests_in_flight', 'gauge', 'Số request đang bay')
+        lines.append(f'woo_requests_in_flight{label_only} {in_flight}')
+        metric('woo_requests_in_flight_max', 'gauge', 'Số request đang bay cao nhất')
+        lines.append(f'woo_requests_in_flight_max{label_only} {max_in_flight}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str, labels: dict = None):
+        # Ghi file tạm rồi rename để collector không đọc phải file ghi dở
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text(labels))
+        os.replace(tmp, path)
+
+    def write_json(self, path: str, **extra):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({**extra, **self.summary()}, f, indent=2, ensure_ascii=False)
+
+
+# Registry dùng chung của process: client tạo ngoài metrics_session ghi vào đây
+REGISTRY = RequestMetrics()
+# Metrics của lượt chạy hiện tại (metrics_session). Dùng contextvar để nhiều lượt chạy song song
+# (job_runner: nhiều store cùng lúc) không ghi đè bộ đếm của nhau; asyncio.run() chép context nên
+# client async tạo trong lượt chạy cũng ghi đúng chỗ
+_current = contextvars.ContextVar('woo_metrics', default=REGISTRY)
+# Giá trị mặc định của tham số `metrics` ở client: lấy metrics của lượt chạy lúc tạo client
+CURRENT = object()
+
+
+# Thời gian (giây) của lần gửi HTTP gần nhất trong thread / task hiện tại: chỉ tính request
+# thành công cuối cùng, không tính các lần retry, thời gian chờ backoff / Retry-After / limiter
+_last_attempt = contextvars.ContextVar('woo_last_attempt', default=None)
+
+
+def note_attempt(seconds: float):
+    """Client gọi sau mỗi lần gửi HTTP (thành công hay lỗi)."""
+    _last_attempt.set(seconds)
+
+
+def last_attempt_seconds(reset: bool = False):
+    """Thời gian của lần gửi gần nhất (None nếu chưa có); reset=True xóa giá trị sau khi đọc."""
+    seconds = _last_attempt.get()
+    if reset:
+        _last_attempt.set(None)
+    return seconds
+
+
+def current_metrics() -> RequestMetrics:
+    return _current.get()
+
+
+def resolve_metrics(metrics):
+    """CURRENT -> metrics của lượt chạy hiện tại; RequestMetrics hoặc None (tắt) giữ nguyên."""
+    return current_metrics() if metrics is CURRENT else metrics
+
+
+class ProgressReporter:
+    """Thread nền in metrics.progress_line() mỗi `interval` giây (và ghi file Prometheus nếu có)."""
+    def __init__(self, metrics: RequestMetrics, interval: float = PROGRESS_INTERVAL,
+                 prom_path: str = None, labels: dict = None):
+        self.metrics = metrics
+        self.interval = interval
+        self.prom_path = prom_path
+        self.labels = labels
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            print(self.metrics.progress_line(), flush=True)
+            if self.prom_path:
+                try:
+                    self.metrics.write_prometheus(self.prom_path, self.labels)
+                except OSError as e:
+                    logging.warning(f"Không ghi được file Prometheus {self.prom_path}: {e}")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+@contextmanager
+def metrics_session(label: str, json_path: str = None, prom_path: str = None,
+                    interval: float = PROGRESS_INTERVAL, metrics: RequestMetrics = None):
+    """
+    Bao 1 lượt chạy (hide / delete / feed): bộ đếm riêng cho lượt chạy (metrics mới, hoặc
+    `metrics` truyền vào sau khi reset) - client tạo trong `with` ghi vào đó, in dòng tiến độ mỗi `interval` giây
+    (interval <= 0 = tắt), khi kết thúc in dòng tổng kết, ghi JSON summary (json_path) và
+    file Prometheus text (prom_path, cũng được cập nhật định kỳ).
+    """
+    if metrics is None:
+        metrics = RequestMetrics()
+    else:
+        metrics.reset()
+    token = _current.set(metrics)
+    labels = {'job': label}
+    reporter = ProgressReporter(metrics, interval, prom_path, labels).start() if interval > 0 else None
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+        if reporter is not None:
+            reporter.stop()
+        print(f"📈 [{label}] {metrics.progress_line()}", flush=True)
+        try:
+            if json_path:
+                metrics.write_json(json_path, job=label)
+            if prom_path:
+                metrics.write_prometheus(prom_path, labels)
+        except OSError as e:
+            logging.warning(f"Không ghi được file metrics: {e}")